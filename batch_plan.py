@@ -0,0 +1,334 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import threading
+
+from chapter_files import atomic_write_text
+from chapter_jobs import job_signature
+from chapter_sidecars import SIDECAR_FORMATS, sidecar_name
+from chapter_timeline import ChapterTimeline
+from job_queue import LeaseQueue, queue_path
+from library_scan import VIDEO_EXTENSIONS, build_library, scan_directory
+from metrics import BYTES_READ, BYTES_WRITTEN, STAGE_SECONDS
+from probe_cache import ProbeCache, default_cache_dir
+from reflink import clone_supported
+from tool_paths import find_tool
+
+# What a batch would do with each video
+SKIP = 'skip'
+SIDECAR_ONLY = 'sidecar-only' # Sidecar batch: chapter files written next to the video, which is not read
+IN_PLACE = 'in-place' # .mkv cloned and only its headers patched with mkvpropedit, no remux
+REMUX = 'remux' # Metadata stripped to a temporary copy, then the chapters muxed into the output
+
+# Per-job throughput (bytes/s) of the stages that move the whole file, assumed until measured here
+DEFAULT_RATES = {
+    'strip': 80e6, # Stream copy; reads and writes the same disk or share at once
+    'mux': 80e6,
+    'clone': 500e6, # A reflink is near-instant, copy_file_range copies in the kernel or on the server
+}
+# Seconds per run of the stages whose cost does not grow with the file, assumed until measured here
+DEFAULT_RUN_SECONDS = {
+    'probe': 0.3,
+    'keyframes': 5.0,
+    'chapter_patch': 0.5,
+}
+SIDECAR_SECONDS = 0.05 # Per sidecar file: a small atomic write with fsync (not measured)
+BYTE_COUNTERS = {'strip': BYTES_READ, 'mux': BYTES_READ, 'clone': BYTES_WRITTEN} # Where each stage's bytes are counted
+HISTORY_RUNS = 1000 # Older measurements are weighted down beyond this, so a new disk or share shows through
+
+
+def measure_stages():
+    """This process's job metrics per stage: {stage: (bytes moved, seconds, runs)}."""
+    totals = {}
+    for stage in list(DEFAULT_RATES) + list(DEFAULT_RUN_SECONDS):
+        runs, seconds = STAGE_SECONDS.value(labels=(stage,))
+        counter = BYTE_COUNTERS.get(stage)
+        totals[stage] = (counter.value(labels=(stage,)) if counter else 0, seconds, runs)
+    return totals
+
+
+class ThroughputHistory:
+    """Per-job throughput of the batch stages as measured on this machine, kept in the user cache
+       folder between runs. Batches add what they measured with record_since()."""
+
+    def __init__(self, cache_dir=None):
+        self.path = os.path.join(cache_dir or default_cache_dir(), 'throughput.json')
+        self._lock = threading.Lock()
+        self.stages = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return {stage: tuple(values) for stage, values in json.load(f).items()}
+        except (OSError, ValueError, TypeError, AttributeError):
+            return {}
+
+    def rate(self, stage):
+        """Returns (bytes per second of one job, measured runs; 0 when it is the default)."""
+        moved, seconds, runs = self.stages.get(stage, (0, 0, 0))
+        if runs and moved and seconds > 0:
+            return moved / seconds, runs
+        return DEFAULT_RATES[stage], 0
+
+    def run_seconds(self, stage):
+        """Returns (seconds per run, measured runs; 0 when it is the default)."""
+        moved, seconds, runs = self.stages.get(stage, (0, 0, 0))
+        if runs:
+            return seconds / runs, runs
+        return DEFAULT_RUN_SECONDS[stage], 0
+
+    def record_since(self, before):
+        """Adds what the stage metrics measured since before (a measure_stages() result) and saves
+           the history. Returns the stages that had runs."""
+        now = measure_stages()
+        with self._lock:
+            self.stages = self._load() # Other processes may have saved their batches meanwhile
+            updated = []
+            for stage, (moved, seconds, runs) in now.items():
+                old_moved, old_seconds, old_runs = before.get(stage, (0, 0, 0))
+                if runs <= old_runs:
+                    continue
+                total = [old + new for old, new in zip(self.stages.get(stage, (0, 0, 0)),
+                                                       (moved - old_moved, seconds - old_seconds, runs - old_runs))]
+                if total[2] > HISTORY_RUNS:
+                    total = [value * HISTORY_RUNS / total[2] for value in total]
+                self.stages[stage] = tuple(total)
+                updated.append(stage)
+            if updated:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                atomic_write_text(self.path, json.dumps(self.stages, indent=1, sort_keys=True))
+        return updated
+
+
+def plan_batch(folder, probe_cache=None, ffprobe_path=None, mkvpropedit_path=None, sidecar_formats=None,
+               snap=False, jobs_per_volume=2, history=None, video_extensions=VIDEO_EXTENSIONS, probe=False):
+    """Dry run of a batch on folder: what each video would get and what it would cost, as a dict.
+
+    The plan comes from one directory scan, the chapter files, the probe
+    cache, the folder's job queue and the throughput history; nothing is
+    written. Each video is planned as 'skip', 'in-place' (.mkv cloned and
+    patched, with mkvpropedit) or 'remux' like the apply batch, or as
+    'sidecar-only' or 'skip' like the sidecar batch when sidecar_formats is
+    given. Videos the probe cache does not know are probed when probe is
+    set; otherwise their probe is counted in the estimate instead.
+    Byte and time figures are estimates: an in-place clone is counted as a
+    full copy, which a reflink volume does not actually make.
+    """
+    started = time.time()
+    history = history or ThroughputHistory()
+    files = scan_directory(folder)
+    entries = build_library(files, video_extensions)
+    names_lower = {name.lower(): name for name in files}
+    stats = {os.path.join(folder, entry.name): (entry.size, entry.mtime_ns) for entry in entries if entry.has_chapter_file}
+
+    records = probe_cache.get_many(stats) if probe_cache is not None and stats else {}
+    if probe and probe_cache is not None and ffprobe_path:
+        for path in [path for path in stats if path not in records]:
+            try:
+                records[path] = probe_cache.probe(path, ffprobe_path, stat=stats[path])
+            except Exception:
+                pass # Left for the batch, which also goes without a duration if it cannot probe
+
+    # Jobs the folder's queue has done with unchanged inputs are not claimed again
+    done = {}
+    if sidecar_formats is None and os.path.exists(queue_path(folder)):
+        try:
+            queue = LeaseQueue(queue_path(folder))
+            done = queue.done_signatures()
+            queue.close()
+        except Exception:
+            pass
+
+    strip_rate, mux_rate, clone_rate = (history.rate(stage)[0] for stage in ('strip', 'mux', 'clone'))
+    probe_seconds, keyframe_seconds, patch_seconds = (history.run_seconds(stage)[0]
+                                                      for stage in ('probe', 'keyframes', 'chapter_patch'))
+    videos = []
+    for entry in entries:
+        path = os.path.join(folder, entry.name)
+        video = {'video': entry.name, 'size': entry.size, 'action': SKIP, 'reason': "", 'read_bytes': 0,
+                 'written_bytes': 0, 'temp_bytes': 0, 'added_bytes': 0, 'seconds': 0.0}
+        videos.append(video)
+        if not entry.has_chapter_file:
+            video['reason'] = "no chapter file"
+            continue
+        record = records.get(path) or {}
+        try:
+            with open(os.path.join(folder, entry.chapter_file), 'r', encoding='utf-8') as f:
+                timeline = ChapterTimeline.parse(f.read(), frame_rate=record.get('frame_rate'),
+                                                 duration_ms=record.get('duration_ms'))
+        except (OSError, UnicodeDecodeError) as e:
+            video['reason'] = f"chapter file unreadable ({e})"
+            continue
+        if not timeline:
+            video['reason'] = "no chapters found"
+            continue
+        problems = timeline.validate()
+        if problems:
+            video['reason'] = f"would fail: chapters beyond video end: {len(problems)}"
+            continue
+
+        if sidecar_formats is not None:
+            wanted = []
+            for fmt in sidecar_formats:
+                existing = names_lower.get(sidecar_name(entry.name, fmt).lower())
+                if existing is None or files[existing][1] < entry.chapter_mtime_ns:
+                    wanted.append(fmt)
+            if not wanted:
+                video['reason'] = "sidecars up to date"
+                continue
+            written = sum(len(SIDECAR_FORMATS[fmt][2](timeline).encode('utf-8')) for fmt in wanted)
+            video.update(action=SIDECAR_ONLY, reason=", ".join(sidecar_name(entry.name, fmt) for fmt in wanted),
+                         written_bytes=written, added_bytes=written, seconds=SIDECAR_SECONDS * len(wanted))
+            continue
+
+        if entry.output_name is not None and done.get(path) == job_signature(entry):
+            video['reason'] = "already applied (done in the folder's job queue)"
+            continue
+        if entry.output_name is None:
+            reason = "no output yet"
+        elif path in done:
+            reason = "video or chapter file changed since it was applied"
+        else:
+            reason = "output not made by a queued batch; redone"
+        # Work the batch does before the remux: a probe for videos the cache does not know, keyframe scans
+        seconds = 0.0 if path in records else probe_seconds
+        if snap and (probe_cache is None or probe_cache.get_keyframes(path, stats[path]) is None):
+            seconds += keyframe_seconds
+        size = entry.size
+        existing_output = files[entry.output_name][0] if entry.output_name is not None else 0
+        if mkvpropedit_path and os.path.splitext(entry.name)[1].lower() == '.mkv' and clone_supported(path):
+            video.update(action=IN_PLACE, reason=f"{reason}; clone + header patch", read_bytes=size,
+                         written_bytes=size, seconds=seconds + size / clone_rate + patch_seconds)
+        else:
+            # The stripped copy is read back for the mux and exists until the output is complete
+            video.update(action=REMUX, reason=reason, read_bytes=2 * size, written_bytes=2 * size, temp_bytes=size,
+                         seconds=seconds + size / strip_rate + size / mux_rate)
+        video['added_bytes'] = size - existing_output
+
+    # The scheduler runs up to jobs_per_volume videos of the folder at a time, so their temporary copies coexist
+    work = [video for video in videos if video['action'] != SKIP]
+    job_seconds = sum(video['seconds'] for video in work)
+    wall_seconds = max(job_seconds / max(1, jobs_per_volume), max((video['seconds'] for video in work), default=0))
+    peak_temp = sum(sorted((video['temp_bytes'] for video in work), reverse=True)[:max(1, jobs_per_volume)])
+    added = sum(video['added_bytes'] for video in work)
+    try:
+        free = shutil.disk_usage(folder).free
+    except OSError:
+        free = None
+    needed = max(added, 0) + peak_temp
+    warnings = []
+    if free is not None and needed > free:
+        warnings.append(f"Needs up to {format_bytes(needed)} of free space on the volume "
+                        f"({format_bytes(peak_temp)} of it temporary); only {format_bytes(free)} is free.")
+    unmeasured = [stage for stage in ('strip', 'mux') if not history.rate(stage)[1]]
+    if any(video['action'] == REMUX for video in work) and unmeasured:
+        warnings.append(f"No {'/'.join(unmeasured)} throughput measured on this machine yet; times use default rates.")
+
+    summary = {}
+    for video in videos:
+        summary[video['action']] = summary.get(video['action'], 0) + 1
+    rates = {stage: {'bytes_per_second': round(history.rate(stage)[0]), 'measured_runs': round(history.rate(stage)[1])}
+             for stage in DEFAULT_RATES}
+    rates.update({stage: {'seconds_per_run': round(history.run_seconds(stage)[0], 3),
+                          'measured_runs': round(history.run_seconds(stage)[1])} for stage in DEFAULT_RUN_SECONDS})
+    return {
+        'folder': os.path.abspath(folder), 'generated': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'mode': 'sidecars' if sidecar_formats is not None else 'apply', 'jobs_per_volume': jobs_per_volume,
+        'seconds': round(time.time() - started, 2), 'summary': summary,
+        'totals': {
+            'read_bytes': sum(video['read_bytes'] for video in work),
+            'written_bytes': sum(video['written_bytes'] for video in work),
+            'added_bytes': added,
+            'peak_temp_bytes': peak_temp,
+            'free_bytes': free,
+            'fits': free is None or needed <= free,
+            'job_seconds': round(job_seconds, 1),
+            'wall_seconds': round(wall_seconds, 1),
+        },
+        'rates': rates, 'warnings': warnings, 'videos': videos,
+    }
+
+
+def format_bytes(size):
+    for unit in ('B', 'KB', 'MB', 'GB', 'TB'):
+        if abs(size) < 1024 or unit == 'TB':
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+def format_duration(seconds):
+    seconds = int(round(seconds))
+    if seconds < 60:
+        return f"{seconds}s"
+    hours, rest = divmod(seconds, 3600)
+    return f"{hours}h {rest // 60:02d}m" if hours else f"{rest // 60}m {rest % 60:02d}s"
+
+
+def format_plan(plan, per_video=True):
+    """The plan as report lines (a line per video that would be touched, then the totals)."""
+    lines = []
+    if per_video:
+        for video in plan['videos']:
+            if video['action'] != SKIP:
+                lines.append(f"- {video['video']}: {video['action']} ({video['reason']}); "
+                             f"read {format_bytes(video['read_bytes'])}, write {format_bytes(video['written_bytes'])}, "
+                             f"~{format_duration(video['seconds'])}")
+        skipped = {}
+        for video in plan['videos']:
+            if video['action'] == SKIP:
+                skipped[video['reason']] = skipped.get(video['reason'], 0) + 1
+        for reason, count in sorted(skipped.items()):
+            lines.append(f"- {count} skipped: {reason}")
+    totals = plan['totals']
+    lines.append(f"Plan for {plan['folder']} ({plan['mode']} batch, {plan['jobs_per_volume']} job(s) at a time): " +
+                 ", ".join(f"{count} {action}" for action, count in sorted(plan['summary'].items())))
+    lines.append(f"Reads {format_bytes(totals['read_bytes'])}, writes {format_bytes(totals['written_bytes'])}; "
+                 f"outputs add {format_bytes(totals['added_bytes'])} plus up to {format_bytes(totals['peak_temp_bytes'])} "
+                 f"of temporary copies at a time" +
+                 (f" ({format_bytes(totals['free_bytes'])} free)" if totals['free_bytes'] is not None else "") + ".")
+    lines.append(f"Estimated time: {format_duration(totals['wall_seconds'])} "
+                 f"({format_duration(totals['job_seconds'])} of job time).")
+    lines.extend(f"Warning: {warning}" for warning in plan['warnings'])
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Dry run of a batch: lists what the batch would do with every video in a folder (skip, "
+                    "sidecar-only, in-place or remux) with the bytes it would move, the temporary space it "
+                    "would need and the time it would take, estimated from the probe cache and the throughput "
+                    "measured by earlier batches on this machine. Nothing is written.")
+    parser.add_argument('folder', help="Batch folder")
+    parser.add_argument('--jobs', type=int, default=2, help="Parallel jobs on the volume (the GUI's jobs per volume)")
+    parser.add_argument('--sidecars', nargs='+', choices=sorted(SIDECAR_FORMATS), metavar='FORMAT',
+                        help="Plan the sidecar batch in these formats instead: " + ", ".join(sorted(SIDECAR_FORMATS)))
+    parser.add_argument('--snap', action='store_true', help="Count keyframe scans for snapping chapter starts")
+    parser.add_argument('--probe', action='store_true', help="Probe videos the probe cache does not know first")
+    parser.add_argument('--ffprobe', help="Path to ffprobe (default: next to this script, then PATH)")
+    parser.add_argument('--mkvpropedit', help="Path to mkvpropedit (default: next to this script, then PATH)")
+    parser.add_argument('--summary', action='store_true', help="Only print the totals, not a line per video")
+    parser.add_argument('--json', metavar='FILE', help="Also write the full plan as JSON ('-' for stdout only)")
+    args = parser.parse_args(argv)
+
+    try:
+        probe_cache = ProbeCache()
+    except Exception as e:
+        probe_cache = None
+        print(f"Probe cache unavailable ({e}); durations are not checked.", file=sys.stderr)
+    plan = plan_batch(args.folder, probe_cache, args.ffprobe or find_tool('ffprobe'),
+                      args.mkvpropedit or find_tool('mkvpropedit'), args.sidecars, args.snap, args.jobs, probe=args.probe)
+    if args.json == '-':
+        print(json.dumps(plan, indent=2, ensure_ascii=False))
+    else:
+        print("\n".join(format_plan(plan, per_video=not args.summary)))
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as f:
+                f.write(json.dumps(plan, indent=2, ensure_ascii=False) + "\n")
+    return 0 if plan['totals']['fits'] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,147 @@
+import os
+import time
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+ORDER_SMALL_FIRST = 'small_first'
+ORDER_LARGE_FIRST = 'large_first'
+
+
+class BatchJob:
+    """One unit of batch work on a file. payload is passed through to the job function untouched."""
+
+    __slots__ = ('path', 'size', 'payload', 'device')
+
+    def __init__(self, path, size, payload=None):
+        self.path = path
+        self.size = size
+        self.payload = payload
+        self.device = None
+
+
+class _DeviceState:
+    """Queue and throughput bookkeeping for one filesystem device."""
+
+    __slots__ = ('jobs', 'running', 'limit', 'rates', 'samples')
+
+    def __init__(self, jobs):
+        self.jobs = deque(jobs)
+        self.running = 0
+        self.limit = 1 # Grows while more parallel jobs keep raising the device's MB/s
+        self.rates = {} # concurrency -> smoothed aggregate MB/s measured at that concurrency
+        self.samples = 0 # Completions measured at the current limit
+
+
+def device_of(path, cache=None):
+    """Returns st_dev of the folder holding path (cached per folder; files share their folder's device)."""
+    folder = os.path.dirname(os.path.abspath(path))
+    if cache is not None and folder in cache:
+        return cache[folder]
+    try:
+        device = os.stat(folder).st_dev
+    except OSError:
+        device = folder # Unreachable folder: still gets a queue of its own
+    if cache is not None:
+        cache[folder] = device
+    return device
+
+
+class BatchScheduler:
+    """Runs file jobs with concurrency limited per filesystem device.
+
+    Jobs are grouped by the st_dev of their folder, so a NAS share and a
+    local SSD each get their own queue and one slow volume cannot take every
+    worker. Inside a device jobs run smallest first (early results) or
+    largest first (a short tail). Each device starts with one job at a time
+    and adds another while the measured MB/s keeps improving by at least 10%,
+    backing off again when an extra job makes it slower, up to
+    per_device_limit. max_workers bounds the total across devices.
+    """
+
+    def __init__(self, max_workers=4, per_device_limit=2, order=ORDER_SMALL_FIRST):
+        self.max_workers = max(1, max_workers)
+        self.per_device_limit = max(1, per_device_limit)
+        self.order = order
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        """Stops starting new jobs; jobs already running finish normally."""
+        self._cancel.set()
+
+    def run(self, jobs, fn, on_done=None, log=None):
+        """Runs fn(job) for every job. on_done(job, result, error) is called (on this thread) as each
+           finishes; error is the exception fn raised, or None. Returns the number of jobs run."""
+        log = log or (lambda message: None)
+        devices = self._group(jobs)
+        if len(devices) > 1:
+            log(f"Scheduling {len(jobs)} job(s) across {len(devices)} volume(s).")
+        finished = 0
+        running = {} # future -> (job, device state, start time, jobs running on the device at start)
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="BatchJob") as pool:
+            while True:
+                if not self._cancel.is_set():
+                    self._start_jobs(devices, running, pool, fn)
+                if not running:
+                    break
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in done:
+                    job, state, started, concurrency = running.pop(future)
+                    state.running -= 1
+                    self._record_rate(state, job, time.monotonic() - started, concurrency, log)
+                    error = future.exception()
+                    finished += 1
+                    if on_done:
+                        on_done(job, None if error else future.result(), error)
+        return finished
+
+    def _group(self, jobs):
+        reverse = self.order == ORDER_LARGE_FIRST
+        device_cache = {}
+        grouped = {}
+        for job in jobs:
+            job.device = device_of(job.path, device_cache)
+            grouped.setdefault(job.device, []).append(job)
+        return {device: _DeviceState(sorted(device_jobs, key=lambda job: job.size, reverse=reverse))
+                for device, device_jobs in grouped.items()}
+
+    def _start_jobs(self, devices, running, pool, fn):
+        # Round-robin over devices so every volume gets a share of the workers
+        started = True
+        while started and len(running) < self.max_workers:
+            started = False
+            for state in devices.values():
+                if len(running) >= self.max_workers:
+                    break
+                if state.jobs and state.running < state.limit:
+                    job = state.jobs.popleft()
+                    state.running += 1
+                    running[pool.submit(fn, job)] = (job, state, time.monotonic(), state.running)
+                    started = True
+
+    def _record_rate(self, state, job, elapsed, concurrency, log):
+        """Hill-climbs the device's concurrency limit on measured aggregate throughput."""
+        if elapsed <= 0 or not job.size:
+            return
+        # The job shared the device with concurrency - 1 others; together they moved about this much
+        rate = job.size / elapsed / (1024 * 1024) * concurrency
+        previous = state.rates.get(concurrency)
+        state.rates[concurrency] = rate if previous is None else previous * 0.5 + rate * 0.5
+        if concurrency != state.limit:
+            return # Started under an earlier limit
+        state.samples += 1
+        if state.samples < 2:
+            return
+        current = state.rates[state.limit]
+        higher = state.rates.get(state.limit + 1)
+        lower = state.rates.get(state.limit - 1)
+        if lower is not None and lower > current * 1.1:
+            state.limit -= 1 # The last extra job made the volume slower
+            state.samples = 0
+            log(f"Volume throughput dropped to {current:.1f} MB/s; back to {state.limit} parallel job(s) on it.")
+        elif state.limit < self.per_device_limit and (
+                (higher is None and (lower is None or current > lower * 1.1)) or
+                (higher is not None and higher > current * 1.1)):
+            state.limit += 1 # Keep climbing while each extra job still pays off
+            state.samples = 0
+            log(f"Volume throughput {current:.1f} MB/s; allowing {state.limit} parallel job(s) on it.")
@@ -0,0 +1,187 @@
+import os
+import sys
+import time
+import argparse
+import multiprocessing
+
+from batch_plan import ThroughputHistory, format_plan, measure_stages, plan_batch
+from chapter_jobs import JobFailed, apply_chapters_to_copy, queue_jobs, run_leased
+from chapter_timeline import ChapterTimeline
+from job_queue import DEFAULT_LEASE_SECONDS, LEASED, LeaseQueue, queue_path, worker_id
+from library_scan import VIDEO_EXTENSIONS, build_library, scan_directory
+from metrics import REGISTRY, MetricsFile
+from probe_cache import ProbeCache
+from process_watchdog import DEFAULT_STALL_TIMEOUT, Watchdog
+from tool_paths import find_tool
+
+
+def enqueue_folder(queue, folder, video_extensions=VIDEO_EXTENSIONS):
+    """Queues every video in folder that has a companion chapter file. Returns (videos found, newly queued)."""
+    entries = [entry for entry in build_library(scan_directory(folder), video_extensions) if entry.has_chapter_file]
+    return len(entries), queue.enqueue(queue_jobs(folder, entries))
+
+
+def plan_video(video_path, probe_cache, ffprobe_path, snap, text=None):
+    """Parses and validates chapter text for video_path (its companion chapter file unless text is
+       given). Returns the ChapterTimeline to apply; raises JobFailed with the same status lines as
+       the GUI batch."""
+    if text is None:
+        chapter_path = os.path.splitext(video_path)[0] + ".txt"
+        try:
+            with open(chapter_path, 'r', encoding='utf-8') as f:
+                text = f.read()
+        except OSError as e:
+            raise JobFailed("Skipped (no chapters found)", str(e))
+    record = {}
+    if probe_cache is not None and ffprobe_path:
+        try:
+            record = probe_cache.probe(video_path, ffprobe_path)
+        except Exception:
+            pass # Without a duration the last chapter just runs to the end of the file
+    timeline = ChapterTimeline.parse(text, frame_rate=record.get('frame_rate'), duration_ms=record.get('duration_ms'))
+    if not timeline:
+        raise JobFailed("Skipped (no chapters found)")
+    problems = timeline.validate()
+    if problems:
+        raise JobFailed(f"Failed (chapters beyond video end: {len(problems)})", "; ".join(problems))
+    if snap and probe_cache is not None and ffprobe_path:
+        timeline, _ = timeline.snap_to_keyframes(probe_cache.keyframes(video_path, ffprobe_path))
+    return timeline
+
+
+def run_worker(folder, ffmpeg_path, ffprobe_path=None, lease_seconds=DEFAULT_LEASE_SECONDS,
+               snap=False, largest_first=False, mkvpropedit_path=None, stall_timeout=DEFAULT_STALL_TIMEOUT,
+               metrics_file=None):
+    """Claims and processes jobs from the folder's queue until none are left. Returns the number that failed.
+       With metrics_file, the worker's metrics are written there every few seconds while it runs."""
+    owner = worker_id()
+    metrics_writer = None
+    if metrics_file:
+        REGISTRY.const_labels['worker'] = owner
+        metrics_writer = MetricsFile(metrics_file).start()
+
+    def log(message):
+        print(f"[{owner}] {message}", flush=True)
+
+    queue = LeaseQueue(queue_path(folder))
+    try:
+        probe_cache = ProbeCache()
+    except Exception as e:
+        probe_cache = None
+        log(f"Probe cache unavailable ({e}); durations are not checked.")
+    watchdog = Watchdog(stall_timeout)
+    stages_before = measure_stages()
+    processed = failed = 0
+    while True:
+        path = queue.claim(owner, lease_seconds, largest_first=largest_first)
+        if path is None:
+            if queue.counts().get(LEASED):
+                # Others are still working; wait in case one of them dies and its lease runs out
+                time.sleep(min(lease_seconds / 4, 15))
+                continue
+            break
+        name = os.path.basename(path)
+        log(f"Claimed {name}")
+
+        def work(lease):
+            timeline = plan_video(path, probe_cache, ffprobe_path, snap)
+            return apply_chapters_to_copy(ffmpeg_path, path, timeline, log=log, watchdog=watchdog,
+                                          mkvpropedit_path=mkvpropedit_path, lease=lease)
+
+        try:
+            output = run_leased(queue, owner, path, work, log, lease_seconds)
+            log(f"{name}: Success ({os.path.basename(output)})")
+        except JobFailed as e:
+            log(f"{name}: {e.status}")
+            failed += not e.status.startswith("Skipped")
+        except Exception as e:
+            log(f"{name}: Failed: {e}")
+            failed += 1
+        processed += 1
+    for label, reason in watchdog.stalls:
+        log(f"Watchdog killed a stalled FFmpeg run: {label}: {reason}")
+    log(f"No jobs left; processed {processed}, {failed} failed.")
+    try:
+        ThroughputHistory().record_since(stages_before)
+    except Exception as e:
+        log(f"Could not save the throughput measurements ({e}).")
+    queue.close()
+    if metrics_writer is not None:
+        metrics_writer.stop()
+    return failed
+
+
+def _worker_process(args):
+    args = list(args)
+    if args[-1]:
+        # One metrics file per process ("batch.prom" -> "batch.1234.prom"), each labelled with its worker
+        base, ext = os.path.splitext(args[-1])
+        args[-1] = f"{base}.{os.getpid()}{ext}"
+    return run_worker(*args)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Applies companion chapter files to the videos of a folder, writing '_chapters' copies. "
+                    "Any number of workers (and GUI batches), on this or other machines, can run on the same "
+                    "folder at once: they share a lease queue stored in the folder, so each video is done once.")
+    parser.add_argument('folder', help="Batch folder (may be a network share)")
+    parser.add_argument('--processes', type=int, default=1, help="Worker processes to start on this machine")
+    parser.add_argument('--ffmpeg', help="Path to ffmpeg (default: next to this script, then PATH)")
+    parser.add_argument('--ffprobe', help="Path to ffprobe (default: next to this script, then PATH)")
+    parser.add_argument('--mkvpropedit', help="Path to mkvpropedit, used to clone and patch .mkv files instead of "
+                                              "remuxing (default: next to this script, then PATH)")
+    parser.add_argument('--lease', type=float, default=DEFAULT_LEASE_SECONDS,
+                        help="Seconds a claim stays valid without a heartbeat")
+    parser.add_argument('--snap', action='store_true', help="Snap chapter starts to keyframes")
+    parser.add_argument('--largest-first', action='store_true', help="Claim the largest videos first")
+    parser.add_argument('--stall-timeout', type=float, default=DEFAULT_STALL_TIMEOUT,
+                        help="Seconds without progress before an FFmpeg run counts as hung and is killed")
+    parser.add_argument('--metrics-file', help="Keep job metrics in this file while running: Prometheus text for "
+                                               "*.prom (node_exporter textfile collector), OpenMetrics otherwise. "
+                                               "With --processes, each process writes its own file")
+    parser.add_argument('--dry-run', action='store_true',
+                        help="Only print what would be done with each video and the estimated bytes moved, "
+                             "temporary space and time (see batch_plan.py), then exit")
+    args = parser.parse_args(argv)
+
+    folder = os.path.abspath(args.folder)
+    ffmpeg_path = args.ffmpeg or find_tool('ffmpeg')
+    ffprobe_path = args.ffprobe or find_tool('ffprobe')
+    if args.dry_run:
+        try:
+            probe_cache = ProbeCache()
+        except Exception:
+            probe_cache = None
+        plan = plan_batch(folder, probe_cache, ffprobe_path, args.mkvpropedit or find_tool('mkvpropedit'),
+                          snap=args.snap, jobs_per_volume=args.processes)
+        print("\n".join(format_plan(plan)))
+        return 0 if plan['totals']['fits'] else 1
+    if not ffmpeg_path:
+        print("FFmpeg not found. Place it next to this script, put it on PATH or pass --ffmpeg.", file=sys.stderr)
+        return 2
+
+    queue = LeaseQueue(queue_path(folder))
+    videos, queued = enqueue_folder(queue, folder)
+    print(f"{videos} video(s) with chapter files in {folder}; {queued} newly queued.", flush=True)
+    queue.close()
+
+    worker_args = (folder, ffmpeg_path, ffprobe_path, args.lease, args.snap, args.largest_first,
+                   args.mkvpropedit or find_tool('mkvpropedit'), args.stall_timeout, args.metrics_file)
+    if args.processes <= 1:
+        failed = run_worker(*worker_args)
+    else:
+        with multiprocessing.Pool(args.processes) as pool:
+            failed = sum(pool.map(_worker_process, [worker_args] * args.processes, chunksize=1))
+
+    queue = LeaseQueue(queue_path(folder))
+    counts = queue.counts()
+    print("Queue: " + ", ".join(f"{count} {state}" for state, count in sorted(counts.items())), flush=True)
+    for path, state, owner, status in queue.results():
+        print(f"- {os.path.basename(path)}: {status or state} ({owner or 'unclaimed'})")
+    queue.close()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
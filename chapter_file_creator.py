@@ -2,11 +2,24 @@ import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, scrolledtext
 import os
 import threading
-import re # For sanitizing filenames
 import subprocess
 import sys
 import time
-import json
+
+from chapter_files import ChapterWriteBehind, ChapterReadAhead
+from chapter_timeline import ChapterTimeline, ms_to_hms, ms_to_timecode
+from chapter_index import ChapterIndex
+from chapter_normalize import normalize_chapter_text
+from folder_access import FolderAccessor
+from library_scan import build_library, count_chapters, is_video_file
+from library_view import LibraryView
+from media_analysis import AnalysisCancelled, NUMPY_AVAILABLE, suggest_chapters
+from waveform import WaveformCache
+from waveform_view import WaveformView
+from thumbnails import ThumbnailCache, ThumbnailLoader
+from thumbnail_view import ThumbnailStrip
+from probe_cache import ProbeCache, probe_file
+from tool_paths import find_tool
 
 # Try to import moviepy for video duration
 try:
@@ -15,17 +28,24 @@ try:
 except ImportError:
     MOVIEPY_AVAILABLE = False
 
-# Check for FFprobe availability
+# Check for FFprobe availability (next to the scripts, on PATH, or overridden, see tool_paths.py)
+FFPROBE_PATH = find_tool('ffprobe') or 'ffprobe'
+
 def check_ffprobe():
     try:
         # Use subprocess.DEVNULL for stdout/stderr to keep console clean
-        subprocess.run(['ffprobe', '-version'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=5)
+        subprocess.run([FFPROBE_PATH, '-version'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=5)
         return True
     except:
         return False
 
 FFPROBE_AVAILABLE = check_ffprobe()
 
+# Waveforms missing from the peaks cache are only computed automatically for files up to this size
+AUTO_WAVEFORM_MAX_BYTES = 200 * 1024 * 1024
+# Seconds to wait for queued chapter saves before asking whether to keep waiting (e.g. a stalled share)
+FLUSH_PROMPT_SECONDS = 10
+
 class ChapterCreatorApp:
     def __init__(self, root):
         self.root = root
@@ -34,10 +54,60 @@ class ChapterCreatorApp:
 
         self.folder_path = tk.StringVar()
         self.video_files = []
+        self.library_entries = [] # LibraryEntry per video, same order as video_files
+        self._chapter_count_requested = set() # Library rows whose chapter count is being read
         self.current_video_index = -1
         self.processing_batch = False
+        self.flushing_saves = False # Set while Finish or close waits for queued saves
+        self.close_requested = False # The window was closed during that wait; it closes once the wait is over
+
+        # Chapter files are written in the background so "Save & Next" never waits on the share
+        self.chapter_writer = ChapterWriteBehind(on_saved=self._on_chapter_file_saved,
+                                                 on_error=self._on_chapter_file_save_error)
+        # Existing chapter files for the next few videos are fetched ahead of time
+        self.chapter_reader = ChapterReadAhead()
+        self.read_ahead_depth = 5
+        # Folder listings and network diagnostics run off the Tk thread
+        self.folder_accessor = FolderAccessor()
+        self.access_job = None
+        self.diagnostics_job = None
+        self._partial_video_count = 0
+        # Durations are stored in the probe cache shared with main_app.py
+        try:
+            self.probe_cache = ProbeCache()
+            probe_cache_error = None
+        except Exception as e:
+            self.probe_cache = None
+            probe_cache_error = e
+        # Chapter suggestions run in the background and are cancelled when the video changes
+        self.suggest_cancel = None
+        # Waveform peaks are cached on disk next to the probe data
+        try:
+            self.waveform_cache = WaveformCache() if NUMPY_AVAILABLE else None
+        except Exception:
+            self.waveform_cache = None
+        self.waveform_cancel = None
+        self._preview_update_pending = None
+        # Chapter thumbnails are grabbed in parallel and kept in an on-disk LRU cache
+        try:
+            thumbnail_cache = ThumbnailCache()
+        except Exception:
+            thumbnail_cache = None
+        self.thumbnail_loader = ThumbnailLoader(thumbnail_cache)
+        self.thumbnail_cancel = None
+        # Chapter titles of every scanned folder, searchable without opening the .txt files
+        try:
+            self.chapter_index = ChapterIndex()
+        except Exception:
+            self.chapter_index = None
+        self._chapter_videos = {} # Chapter file path -> video path, for indexing saves
+        self._search_pending = None
+        self.search_text = tk.StringVar()
 
         self.setup_ui()
+        if probe_cache_error is not None:
+            self.log_message(f"WARNING: Probe cache unavailable ({probe_cache_error}). Durations will not be remembered.")
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
 
     def setup_ui(self):
         # Folder Selection Frame
@@ -53,7 +123,52 @@ class ChapterCreatorApp:
         
         # Add network troubleshooting button
         ttk.Button(folder_frame, text="Test Network Path", command=self.test_network_path).grid(row=1, column=0, padx=5, pady=5, sticky="w")
-        ttk.Button(folder_frame, text="Start Chapter Creation Batch", command=self.start_chapter_creation_batch).grid(row=1, column=1, columnspan=2, padx=5, pady=5, sticky="ew")
+        self.start_batch_button = ttk.Button(folder_frame, text="Start Chapter Creation Batch", command=self.start_chapter_creation_batch)
+        self.start_batch_button.grid(row=1, column=1, padx=5, pady=5, sticky="ew")
+        ttk.Button(folder_frame, text="Cancel Access", command=self.cancel_folder_access).grid(row=1, column=2, padx=5, pady=5, sticky="e")
+
+        # Optional panels share one notebook, so a new panel adds a tab instead of window height
+        panels = ttk.Notebook(self.root)
+        panels.pack(padx=10, pady=5, fill="both", expand=True)
+
+        # Library Tab: every discovered video with its chapter status
+        library_frame = ttk.Frame(panels)
+        panels.add(library_frame, text="Library (double-click a video to jump to it)")
+        self.library_view = LibraryView(
+            library_frame,
+            columns=(('name', 'Video', 330), ('chapter_file', 'Chapter File', 85), ('duration', 'Duration', 75),
+                     ('chapters', 'Chapters', 65), ('applied', 'Applied', 90)),
+            describe=self._describe_library_entry,
+            on_activate=self.jump_to_video,
+            on_visible=self._on_library_rows_visible,
+            rows=5)
+        self.library_view.pack(padx=5, pady=5, fill="both", expand=True)
+
+        # Search Tab: chapter titles across every folder scanned so far
+        search_frame = ttk.Frame(panels)
+        panels.add(search_frame, text="Search Chapters (double-click to open)")
+        search_entry = ttk.Entry(search_frame, textvariable=self.search_text)
+        search_entry.pack(padx=5, pady=(5, 0), fill="x")
+        search_entry.bind('<KeyRelease>', lambda event: self._schedule_chapter_search())
+        self.search_results = ttk.Treeview(search_frame, columns=('video', 'start', 'title'), show='headings', height=3)
+        for column, heading, width in (('video', 'Video', 330), ('start', 'Start', 75), ('title', 'Chapter', 300)):
+            self.search_results.heading(column, text=heading)
+            self.search_results.column(column, width=width, stretch=(column != 'start'))
+        self.search_results.pack(padx=5, pady=5, fill="both", expand=True)
+        self.search_results.bind('<Double-1>', self._open_search_result)
+
+        # Waveform Tab: audio overview with a marker per chapter
+        waveform_frame = ttk.Frame(panels)
+        panels.add(waveform_frame, text="Waveform (click to add a chapter)")
+        self.waveform_view = WaveformView(waveform_frame, on_click=self.add_chapter_at, height=80)
+        self.waveform_view.pack(side=tk.LEFT, padx=5, pady=5, fill="x", expand=True)
+        ttk.Button(waveform_frame, text="Compute", command=lambda: self.load_waveform(compute=True)).pack(side=tk.RIGHT, padx=5)
+
+        # Thumbnails Tab: one frame per chapter start
+        thumbnails_frame = ttk.Frame(panels)
+        panels.add(thumbnails_frame, text="Chapter Thumbnails")
+        self.thumbnail_strip = ThumbnailStrip(thumbnails_frame)
+        self.thumbnail_strip.pack(padx=5, pady=5, fill="x")
 
         # Current Video Info Frame
         video_info_frame = ttk.LabelFrame(self.root, text="Current Video")
@@ -78,8 +193,9 @@ class ChapterCreatorApp:
         chapters_frame = ttk.LabelFrame(self.root, text="Chapters Input/Editor (for current video)")
         chapters_frame.pack(padx=10, pady=5, fill="both", expand=True)
 
-        self.chapter_text_input = scrolledtext.ScrolledText(chapters_frame, wrap=tk.WORD, width=80, height=15)
+        self.chapter_text_input = scrolledtext.ScrolledText(chapters_frame, wrap=tk.WORD, width=80, height=9)
         self.chapter_text_input.pack(padx=5, pady=5, fill="both", expand=True)
+        self.chapter_text_input.bind('<KeyRelease>', lambda event: self._schedule_preview_update())
 
         # Action Buttons Frame
         action_buttons_frame = ttk.Frame(self.root)
@@ -88,6 +204,7 @@ class ChapterCreatorApp:
         action_buttons_frame.grid_columnconfigure(1, weight=1)
         action_buttons_frame.grid_columnconfigure(2, weight=1)
         action_buttons_frame.grid_columnconfigure(3, weight=1)
+        action_buttons_frame.grid_columnconfigure(4, weight=1)
 
         self.save_next_button = ttk.Button(action_buttons_frame, text="Save Chapters & Next Video", command=self.save_chapters_and_next)
         self.save_next_button.grid(row=0, column=0, padx=5, pady=5, sticky="ew")
@@ -101,11 +218,14 @@ class ChapterCreatorApp:
         self.finish_button = ttk.Button(action_buttons_frame, text="Finish Batch", command=self.finish_batch)
         self.finish_button.grid(row=0, column=3, padx=5, pady=5, sticky="ew")
 
+        self.suggest_button = ttk.Button(action_buttons_frame, text="Suggest Chapters", command=self.suggest_chapters_for_current)
+        self.suggest_button.grid(row=0, column=4, padx=5, pady=5, sticky="ew")
+
         # Status/Log Frame
         status_frame = ttk.LabelFrame(self.root, text="Status / Log")
         status_frame.pack(padx=10, pady=10, fill="both", expand=True)
 
-        self.status_text = scrolledtext.ScrolledText(status_frame, wrap=tk.WORD, width=80, height=8, state='disabled')
+        self.status_text = scrolledtext.ScrolledText(status_frame, wrap=tk.WORD, width=80, height=5, state='disabled')
         self.status_text.pack(padx=5, pady=5, fill="both", expand=True)
 
         # Initial state of buttons
@@ -129,6 +249,7 @@ class ChapterCreatorApp:
         self.skip_button.config(state='normal' if enable else 'disabled')
         self.format_button.config(state='normal' if enable else 'disabled')
         self.finish_button.config(state='normal' if enable else 'disabled')
+        self.suggest_button.config(state='normal' if enable else 'disabled')
         self.chapter_text_input.config(state='normal' if enable else 'disabled')
         self.copy_filename_button.config(state='normal' if enable else 'disabled')
         self.get_duration_button.config(state='normal' if enable else 'disabled')
@@ -147,9 +268,15 @@ class ChapterCreatorApp:
                                 "2. MoviePy: pip install moviepy")
             return
         
-        current_video_name = self.video_files[self.current_video_index]
+        video_index = self.current_video_index
+        current_video_name = self.video_files[video_index]
         video_path = os.path.join(self.folder_path.get(), current_video_name)
         
+        cached_duration = self.library_entries[video_index].duration
+        if cached_duration is not None:
+            self._show_duration(cached_duration, "cache")
+            return
+        
         def get_duration_thread():
             try:
                 self.root.after(0, lambda: self.log_message(f"Getting duration for: {current_video_name}"))
@@ -158,25 +285,17 @@ class ChapterCreatorApp:
                 duration_seconds = None
                 method_used = None
                 
-                # Try FFprobe first (more reliable and faster)
+                # Try FFprobe first (more reliable and faster); results go to the shared probe cache
                 if FFPROBE_AVAILABLE:
                     try:
-                        cmd = [
-                            'ffprobe', '-v', 'quiet', '-print_format', 'json',
-                            '-show_format', video_path
-                        ]
-                        # Use shell=True for network paths on Windows sometimes helps, but can be security risk
                         # Sticking with shell=False for safety and general cross-platform compatibility
-                        result = subprocess.run(cmd, capture_output=True, text=True, timeout=60) # Increased timeout
-                        
-                        if result.returncode == 0:
-                            data = json.loads(result.stdout)
-                            duration_seconds = float(data['format']['duration'])
-                            method_used = "FFprobe"
+                        if self.probe_cache is not None:
+                            record = self.probe_cache.probe(video_path, FFPROBE_PATH, timeout=60) # Increased timeout
                         else:
-                            # Log ffprobe's stderr for better debugging
-                            raise Exception(f"FFprobe returned error code {result.returncode}. Stderr: {result.stderr}")
-                            
+                            record = probe_file(video_path, FFPROBE_PATH, timeout=60)
+                        if record.get('duration_ms') is not None:
+                            duration_seconds = record['duration_ms'] / 1000
+                            method_used = "FFprobe"
                     except Exception as e:
                         self.root.after(0, lambda: self.log_message(f"FFprobe failed: {e}"))
                 
@@ -189,25 +308,16 @@ class ChapterCreatorApp:
                         with VideoFileClip(video_path) as clip:
                             duration_seconds = clip.duration
                         method_used = "MoviePy"
+                        if self.probe_cache is not None:
+                            self.probe_cache.update(video_path, duration_ms=int(round(duration_seconds * 1000)))
                     except Exception as e:
                         self.root.after(0, lambda: self.log_message(f"MoviePy also failed: {e}"))
                 
                 if duration_seconds is None:
                     raise Exception("All duration detection methods failed")
                 
-                # Convert to hours:minutes:seconds
-                hours = int(duration_seconds // 3600)
-                minutes = int((duration_seconds % 3600) // 60)
-                seconds = int(duration_seconds % 60)
-                
-                duration_str = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
-                total_seconds_str = f"({int(duration_seconds)} total seconds)"
-                
-                # Update UI in main thread
-                self.root.after(0, lambda: self.video_duration_label.config(
-                    text=f"Duration: {duration_str} {total_seconds_str}"))
-                self.root.after(0, lambda: self.log_message(
-                    f"Duration: {duration_str} {total_seconds_str} (via {method_used})"))
+                # Update UI (and the library's duration cache) in main thread
+                self.root.after(0, self._on_duration_known, video_index, duration_seconds, method_used)
                     
             except Exception as e:
                 error_msg = f"Error getting video duration: {e}"
@@ -230,6 +340,54 @@ class ChapterCreatorApp:
         # Run in background thread to avoid UI blocking
         threading.Thread(target=get_duration_thread, daemon=True).start()
 
+    def _on_duration_known(self, video_index, duration_seconds, method_used):
+        """Caches a probed duration on its library entry and shows it if that video is still current."""
+        if video_index < len(self.library_entries):
+            self.library_entries[video_index].duration = duration_seconds
+            self.library_view.refresh_entry(video_index)
+        if video_index == self.current_video_index:
+            self._show_duration(duration_seconds, method_used)
+
+    def _show_duration(self, duration_seconds, method_used):
+        duration_str = self.format_seconds_to_timecode(duration_seconds)
+        total_seconds_str = f"({int(duration_seconds)} total seconds)"
+        self.video_duration_label.config(text=f"Duration: {duration_str} {total_seconds_str}")
+        self.log_message(f"Duration: {duration_str} {total_seconds_str} (via {method_used})")
+
+    def _describe_library_entry(self, entry):
+        """Returns the library row values for an entry."""
+        duration = self.format_seconds_to_timecode(entry.duration) if entry.duration is not None else ""
+        chapters = entry.chapter_count if entry.chapter_count is not None else ""
+        return (entry.name, "Yes" if entry.has_chapter_file else "No", duration, chapters, entry.applied_state)
+
+    def _on_library_rows_visible(self, indices):
+        """Counts chapters in the background for visible rows whose count is not known yet."""
+        folder = self.folder_path.get()
+        wanted = [(index, os.path.join(folder, self.library_entries[index].chapter_file)) for index in indices
+                  if self.library_entries[index].has_chapter_file and self.library_entries[index].chapter_count is None
+                  and index not in self._chapter_count_requested]
+        if wanted:
+            self._chapter_count_requested.update(index for index, _ in wanted)
+            self.folder_accessor.submit(self._count_chapters_job, self.library_entries, wanted)
+
+    def _count_chapters_job(self, job, entries, wanted):
+        for index, chapter_file_path in wanted:
+            job.check()
+            hit, text = self.chapter_reader.get(chapter_file_path)
+            if not hit:
+                try:
+                    with open(chapter_file_path, 'r', encoding='utf-8') as f:
+                        text = f.read()
+                except OSError:
+                    continue
+            if text is not None:
+                self.root.after(0, self._on_chapter_count_known, entries, index, count_chapters(text))
+
+    def _on_chapter_count_known(self, entries, index, count):
+        if entries is self.library_entries: # Ignore results for a folder that is no longer shown
+            entries[index].chapter_count = count
+            self.library_view.refresh_entry(index)
+
     def format_current_chapters(self):
         """Formats the chapters currently in the text input."""
         current_content = self.chapter_text_input.get("1.0", tk.END).strip()
@@ -238,9 +396,190 @@ class ChapterCreatorApp:
         # Replace content in text widget
         self.chapter_text_input.delete("1.0", tk.END)
         self.chapter_text_input.insert("1.0", formatted_content)
+        self._update_chapter_previews()
         
         self.log_message("Formatted chapters - removed empty lines and standardized timecode format")
 
+    def suggest_chapters_for_current(self):
+        """Analyses the current video for scene changes and pauses and appends suggested chapters to the editor."""
+        if self.current_video_index < 0 or self.current_video_index >= len(self.video_files):
+            messagebox.showwarning("No Video", "No video file is currently loaded.")
+            return
+        ffmpeg_path = find_tool('ffmpeg')
+        if not NUMPY_AVAILABLE or ffmpeg_path is None:
+            messagebox.showerror("Suggestions Unavailable",
+                                 "Chapter suggestions need FFmpeg and NumPy.\n\n"
+                                 "Install options:\n"
+                                 "1. FFmpeg: https://ffmpeg.org/download.html\n"
+                                 "2. NumPy: pip install numpy")
+            return
+        
+        self._cancel_suggestions()
+        cancel = self.suggest_cancel = threading.Event()
+        video_index = self.current_video_index
+        current_video_name = self.video_files[video_index]
+        video_path = os.path.join(self.folder_path.get(), current_video_name)
+        cached_duration = self.library_entries[video_index].duration
+        self.log_message(f"Analysing {current_video_name} for chapter suggestions...")
+        
+        def suggest_thread():
+            try:
+                if cached_duration is not None:
+                    duration_ms = int(round(cached_duration * 1000))
+                elif self.probe_cache is not None and FFPROBE_AVAILABLE:
+                    duration_ms = self.probe_cache.duration_ms(video_path, FFPROBE_PATH, timeout=60)
+                elif FFPROBE_AVAILABLE:
+                    duration_ms = probe_file(video_path, FFPROBE_PATH, timeout=60).get('duration_ms')
+                else:
+                    duration_ms = None
+                if not duration_ms:
+                    raise Exception("The video duration is unknown (FFprobe is needed to read it).")
+                
+                suggestions = suggest_chapters(video_path, ffmpeg_path, duration_ms, cancel=cancel)
+                self.root.after(0, self._on_suggestions_ready, video_index, suggestions, cancel)
+            except AnalysisCancelled:
+                self.root.after(0, lambda: self.log_message(f"Chapter suggestions cancelled for: {current_video_name}"))
+            except Exception as e:
+                error_msg = f"Error suggesting chapters for {current_video_name}: {e}"
+                self.root.after(0, lambda: self.log_message(error_msg))
+        
+        threading.Thread(target=suggest_thread, daemon=True).start()
+
+    def _cancel_suggestions(self):
+        if self.suggest_cancel is not None:
+            self.suggest_cancel.set()
+            self.suggest_cancel = None
+
+    def _on_suggestions_ready(self, video_index, suggestions, cancel):
+        """Appends suggested chapters to the editor if the same video is still loaded."""
+        if cancel.is_set() or video_index != self.current_video_index or not self.processing_batch:
+            return
+        self.suggest_cancel = None
+        if not suggestions:
+            self.log_message("No chapter suggestions found for this video.")
+            return
+        lines = "\n".join(f"{ms_to_timecode(start_ms)} {reason}" for start_ms, reason in suggestions)
+        current_content = self.chapter_text_input.get("1.0", tk.END).strip()
+        self.chapter_text_input.insert(tk.END, f"\n{lines}" if current_content else lines)
+        self._update_chapter_previews()
+        self.log_message(f"Added {len(suggestions)} suggested chapter(s). Rename or remove them before saving.")
+
+    def load_waveform(self, compute=False):
+        """Shows the waveform of the current video from the peaks cache. A missing one is computed in
+           the background (the whole file is decoded) only for small files, or when compute is set."""
+        self._cancel_waveform()
+        if self.current_video_index < 0 or not self.video_files:
+            return
+        ffmpeg_path = find_tool('ffmpeg')
+        if self.waveform_cache is None or ffmpeg_path is None:
+            self.waveform_view.set_status("Waveform needs FFmpeg and NumPy.")
+            return
+        
+        cancel = self.waveform_cancel = threading.Event()
+        video_index = self.current_video_index
+        video_path = os.path.join(self.folder_path.get(), self.video_files[video_index])
+        entry = self.library_entries[video_index]
+        duration_ms = int(round(entry.duration * 1000)) if entry.duration is not None else None
+        # Decoding streams the whole file, which on a share competes with everything else reading it
+        compute = compute or entry.size <= AUTO_WAVEFORM_MAX_BYTES
+        self.waveform_view.set_status("Loading waveform...")
+        
+        def report_progress(fraction):
+            self.root.after(0, self._on_waveform_progress, video_index, fraction, cancel)
+        
+        def waveform_thread():
+            try:
+                result = self.waveform_cache.load_or_compute(
+                    video_path, ffmpeg_path, cancel, report_progress, duration_ms, compute)
+                if result is None:
+                    self.root.after(0, self._on_waveform_skipped, video_index, entry.size, cancel)
+                    return
+                mins, maxs, from_cache = result
+                self.root.after(0, self._on_waveform_ready, video_index, mins, maxs, from_cache, cancel)
+            except AnalysisCancelled:
+                pass
+            except Exception as e:
+                error_msg = f"Could not build waveform: {e}"
+                self.root.after(0, lambda: self.log_message(error_msg))
+                self.root.after(0, self._on_waveform_failed, video_index, cancel)
+        
+        threading.Thread(target=waveform_thread, daemon=True).start()
+
+    def _cancel_waveform(self):
+        if self.waveform_cancel is not None:
+            self.waveform_cancel.set()
+            self.waveform_cancel = None
+
+    def _on_waveform_progress(self, video_index, fraction, cancel):
+        if not cancel.is_set() and video_index == self.current_video_index:
+            self.waveform_view.set_status(f"Computing waveform... {int(fraction * 100)}%")
+
+    def _on_waveform_ready(self, video_index, mins, maxs, from_cache, cancel):
+        if cancel.is_set() or video_index != self.current_video_index:
+            return
+        self.waveform_cancel = None
+        self.waveform_view.set_peaks(mins, maxs)
+        self.waveform_view.set_markers(self._editor_timeline().starts)
+        if not from_cache:
+            self.log_message("Waveform computed and cached.")
+
+    def _on_waveform_skipped(self, video_index, size, cancel):
+        if not cancel.is_set() and video_index == self.current_video_index:
+            self.waveform_cancel = None
+            self.waveform_view.set_status(f"Not computed yet ({size / (1024 * 1024):.0f} MB to decode): click Compute.")
+
+    def _on_waveform_failed(self, video_index, cancel):
+        if not cancel.is_set() and video_index == self.current_video_index:
+            self.waveform_view.set_status("Waveform unavailable.")
+
+    def _schedule_preview_update(self):
+        # Refresh once the user pauses typing, not on every keystroke
+        if self._preview_update_pending is not None:
+            self.root.after_cancel(self._preview_update_pending)
+        self._preview_update_pending = self.root.after(500, self._update_chapter_previews)
+
+    def _editor_timeline(self):
+        return ChapterTimeline.parse(self.chapter_text_input.get("1.0", tk.END))
+
+    def _update_chapter_previews(self):
+        """Moves the waveform markers and thumbnail slots to the chapters currently in the editor."""
+        self._preview_update_pending = None
+        timeline = self._editor_timeline()
+        self.waveform_view.set_markers(timeline.starts)
+        self._refresh_thumbnails(timeline)
+
+    def _refresh_thumbnails(self, timeline):
+        if self.current_video_index < 0 or self.current_video_index >= len(self.video_files):
+            return
+        video_path = os.path.join(self.folder_path.get(), self.video_files[self.current_video_index])
+        missing = self.thumbnail_strip.set_chapters([(start, title) for start, _, title in timeline], video_path)
+        self._cancel_thumbnails()
+        ffmpeg_path = find_tool('ffmpeg')
+        if missing and ffmpeg_path is not None:
+            self.thumbnail_cancel = self.thumbnail_loader.request(
+                ffmpeg_path, video_path, missing,
+                lambda ms, data: self.root.after(0, self._on_thumbnail_ready, video_path, ms, data))
+
+    def _cancel_thumbnails(self):
+        if self.thumbnail_cancel is not None:
+            self.thumbnail_cancel.set()
+            self.thumbnail_cancel = None
+
+    def _on_thumbnail_ready(self, video_path, ms, data):
+        if self.thumbnail_strip.source == video_path:
+            self.thumbnail_strip.set_image(ms, data)
+
+    def add_chapter_at(self, ms):
+        """Appends a chapter line for a point clicked on the waveform."""
+        if not self.processing_batch or self.current_video_index < 0:
+            return
+        line = f"{ms_to_timecode(ms)} Chapter"
+        current_content = self.chapter_text_input.get("1.0", tk.END).strip()
+        self.chapter_text_input.insert(tk.END, f"\n{line}" if current_content else line)
+        self.chapter_text_input.see(tk.END)
+        self._update_chapter_previews()
+        self.log_message(f"Added chapter at {ms_to_timecode(ms)}. Rename it, then use Format Chapters to sort.")
+
     def format_seconds_to_timecode(self, seconds):
         """Converts seconds to HH:MM:SS format."""
         hours = int(seconds // 3600)
@@ -280,7 +619,16 @@ class ChapterCreatorApp:
             messagebox.showerror("Error", "Please enter or select a folder path first.")
             return
             
+        if self.diagnostics_job and not self.diagnostics_job.done():
+            self.log_message("Network path test is already running.")
+            return
+            
         self.log_message(f"Initiating network path test for: {folder}")
+        self.diagnostics_job = self.folder_accessor.submit(self._run_network_diagnostics, folder)
+
+    def _run_network_diagnostics(self, job, folder):
+        """Runs the network path checks on a background thread, logging through the Tk thread."""
+        log = self._log_from_thread
         
         folder = os.path.normpath(folder) # Normalize path
         
@@ -288,99 +636,92 @@ class ChapterCreatorApp:
             parts = folder.split('\\')
             if len(parts) >= 3: # Should be at least \\server\share
                 server_name = parts[2]
-                self.log_message(f"Detected UNC network path. Server: {server_name}")
+                log(f"Detected UNC network path. Server: {server_name}")
                 
                 # Test ping to server
                 try:
-                    self.log_message(f"Attempting to ping server: {server_name}...")
+                    log(f"Attempting to ping server: {server_name}...")
                     # Using -n 1 for Windows ping, -c 1 for Linux/macOS
                     ping_cmd = ['ping', '-n', '1', server_name] if sys.platform.startswith('win') else ['ping', '-c', '1', server_name]
                     result = subprocess.run(ping_cmd, 
                                           capture_output=True, text=True, timeout=10)
                     if result.returncode == 0:
-                        self.log_message(f"✓ Server '{server_name}' is reachable.")
+                        log(f"✓ Server '{server_name}' is reachable.")
                     else:
-                        self.log_message(f"✗ Server '{server_name}' is not directly reachable (ping failed).")
-                        self.log_message(f"   Ping output: {result.stdout.strip()} {result.stderr.strip()}")
-                        self.log_message("   Suggestion: Check network connection, VPN, or firewall settings on server.")
+                        log(f"✗ Server '{server_name}' is not directly reachable (ping failed).")
+                        log(f"   Ping output: {result.stdout.strip()} {result.stderr.strip()}")
+                        log("   Suggestion: Check network connection, VPN, or firewall settings on server.")
                 except Exception as e:
-                    self.log_message(f"Ping test to '{server_name}' failed unexpectedly: {e}")
+                    log(f"Ping test to '{server_name}' failed unexpectedly: {e}")
                     
+                job.check()
                 # Test net use command (Windows specific)
                 try:
-                    self.log_message("Checking 'net use' for mapped drives/connections...")
+                    log("Checking 'net use' for mapped drives/connections...")
                     result = subprocess.run(['net', 'use'], capture_output=True, text=True, timeout=10)
                     # Check if the share path (or part of it) is listed
                     if any(folder_part in result.stdout for folder_part in [folder, '\\\\'.join(parts[:3])]):
-                        self.log_message("✓ Active network connection or mapped drive found for this path/server.")
+                        log("✓ Active network connection or mapped drive found for this path/server.")
                     else:
-                        self.log_message("! No active 'net use' connection found for this path.")
-                        self.log_message("   Suggestion: You might need to map the drive (e.g., 'net use Z: \\\\server\\share') or authenticate.")
-                    self.log_message(f"   'net use' output (first 5 lines): \n{chr(10).join(result.stdout.splitlines()[:5])}")
+                        log("! No active 'net use' connection found for this path.")
+                        log("   Suggestion: You might need to map the drive (e.g., 'net use Z: \\\\server\\share') or authenticate.")
+                    log(f"   'net use' output (first 5 lines): \n{chr(10).join(result.stdout.splitlines()[:5])}")
                 except Exception as e:
-                    self.log_message(f"'net use' command failed: {e}")
+                    log(f"'net use' command failed: {e}")
         elif not sys.platform.startswith('win'):
-             self.log_message("UNC path testing (\\\\server\\share) is primarily for Windows.")
-             self.log_message("On Linux/macOS, ensure the share is mounted correctly (e.g., via SMB/CIFS mount).")
+             log("UNC path testing (\\\\server\\share) is primarily for Windows.")
+             log("On Linux/macOS, ensure the share is mounted correctly (e.g., via SMB/CIFS mount).")
 
 
+        job.check()
         # Test actual folder access (applies to all OS and path types)
-        self.log_message(f"Attempting to access folder directly: {folder}")
+        log(f"Attempting to access folder directly: {folder}")
         try:
             if os.path.isdir(folder):
                 files = os.listdir(folder)
-                self.log_message(f"✓ Folder is accessible. Contains {len(files)} items.")
+                log(f"✓ Folder is accessible. Contains {len(files)} items.")
             else:
-                self.log_message("✗ Folder path does not exist or is not a directory.")
+                log("✗ Folder path does not exist or is not a directory.")
         except Exception as e:
-            self.log_message(f"✗ Folder access failed: {e}")
-            self.log_message("   Suggestions for network paths:")
-            self.log_message("   1. **Manual Authentication**: Try accessing the path directly in Windows File Explorer (e.g., paste \\\\alp-mac\\Storage into the address bar). This often triggers a credential prompt.")
-            self.log_message("   2. **Map Network Drive**: Map \\\\alp-mac\\Storage to a drive letter (e.g., Z:) and then select Z: in this application.")
-            self.log_message("   3. **Check Credentials**: Open Windows Credential Manager and ensure stored credentials for 'alp-mac' are correct.")
-            self.log_message("   4. **Mac Sharing Settings**: Verify that SMB/File Sharing is enabled on your Mac, and the folder is shared with appropriate permissions.")
-            self.log_message("   5. **Firewall**: Temporarily disable firewalls on both machines to test connectivity.")
+            log(f"✗ Folder access failed: {e}")
+            log("   Suggestions for network paths:")
+            log("   1. **Manual Authentication**: Try accessing the path directly in Windows File Explorer (e.g., paste \\\\alp-mac\\Storage into the address bar). This often triggers a credential prompt.")
+            log("   2. **Map Network Drive**: Map \\\\alp-mac\\Storage to a drive letter (e.g., Z:) and then select Z: in this application.")
+            log("   3. **Check Credentials**: Open Windows Credential Manager and ensure stored credentials for 'alp-mac' are correct.")
+            log("   4. **Mac Sharing Settings**: Verify that SMB/File Sharing is enabled on your Mac, and the folder is shared with appropriate permissions.")
+            log("   5. **Firewall**: Temporarily disable firewalls on both machines to test connectivity.")
+        log("Network path test finished.")
 
 
-    def try_access_with_retry(self, folder, max_retries=3):
-        """Attempts to access folder with retries and different methods."""
-        folder = os.path.normpath(folder) # Normalize path once
+    def try_access_with_retry(self, folder, max_retries=5):
+        """Starts a background folder listing with exponential backoff between attempts.
+           Returns the AccessJob; _on_folder_listing_done runs on the Tk thread when it ends."""
+        job = self.folder_accessor.list_folder(folder, log=self._log_from_thread,
+                                               on_partial=self._on_partial_listing, max_retries=max_retries)
+        job.future.add_done_callback(lambda future: self.root.after(0, self._on_folder_listing_done, job, folder))
+        return job
 
-        for attempt in range(max_retries):
-            self.log_message(f"Access attempt {attempt + 1}/{max_retries} for: {folder}")
-            try:
-                # On Windows, for UNC paths, sometimes opening in explorer helps trigger auth
-                if sys.platform.startswith('win') and folder.startswith('\\\\') and attempt == 0:
-                    try:
-                        self.log_message("   Attempting to open path in Explorer to trigger potential authentication...")
-                        # Use subprocess.Popen to avoid waiting for explorer to close
-                        subprocess.Popen(f'explorer "{folder}"', shell=True)
-                        time.sleep(1) # Give Explorer a moment to start/authenticate
-                    except Exception as e:
-                        self.log_message(f"   Could not open Explorer (may not be necessary): {e}")
+    def _log_from_thread(self, message):
+        """Logs a message from a background thread via the Tk event loop."""
+        self.root.after(0, self.log_message, message)
 
-                # Check if directory exists and is accessible
-                if os.path.isdir(folder):
-                    files = os.listdir(folder)
-                    self.log_message(f"✓ Successfully accessed folder on attempt {attempt + 1}.")
-                    return files
-                else:
-                    raise OSError(f"Path is not a directory or does not exist: {folder}")
-                    
-            except OSError as e:
-                self.log_message(f"✗ Attempt {attempt + 1} failed: {e}")
-                
-                if attempt < max_retries - 1:
-                    time.sleep(2)  # Longer pause between attempts for network
-                else:
-                    # Final attempt failed
-                    raise e
-            except Exception as e: # Catch other potential errors
-                self.log_message(f"✗ Unexpected error on attempt {attempt + 1}: {e}")
-                if attempt < max_retries - 1:
-                    time.sleep(2)
-                else:
-                    raise e
+    def _on_partial_listing(self, names):
+        """Shows how many videos have been found so far while a slow share is enumerated."""
+        self._partial_video_count += sum(1 for name in names if self._is_video_file(name))
+        count = self._partial_video_count
+        self.root.after(0, lambda: self.current_video_label.config(text=f"Scanning folder... {count} videos found so far"))
+
+    def cancel_folder_access(self):
+        """Cancels any running folder listing or network test."""
+        cancelled = False
+        for job in (self.access_job, self.diagnostics_job):
+            if job and not job.done():
+                job.cancel()
+                cancelled = True
+        self.log_message("Cancelling folder access..." if cancelled else "No folder access is running.")
+
+    def _is_video_file(self, name):
+        return is_video_file(name)
 
 
     def browse_folder(self):
@@ -391,6 +732,8 @@ class ChapterCreatorApp:
             self.log_message(f"Selected folder: {folder_selected}")
             self.current_video_label.config(text="Ready to start batch.")
             self._set_ui_state(False) # Disable action buttons until batch starts
+            if self.access_job and not self.access_job.done():
+                self.access_job.cancel() # A listing of the previous folder is no longer wanted
 
     def start_chapter_creation_batch(self):
         """Starts the batch process for creating chapter files."""
@@ -399,55 +742,66 @@ class ChapterCreatorApp:
             messagebox.showerror("Error", "Please select a folder first.")
             return
 
+        if self.flushing_saves:
+            return
         if self.processing_batch:
             self.log_message("Batch processing is already active.")
             return
 
+        if self.access_job and not self.access_job.done():
+            self.log_message("Folder access is already in progress. Use 'Cancel Access' to stop it.")
+            return
+
         self.clear_log()
         self.log_message(f"Starting batch chapter file creation in: {folder}")
         
-        try:
-            # Use retry mechanism for network paths
-            files = self.try_access_with_retry(folder)
-            
-            # Find video files (common extensions)
-            self.video_files = sorted([
-                f for f in files
-                if f.lower().endswith(('.mp4', '.mkv', '.avi', '.mov', '.webm', '.flv', '.ts')) # Added .ts
-            ])
-
-        except Exception as e: # Catch all exceptions during folder access for detailed logging
-            error_msg = str(e)
-            self.log_message(f"CRITICAL: Error accessing the folder: {error_msg}")
-            
-            # Provide specific guidance based on common Windows network errors
-            suggestion = (
-                "Troubleshooting Steps for Network Access Errors:\n\n"
-                "1. **Manual Authentication**: Try accessing the path directly in Windows File Explorer (e.g., paste \\\\alp-mac\\Storage into the address bar). This often triggers a credential prompt that can cache credentials for Python.\n\n"
-                "2. **Map Network Drive**: Map the network share to a local drive letter (e.g., Z:) and then select the mapped drive in this application. This is often the most reliable method for Windows.\n"
-                "   - To map a drive: Open 'This PC' (or 'My Computer'), click 'Map network drive', choose a letter, and enter '\\\\alp-mac\\Storage'.\n"
-                "   - Or via Command Prompt (Admin): `net use Z: \"\\\\alp-mac\\Storage\" /persistent:yes` (enter your Mac username/password when prompted).\n\n"
-                "3. **Windows Credential Manager**: Ensure correct credentials for 'alp-mac' are saved. Search for 'Credential Manager' in Windows, go to 'Windows Credentials', and add a new generic credential if needed (Internet or network address: `alp-mac`).\n\n"
-                "4. **Mac Sharing Settings**: Double-check that SMB/File Sharing is enabled on your Mac (System Settings -> General -> Sharing -> File Sharing -> Options -> Share files and folders using SMB). Ensure the specific folder is shared and the user you're authenticating with has read/write permissions.\n\n"
-                "5. **Firewall**: Temporarily disable firewalls on both your Windows machine and your Mac to rule out network blocking.\n\n"
-                "6. **VPN**: If you're on a VPN, ensure it's connected and configured to allow local network access."
-            )
-            
-            # Refine error message based on common specific error types
-            if "Invalid Signature" in error_msg or "-2146893818" in error_msg or "Access is denied" in error_msg:
-                 detailed_error_type = "Network Authentication/Permission Issue"
-            elif "not a directory" in error_msg or "The network path was not found" in error_msg:
-                 detailed_error_type = "Path Not Found / Share Unavailable"
-            else:
-                detailed_error_type = "General Folder Access Issue"
+        cached_files = self.folder_accessor.last_good_listing(folder)
+        if cached_files is not None:
+            cached_videos = sum(1 for f in cached_files if self._is_video_file(f))
+            self.log_message(f"Last known listing has {cached_videos} video files; refreshing in the background...")
+        
+        # Use retry mechanism for network paths; the UI stays responsive while it runs
+        self._partial_video_count = 0
+        self.current_video_label.config(text="Accessing folder...")
+        self.access_job = self.try_access_with_retry(folder)
 
-            messagebox.showerror(f"Folder Access Error ({detailed_error_type})", suggestion)
+    def _on_folder_listing_done(self, job, folder):
+        """Continues starting the batch once the background folder listing has finished."""
+        if job is not self.access_job:
+            return # Superseded by a newer request
+        self.access_job = None
+        
+        if job.cancelled:
+            self.log_message("Folder access cancelled.")
+            self.current_video_label.config(text="Ready to start batch.")
             return
+        
+        try:
+            files = job.future.result()
+        except Exception as e: # Catch all exceptions during folder access for detailed logging
+            files = self.folder_accessor.last_good_listing(folder)
+            if files is None:
+                self.current_video_label.config(text="Folder access failed.")
+                self._show_folder_access_error(e)
+                return
+            self.log_message(f"WARNING: Folder access failed ({e}). Using the last known listing of this folder.")
+        
+        # Find video files (common extensions) and their chapter status from the same listing
+        self.library_entries = build_library(files)
+        self._chapter_count_requested = set()
+        self._load_cached_durations(folder, self.library_entries)
+        self.video_files = [entry.name for entry in self.library_entries]
+        self.library_view.set_entries(self.library_entries)
+        if self.chapter_index is not None:
+            durations = {os.path.join(folder, entry.name): int(entry.duration * 1000)
+                         for entry in self.library_entries if entry.duration}
+            threading.Thread(target=self._index_folder, args=(folder, files, durations), daemon=True).start()
 
         if not self.video_files:
             self.log_message("No video files found in the selected folder. Please check the folder content and selected path.")
             self.processing_batch = False
             self._set_ui_state(False)
+            self.current_video_label.config(text="No video files found.")
             return
 
         self.log_message(f"Found {len(self.video_files)} video files.")
@@ -456,6 +810,94 @@ class ChapterCreatorApp:
         self._set_ui_state(True) # Enable action buttons
         self.process_next_video()
 
+    def _load_cached_durations(self, folder, entries):
+        """Fills in durations already known to the probe cache with one bulk query (no ffprobe runs)."""
+        if self.probe_cache is None:
+            return
+        paths = {os.path.join(folder, entry.name): entry for entry in entries}
+        try:
+            records = self.probe_cache.get_many({path: (entry.size, entry.mtime_ns) for path, entry in paths.items()})
+        except Exception as e:
+            self.log_message(f"Warning: Could not read the probe cache: {e}")
+            return
+        for path, record in records.items():
+            if record.get('duration_ms') is not None:
+                paths[path].duration = record['duration_ms'] / 1000
+        if records:
+            self.log_message(f"{len(records)} video durations loaded from the probe cache.")
+
+    def _index_folder(self, folder, files, durations):
+        """Brings the chapter index up to date with a folder listing (runs on a background thread)."""
+        try:
+            result = self.chapter_index.update_folder(folder, files, durations)
+            if result['read'] or result['removed']:
+                self._log_from_thread(f"Chapter index: {result['read']} chapter file(s) indexed, "
+                                      f"{result['unchanged']} unchanged, {result['removed']} removed.")
+        except Exception as e:
+            self._log_from_thread(f"Warning: Could not update the chapter index: {e}")
+
+    def _schedule_chapter_search(self):
+        # Search once typing pauses
+        if self._search_pending is not None:
+            self.root.after_cancel(self._search_pending)
+        self._search_pending = self.root.after(250, self._run_chapter_search)
+
+    def _run_chapter_search(self):
+        self._search_pending = None
+        self.search_results.delete(*self.search_results.get_children())
+        if self.chapter_index is None:
+            return
+        try:
+            results = self.chapter_index.search(self.search_text.get())
+        except Exception as e:
+            self.log_message(f"Chapter search failed: {e}")
+            return
+        for index, (video_path, start_ms, end_ms, title) in enumerate(results):
+            self.search_results.insert('', 'end', iid=str(index), values=(video_path, ms_to_hms(start_ms), title))
+
+    def _open_search_result(self, event):
+        """Jumps to the video of a search hit if it is in the current batch; otherwise copies its path."""
+        selection = self.search_results.selection()
+        if not selection:
+            return
+        video_path = self.search_results.item(selection[0], 'values')[0]
+        folder, name = os.path.split(video_path)
+        if (self.processing_batch and name in self.video_files and
+                os.path.normcase(os.path.abspath(folder)) == os.path.normcase(os.path.abspath(self.folder_path.get()))):
+            self.jump_to_video(self.video_files.index(name))
+        else:
+            self.root.clipboard_clear()
+            self.root.clipboard_append(video_path)
+            self.log_message(f"Not in the current batch; path copied to clipboard: {video_path}")
+
+    def _show_folder_access_error(self, error):
+        """Logs a folder access failure and shows troubleshooting guidance."""
+        error_msg = str(error)
+        self.log_message(f"CRITICAL: Error accessing the folder: {error_msg}")
+        
+        # Provide specific guidance based on common Windows network errors
+        suggestion = (
+            "Troubleshooting Steps for Network Access Errors:\n\n"
+            "1. **Manual Authentication**: Try accessing the path directly in Windows File Explorer (e.g., paste \\\\alp-mac\\Storage into the address bar). This often triggers a credential prompt that can cache credentials for Python.\n\n"
+            "2. **Map Network Drive**: Map the network share to a local drive letter (e.g., Z:) and then select the mapped drive in this application. This is often the most reliable method for Windows.\n"
+            "   - To map a drive: Open 'This PC' (or 'My Computer'), click 'Map network drive', choose a letter, and enter '\\\\alp-mac\\Storage'.\n"
+            "   - Or via Command Prompt (Admin): `net use Z: \"\\\\alp-mac\\Storage\" /persistent:yes` (enter your Mac username/password when prompted).\n\n"
+            "3. **Windows Credential Manager**: Ensure correct credentials for 'alp-mac' are saved. Search for 'Credential Manager' in Windows, go to 'Windows Credentials', and add a new generic credential if needed (Internet or network address: `alp-mac`).\n\n"
+            "4. **Mac Sharing Settings**: Double-check that SMB/File Sharing is enabled on your Mac (System Settings -> General -> Sharing -> File Sharing -> Options -> Share files and folders using SMB). Ensure the specific folder is shared and the user you're authenticating with has read/write permissions.\n\n"
+            "5. **Firewall**: Temporarily disable firewalls on both your Windows machine and your Mac to rule out network blocking.\n\n"
+            "6. **VPN**: If you're on a VPN, ensure it's connected and configured to allow local network access."
+        )
+        
+        # Refine error message based on common specific error types
+        if "Invalid Signature" in error_msg or "-2146893818" in error_msg or "Access is denied" in error_msg:
+             detailed_error_type = "Network Authentication/Permission Issue"
+        elif "not a directory" in error_msg or "The network path was not found" in error_msg:
+             detailed_error_type = "Path Not Found / Share Unavailable"
+        else:
+            detailed_error_type = "General Folder Access Issue"
+
+        messagebox.showerror(f"Folder Access Error ({detailed_error_type})", suggestion)
+
     def has_intro_chapter(self, content):
         """Checks if the content already has a chapter at 00:00:00."""
         lines = content.strip().split('\n')
@@ -468,76 +910,10 @@ class ChapterCreatorApp:
     def format_chapters(self, content):
         """Formats chapter content to HH:MM:SS:FF and detects left/right timecode.
            Ensures 00:00:00:00 Intro is always present first."""
-        
-        lines = content.strip().split('\n')
-        formatted_lines = []
-
-        timecode_regex = re.compile(r'(?:(\d{1,2}):)?(\d{1,2}):(\d{2})(?::(\d{1,2}))?') # Added optional frames
-        
-        found_intro_chapter = False
-
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
-
-            matches = list(timecode_regex.finditer(line))
-            if not matches:
-                # If a line doesn't match timecode pattern, treat it as just text
-                # We can't format it, so we'll skip it or add it as a comment later if needed
-                self.log_message(f"Warning: Line '{line}' does not appear to be a chapter entry (no valid timecode found). Skipping.")
-                continue
-
-            match = matches[0]
-            
-            # Extract components, default to 0 if not present
-            hour = int(match.group(1)) if match.group(1) else 0
-            minute = int(match.group(2))
-            second = int(match.group(3))
-            frame = int(match.group(4)) if match.group(4) else 0 # Use 0 if no frame part
-
-            timecode = f"{hour:02d}:{minute:02d}:{second:02d}:{frame:02d}"
-
-            start, end = match.span()
-            before = line[:start].strip()
-            after = line[end:].strip()
-
-            # Determine the chapter title
-            title = ""
-            if after:
-                title = after
-            elif before: # If 'after' is empty, try 'before'
-                title = before
-            
-            if not title: # Fallback if no text found
-                title = f"Chapter {len(formatted_lines) + 1}"
-
-            formatted_entry = f"{timecode} {title}"
-            formatted_lines.append(formatted_entry)
-            
-            if timecode.startswith("00:00:00"): # Check if it's an intro chapter
-                found_intro_chapter = True
-
-        # Ensure "00:00:00:00 Intro" is the very first chapter
-        if not found_intro_chapter:
-            # If no 00:00:00 chapter found at all, add it
-            if not any(item.startswith("00:00:00:00 Intro") for item in formatted_lines):
-                formatted_lines.insert(0, "00:00:00:00 Intro")
-        else:
-            # If an intro chapter was found, ensure it's at the very beginning and consistent
-            # Filter out existing 00:00:00 chapters to re-insert a standardized one
-            filtered_lines = [line for line in formatted_lines if not line.startswith("00:00:00")]
-            formatted_lines = ["00:00:00:00 Intro"] + filtered_lines
-            
-        # Remove duplicates while preserving order
-        seen = set()
-        deduplicated_lines = []
-        for line in formatted_lines:
-            if line not in seen:
-                deduplicated_lines.append(line)
-                seen.add(line)
-
-        return "\n".join(deduplicated_lines)
+        # Shared with the headless bulk normalizer (python chapter_normalize.py <folder>)
+        return normalize_chapter_text(
+            content,
+            on_unparsed=lambda line: self.log_message(f"Warning: Line '{line}' does not appear to be a chapter entry (no valid timecode found). Skipping."))
 
     def process_next_video(self):
         """Moves to the next video in the batch."""
@@ -549,37 +925,86 @@ class ChapterCreatorApp:
             self.processing_batch = False
             self._set_ui_state(False)
             self.current_video_label.config(text="Batch complete.")
+            self._cancel_waveform()
+            self.waveform_view.clear()
+            self._cancel_thumbnails()
+            self.thumbnail_strip.clear()
             self.video_duration_label.config(text="")
             messagebox.showinfo("Batch Complete", "All videos in the folder have been processed!")
             return
         
+        self._load_current_video()
+
+    def jump_to_video(self, index):
+        """Jumps straight to a video picked in the library view (unsaved edits are discarded, as with Skip)."""
+        if not self.processing_batch:
+            messagebox.showwarning("No Batch", "Start the chapter creation batch before jumping to a video.")
+            return
+        if index == self.current_video_index:
+            return
+        self.log_message(f"Jumped to: {self.video_files[index]}")
+        self.current_video_index = index
+        self._load_current_video()
+
+    def _load_current_video(self):
+        """Loads the video at current_video_index into the editor."""
         current_video = self.video_files[self.current_video_index]
+        self._cancel_suggestions() # Suggestions belong to the previous video
+        self.library_view.set_current(self.current_video_index)
         self.current_video_label.config(text=f"Video {self.current_video_index + 1}/{len(self.video_files)}: {current_video}")
         self.video_duration_label.config(text="")
         
         # Clear previous chapter content
         self.chapter_text_input.delete("1.0", tk.END)
         
-        # Check if chapter file already exists
-        video_name_without_ext = os.path.splitext(current_video)[0]
-        chapter_file_path = os.path.join(self.folder_path.get(), f"{video_name_without_ext}.txt")
+        # Check if chapter file already exists (queued save, then read-ahead cache, then the share)
+        chapter_file_path = self._chapter_file_path(current_video)
+        existing_content = self._read_existing_chapters(chapter_file_path)
+        self._schedule_read_ahead()
         
-        if os.path.exists(chapter_file_path):
-            try:
-                with open(chapter_file_path, 'r', encoding='utf-8') as f:
-                    existing_content = f.read()
-                self.chapter_text_input.insert("1.0", existing_content)
-                self.log_message(f"Loaded existing chapter file for: {current_video}")
-            except Exception as e:
-                self.log_message(f"Error loading existing chapter file: {e}")
-                self.chapter_text_input.insert("1.0", "00:00:00:00 Intro") # Default if loading fails
+        if isinstance(existing_content, str):
+            self.chapter_text_input.insert("1.0", existing_content)
+            self.log_message(f"Loaded existing chapter file for: {current_video}")
         else:
-            # No existing file, start with default intro
+            # No existing file (or it could not be read), start with default intro
             self.chapter_text_input.insert("1.0", "00:00:00:00 Intro")
         
         self.log_message(f"Processing: {current_video}")
+        self._update_chapter_previews()
+        self.load_waveform()
         self.get_video_duration() # Automatically attempt to get duration for each video
 
+    def _chapter_file_path(self, video_name):
+        """Returns the companion chapter file path for a video in the current folder."""
+        video_name_without_ext = os.path.splitext(video_name)[0]
+        return os.path.join(self.folder_path.get(), f"{video_name_without_ext}.txt")
+
+    def _read_existing_chapters(self, chapter_file_path):
+        """Returns the chapter text for a video, None if there is no file, or False if reading failed."""
+        pending = self.chapter_writer.pending_text(chapter_file_path)
+        if pending is not None:
+            return pending
+        
+        hit, text = self.chapter_reader.get(chapter_file_path)
+        if hit:
+            return text
+        
+        # Not prefetched yet; fall back to a synchronous read
+        if not os.path.exists(chapter_file_path):
+            return None
+        try:
+            with open(chapter_file_path, 'r', encoding='utf-8') as f:
+                return f.read()
+        except Exception as e:
+            self.log_message(f"Error loading existing chapter file: {e}")
+            return False
+
+    def _schedule_read_ahead(self):
+        """Prefetches chapter files for the videos following the current one."""
+        start = self.current_video_index + 1
+        upcoming = self.video_files[start:start + self.read_ahead_depth]
+        self.chapter_reader.schedule([self._chapter_file_path(name) for name in upcoming])
+
     def save_chapters_and_next(self):
         """Saves the current chapters and moves to the next video."""
         if self.current_video_index < 0 or not self.processing_batch:
@@ -605,7 +1030,6 @@ class ChapterCreatorApp:
             return
         
         current_video = self.video_files[self.current_video_index]
-        video_name_without_ext = os.path.splitext(current_video)[0]
         
         # Get chapter content and format it
         chapter_content = self.chapter_text_input.get("1.0", tk.END).strip()
@@ -616,19 +1040,85 @@ class ChapterCreatorApp:
         else:
             formatted_content = "00:00:00:00 Intro" # Default if text box is completely empty
         
-        # Save to file
-        chapter_file_path = os.path.join(self.folder_path.get(), f"{video_name_without_ext}.txt")
+        # Queue the save; the write-behind thread commits it atomically
+        chapter_file_path = self._chapter_file_path(current_video)
+        self._chapter_videos[chapter_file_path] = os.path.join(self.folder_path.get(), current_video)
         
         try:
-            with open(chapter_file_path, 'w', encoding='utf-8') as f:
-                f.write(formatted_content)
-            self.log_message(f"Saved chapters for: {current_video} to {os.path.basename(chapter_file_path)}")
+            if self.chapter_writer.submit(chapter_file_path, formatted_content):
+                self.log_message(f"Replaced pending save for: {current_video}")
+            entry = self.library_entries[self.current_video_index]
+            entry.chapter_file = os.path.basename(chapter_file_path)
+            entry.chapter_mtime_ns = time.time_ns()
+            entry.chapter_count = count_chapters(formatted_content)
+            self.library_view.refresh_entry(self.current_video_index)
         except Exception as e:
             self.log_message(f"Error saving chapters for {current_video}: {e}")
             messagebox.showerror("Save Error", f"Could not save chapters for {current_video}:\n{e}")
 
+    def _on_chapter_file_saved(self, chapter_file_path):
+        """Called on the writer thread once a chapter file has been committed."""
+        self.chapter_reader.invalidate(chapter_file_path)
+        video_path = self._chapter_videos.get(chapter_file_path)
+        if self.chapter_index is not None and video_path:
+            try:
+                # The last chapter ends at the video's end, which the probe cache already knows
+                record = self.probe_cache.get(video_path) if self.probe_cache is not None else None
+                duration_ms = record.get('duration_ms') if record else None
+                self.chapter_index.update_file(chapter_file_path, video_path, duration_ms=duration_ms)
+            except Exception:
+                pass # Picked up by the next scan of the folder
+        file_name = os.path.basename(chapter_file_path)
+        self.root.after(0, lambda: self.log_message(f"Saved chapters to {file_name}"))
+
+    def _on_chapter_file_save_error(self, chapter_file_path, error):
+        """Called on the writer thread when a chapter file could not be written."""
+        file_name = os.path.basename(chapter_file_path)
+        self.root.after(0, lambda: self.log_message(f"Error saving chapters to {file_name}: {error}"))
+        self.root.after(0, lambda: messagebox.showerror("Save Error", f"Could not save chapters to {file_name}:\n{error}"))
+
+    def flush_pending_saves(self):
+        """Waits until all queued chapter file saves have been written, with the controls disabled.
+           After FLUSH_PROMPT_SECONDS the user can keep waiting or discard the saves still queued.
+           Returns True when everything was written, False when saves were discarded."""
+        pending = self.chapter_writer.pending_count()
+        if not pending:
+            return True
+        self.log_message(f"Waiting for {pending} pending chapter file save(s) to finish...")
+        self.flushing_saves = True
+        self._set_ui_state(False)
+        self.start_batch_button.config(state='disabled')
+        deadline = time.monotonic() + FLUSH_PROMPT_SECONDS
+        try:
+            # Keep servicing Tk events while waiting: the writer thread's callbacks go through root.after
+            while not self.chapter_writer.flush(timeout=0.05):
+                if time.monotonic() >= deadline:
+                    pending = self.chapter_writer.pending_count()
+                    keep_waiting = messagebox.askyesno(
+                        "Saves Pending",
+                        f"{pending} chapter file save(s) have not finished after {FLUSH_PROMPT_SECONDS} seconds "
+                        "(the share may be slow or unreachable).\n\n"
+                        "Yes: Keep waiting.\n"
+                        "No: Discard the pending saves.")
+                    if not keep_waiting:
+                        discarded = self.chapter_writer.discard()
+                        for path in discarded:
+                            self.log_message(f"Discarded the pending save of {os.path.basename(path)}.")
+                        if self.chapter_writer.pending_count():
+                            self.log_message("One save is still being written and may not complete.")
+                        return False
+                    deadline = time.monotonic() + FLUSH_PROMPT_SECONDS
+                self.root.update()
+            return True
+        finally:
+            self.flushing_saves = False
+            self._set_ui_state(self.processing_batch)
+            self.start_batch_button.config(state='normal')
+
     def finish_batch(self):
         """Finishes the current batch processing."""
+        if self.flushing_saves:
+            return
         if self.processing_batch:
             # Save current video if needed
             response = messagebox.askyesnocancel(
@@ -644,12 +1134,42 @@ class ChapterCreatorApp:
             elif response:  # Yes
                 self.save_current_chapters()
         
+        # Never report the batch as finished while saves are still queued
+        self.flush_pending_saves()
+        self._cancel_suggestions()
+        self._cancel_waveform()
+        self.waveform_view.clear()
+        self._cancel_thumbnails()
+        self.thumbnail_strip.clear()
         self.log_message("Batch processing finished by user.")
         self.processing_batch = False
         self._set_ui_state(False)
         self.current_video_label.config(text="Batch finished.")
         self.video_duration_label.config(text="")
         self.chapter_text_input.delete("1.0", tk.END)
+        if self.close_requested:
+            self.on_close()
+
+    def on_close(self):
+        """Flushes pending chapter saves before the window is destroyed."""
+        if self.flushing_saves:
+            # Closed again while a flush waits; the waiting call closes the window when it is done
+            self.close_requested = True
+            return
+        self.flush_pending_saves()
+        self._cancel_suggestions()
+        self._cancel_waveform()
+        self._cancel_thumbnails()
+        self.thumbnail_loader.shutdown()
+        self.chapter_writer.close(timeout=1) # Only a discarded, hung write can still be running
+        self.chapter_reader.close()
+        self.cancel_folder_access()
+        self.folder_accessor.shutdown()
+        if self.probe_cache is not None:
+            self.probe_cache.close()
+        if self.chapter_index is not None:
+            self.chapter_index.close()
+        self.root.destroy()
 
 def main():
     root = tk.Tk()
@@ -0,0 +1,232 @@
+import os
+import threading
+import tempfile
+
+# mkstemp creates files readable by the owner only; saved files get the mode open() would have given them
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def atomic_write_text(path, text, encoding='utf-8'):
+    """Writes text to path through a temporary file in the same folder and an atomic rename,
+       so a crash mid-write never leaves a truncated chapter file behind."""
+    _atomic_write(path, 'w', text, encoding)
+
+
+def atomic_write_bytes(path, data):
+    """Binary counterpart of atomic_write_text (used for cache files)."""
+    _atomic_write(path, 'wb', data, None)
+
+
+def _atomic_write(path, mode, data, encoding):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, mode, encoding=encoding) as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        try:
+            file_mode = os.stat(path).st_mode & 0o7777 # Keep the permissions of the file being replaced
+        except FileNotFoundError:
+            file_mode = 0o666 & ~_UMASK
+        try:
+            os.chmod(temp_path, file_mode)
+        except OSError:
+            pass # Some shares do not support chmod; their own permissions apply
+        os.replace(temp_path, path) # Atomic on the same filesystem (including SMB shares)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+class ChapterWriteBehind:
+    """Background write-behind queue for companion chapter files.
+
+    Saves are queued and committed atomically on a worker thread. Saving the same
+    file again before it has been written replaces the queued text, so only the
+    latest content is written. Callbacks are invoked on the worker thread.
+    """
+
+    def __init__(self, on_saved=None, on_error=None):
+        self.on_saved = on_saved
+        self.on_error = on_error
+        self._pending = {} # path -> latest text, in first-queued order
+        self._in_flight = 0
+        self._closed = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="ChapterWriteBehind", daemon=True)
+        self._thread.start()
+
+    def submit(self, path, text):
+        """Queues text to be written to path; returns True if an earlier queued save was coalesced."""
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("Chapter writer has been closed.")
+            coalesced = path in self._pending
+            self._pending[path] = text
+            self._condition.notify_all()
+        return coalesced
+
+    def pending_text(self, path):
+        """Returns the queued (not yet written) text for path, or None if nothing is queued."""
+        with self._condition:
+            return self._pending.get(path)
+
+    def pending_count(self):
+        """Returns the number of saves queued or currently being written."""
+        with self._condition:
+            return len(self._pending) + self._in_flight
+
+    def flush(self, timeout=None):
+        """Blocks until every queued save has been committed. Returns False on timeout."""
+        with self._condition:
+            return self._condition.wait_for(lambda: not self._pending and self._in_flight == 0, timeout)
+
+    def discard(self):
+        """Drops the queued saves that have not started and returns their paths. A write already
+           in progress is not interrupted."""
+        with self._condition:
+            paths = list(self._pending)
+            self._pending.clear()
+            self._condition.notify_all()
+            return paths
+
+    def close(self, timeout=None):
+        """Flushes outstanding saves and stops the worker thread."""
+        flushed = self.flush(timeout)
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join(timeout)
+        return flushed
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._pending or self._closed)
+                if not self._pending:
+                    return # Closed and drained
+                path = next(iter(self._pending))
+                text = self._pending.pop(path)
+                self._in_flight += 1
+            try:
+                atomic_write_text(path, text)
+            except Exception as e:
+                self._notify(self.on_error, path, e)
+            else:
+                self._notify(self.on_saved, path)
+            finally:
+                with self._condition:
+                    self._in_flight -= 1
+                    self._condition.notify_all()
+
+    def _notify(self, callback, *args):
+        # A failing callback must never kill the writer thread and strand queued saves
+        if callback:
+            try:
+                callback(*args)
+            except Exception:
+                pass
+
+
+_UNREADABLE = object() # Cached for files that could not be decoded, so they are not re-read until they change
+
+
+class ChapterReadAhead:
+    """Background read-ahead of companion chapter files.
+
+    schedule() names the files that will be needed soon; a worker thread reads
+    them into memory so get() can answer without touching the share. Cached
+    entries are re-stat'ed periodically and re-read if their mtime or size changes.
+    """
+
+    def __init__(self, revalidate_interval=5.0):
+        self.revalidate_interval = revalidate_interval
+        self._window = [] # Paths currently wanted, in priority order
+        self._cache = {} # path -> (mtime_ns, size, text); text None means "no such file", _UNREADABLE a read error
+        self._dirty = set() # Paths that must be re-read regardless of mtime
+        self._closed = False
+        self._wakeup = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="ChapterReadAhead", daemon=True)
+        self._thread.start()
+
+    def schedule(self, paths):
+        """Replaces the read-ahead window. Entries outside the window are dropped."""
+        with self._condition:
+            self._window = list(paths)
+            wanted = set(self._window)
+            for path in list(self._cache):
+                if path not in wanted:
+                    del self._cache[path]
+            self._wakeup = True
+            self._condition.notify_all()
+
+    def get(self, path):
+        """Returns (hit, text). text is None when the file was found not to exist."""
+        with self._condition:
+            entry = self._cache.get(path)
+        if entry is None or entry[2] is _UNREADABLE:
+            return False, None # The synchronous read reports the error
+        return True, entry[2]
+
+    def invalidate(self, path):
+        """Forces path to be re-read the next time the worker runs."""
+        with self._condition:
+            self._cache.pop(path, None)
+            self._dirty.add(path)
+            self._wakeup = True
+            self._condition.notify_all()
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join(1.0)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._wakeup or self._closed, self.revalidate_interval)
+                if self._closed:
+                    return
+                self._wakeup = False
+                window = list(self._window)
+            for path in window:
+                with self._condition:
+                    if self._closed or self._wakeup:
+                        break # The window changed; start over with the new one
+                    cached = self._cache.get(path)
+                    dirty = path in self._dirty
+                try:
+                    self._load(path, cached, dirty)
+                except Exception:
+                    pass # Never let one file stop the read-ahead for the rest of the session
+
+    def _load(self, path, cached, dirty):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            entry = (None, None, None)
+        except OSError:
+            return # Share hiccup; leave it for the synchronous path to report
+        else:
+            if cached is not None and not dirty and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+                return # Unchanged since it was read
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    entry = (st.st_mtime_ns, st.st_size, f.read())
+            except ValueError: # Not UTF-8
+                entry = (st.st_mtime_ns, st.st_size, _UNREADABLE)
+            except OSError:
+                return
+        with self._condition:
+            if path in self._dirty and not dirty:
+                return # Invalidated while we were reading; the next pass re-reads it
+            if path in self._window:
+                self._cache[path] = entry
+            self._dirty.discard(path)
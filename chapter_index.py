@@ -0,0 +1,197 @@
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from chapter_timeline import ChapterTimeline
+from library_scan import VIDEO_EXTENSIONS, build_library
+from probe_cache import default_cache_dir, file_key
+
+
+def _fts5_available():
+    try:
+        sqlite3.connect(':memory:').execute("CREATE VIRTUAL TABLE probe USING fts5(title)")
+        return True
+    except sqlite3.Error:
+        return False
+
+
+FTS5_AVAILABLE = _fts5_available()
+
+
+def _match_expression(query):
+    # Every word becomes a quoted phrase (so "Q&A" or "C++" cannot break the FTS syntax); the last
+    # one also matches as a prefix, so results show up while a word is still being typed
+    words = ['"' + word.replace('"', '""') + '"' for word in query.split()]
+    if words:
+        words[-1] += '*'
+    return ' '.join(words)
+
+
+class ChapterIndex:
+    """Full-text index of the chapter titles in every companion chapter file the tools have seen.
+
+    Each chapter file is stored with its size and mtime, so a folder scan
+    only re-reads the files that changed since they were indexed; files
+    that disappeared from a scanned folder are dropped. Titles are searched
+    through an SQLite FTS5 table (a LIKE scan where SQLite lacks FTS5). The
+    database lives in the user cache folder next to the probe cache and is
+    safe to use from several threads and from both applications.
+    """
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir or default_cache_dir()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.db_path = os.path.join(self.cache_dir, 'chapter_index.sqlite3')
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS chapter_files (
+                path TEXT PRIMARY KEY,
+                folder TEXT NOT NULL,
+                video_path TEXT NOT NULL,
+                video_size INTEGER,
+                video_mtime_ns INTEGER,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS chapter_files_folder ON chapter_files(folder);
+            CREATE TABLE IF NOT EXISTS chapters (
+                id INTEGER PRIMARY KEY,
+                file TEXT NOT NULL,
+                start_ms INTEGER NOT NULL,
+                end_ms INTEGER,
+                title TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS chapters_file ON chapters(file);""")
+        if FTS5_AVAILABLE:
+            # External-content FTS table kept in step with `chapters` by triggers
+            self._conn.executescript("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS chapters_fts USING fts5(
+                    title, content='chapters', content_rowid='id', tokenize='unicode61 remove_diacritics 2');
+                CREATE TRIGGER IF NOT EXISTS chapters_ai AFTER INSERT ON chapters BEGIN
+                    INSERT INTO chapters_fts(rowid, title) VALUES (new.id, new.title);
+                END;
+                CREATE TRIGGER IF NOT EXISTS chapters_ad AFTER DELETE ON chapters BEGIN
+                    INSERT INTO chapters_fts(chapters_fts, rowid, title) VALUES ('delete', old.id, old.title);
+                END;""")
+        self._conn.commit()
+
+    def _store(self, path, folder, video_path, video_stat, stat, timeline):
+        # Caller holds the lock and commits
+        key = file_key(path)
+        self._conn.execute("DELETE FROM chapters WHERE file = ?", (key,))
+        self._conn.execute(
+            "INSERT OR REPLACE INTO chapter_files (path, folder, video_path, video_size, video_mtime_ns, size, mtime_ns) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (key, file_key(folder), video_path, video_stat[0], video_stat[1], stat[0], stat[1]))
+        self._conn.executemany(
+            "INSERT INTO chapters (file, start_ms, end_ms, title) VALUES (?, ?, ?, ?)",
+            [(key, start, None if end == ChapterTimeline.NO_END else end, title) for start, end, title in timeline])
+
+    def _drop(self, keys):
+        # Caller holds the lock and commits
+        for key in keys:
+            self._conn.execute("DELETE FROM chapters WHERE file = ?", (key,))
+            self._conn.execute("DELETE FROM chapter_files WHERE path = ?", (key,))
+
+    def update_folder(self, folder, files, durations=None, video_extensions=VIDEO_EXTENSIONS, workers=8):
+        """Brings the index up to date with a scan_directory() listing of folder.
+
+        Only chapter files whose size or mtime differ from the index are read
+        (on a thread pool, since the folder is often a network share).
+        durations may map video path -> duration_ms, so the last chapter of
+        a video gets an end. Returns a dict with 'read', 'unchanged' and
+        'removed' counts.
+        """
+        entries = [entry for entry in build_library(files, video_extensions) if entry.has_chapter_file]
+        with self._lock:
+            known = dict(((path, (size, mtime_ns)) for path, size, mtime_ns in self._conn.execute(
+                "SELECT path, size, mtime_ns FROM chapter_files WHERE folder = ?", (file_key(folder),))))
+        changed = []
+        current = set()
+        for entry in entries:
+            path = os.path.join(folder, entry.chapter_file)
+            key = file_key(path)
+            current.add(key)
+            stat = files[entry.chapter_file]
+            if known.get(key) != tuple(stat):
+                changed.append((path, entry, stat))
+
+        def read(job):
+            path, entry, stat = job
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    return job, f.read()
+            except (OSError, UnicodeDecodeError):
+                return job, None
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            texts = list(pool.map(read, changed))
+        removed = [key for key in known if key not in current]
+        with self._lock:
+            for (path, entry, stat), text in texts:
+                if text is None:
+                    continue
+                video_path = os.path.join(folder, entry.name)
+                timeline = ChapterTimeline.parse(text, duration_ms=(durations or {}).get(video_path))
+                self._store(path, folder, video_path, (entry.size, entry.mtime_ns), stat, timeline)
+            self._drop(removed)
+            self._conn.commit()
+        return {'read': len(changed), 'unchanged': len(entries) - len(changed), 'removed': len(removed)}
+
+    def update_file(self, chapter_path, video_path, duration_ms=None):
+        """Re-indexes one chapter file (after a save). A file that no longer exists is dropped."""
+        try:
+            st = os.stat(chapter_path)
+            with open(chapter_path, 'r', encoding='utf-8') as f:
+                text = f.read()
+        except OSError:
+            self.remove_file(chapter_path)
+            return
+        try:
+            video_st = os.stat(video_path)
+            video_stat = (video_st.st_size, video_st.st_mtime_ns)
+        except OSError:
+            video_stat = (None, None)
+        timeline = ChapterTimeline.parse(text, duration_ms=duration_ms)
+        with self._lock:
+            self._store(chapter_path, os.path.dirname(chapter_path), video_path, video_stat,
+                        (st.st_size, st.st_mtime_ns), timeline)
+            self._conn.commit()
+
+    def remove_file(self, chapter_path):
+        with self._lock:
+            self._drop([file_key(chapter_path)])
+            self._conn.commit()
+
+    def search(self, query, limit=200):
+        """Finds chapters whose title matches every word of query (the last word as a prefix).
+           Returns (video_path, start_ms, end_ms, title) tuples, best matches first."""
+        if not query.strip():
+            return []
+        with self._lock:
+            if FTS5_AVAILABLE:
+                return self._conn.execute(
+                    "SELECT f.video_path, c.start_ms, c.end_ms, c.title FROM chapters_fts "
+                    "JOIN chapters c ON c.id = chapters_fts.rowid JOIN chapter_files f ON f.path = c.file "
+                    "WHERE chapters_fts MATCH ? ORDER BY rank LIMIT ?", (_match_expression(query), limit)).fetchall()
+            conditions = " AND ".join("c.title LIKE ? ESCAPE '\\'" for _ in query.split())
+            patterns = ['%' + word.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+                        for word in query.split()]
+            return self._conn.execute(
+                "SELECT f.video_path, c.start_ms, c.end_ms, c.title FROM chapters c "
+                f"JOIN chapter_files f ON f.path = c.file WHERE {conditions} ORDER BY f.video_path, c.start_ms LIMIT ?",
+                patterns + [limit]).fetchall()
+
+    def counts(self):
+        """Returns (chapter files, chapters) in the index."""
+        with self._lock:
+            files = self._conn.execute("SELECT COUNT(*) FROM chapter_files").fetchone()[0]
+            chapters = self._conn.execute("SELECT COUNT(*) FROM chapters").fetchone()[0]
+        return files, chapters
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
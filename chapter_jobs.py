@@ -0,0 +1,207 @@
+import os
+import uuid
+import tempfile
+
+from job_queue import DEFAULT_LEASE_SECONDS, PENDING, LeaseKeeper
+from metrics import JOBS, QUEUE_DEPTH, STAGE_SECONDS, count_bytes
+from process_watchdog import ProcessStalled, Watchdog, ffmpeg_progress, job_timeout
+from reflink import clone_file, clone_supported
+
+
+class JobFailed(Exception):
+    """Raised by a job with the status line that goes into the batch report."""
+
+    def __init__(self, status, detail=""):
+        super().__init__(detail or status)
+        self.status = status
+        self.detail = detail
+
+
+def batch_output_path(video_path):
+    """Output of a batch apply: "{base}_chapters{ext}" next to the source."""
+    base, ext = os.path.splitext(video_path)
+    return f"{base}_chapters{ext}"
+
+
+def job_signature(entry):
+    """Identity of a batch job's inputs (the video and its chapter file as scanned); a change requeues the job."""
+    return f"{entry.size}:{entry.mtime_ns}:{entry.chapter_mtime_ns}"
+
+
+def queue_jobs(folder, entries):
+    """LeaseQueue.enqueue() tuples for the library entries of folder. A job whose output file is
+       missing is redone even if the queue has it as done."""
+    return [(os.path.join(folder, entry.name), entry.size, job_signature(entry), entry.output_name is None)
+            for entry in entries]
+
+
+def run_leased(queue, owner, path, work, log=None, lease_seconds=DEFAULT_LEASE_SECONDS):
+    """Runs work(lease) for a job owner has claimed, renewing the lease meanwhile, and records the
+       outcome in the queue ("Success", or the JobFailed status). lease is the LeaseKeeper: work passes
+       it on to apply_chapters_to_copy(), which stops when the lease is lost and publishes its output
+       only once the lease is confirmed. Returns work's result or re-raises."""
+    log = log or (lambda message: None)
+    status, failed = None, False
+    with LeaseKeeper(queue, owner, path, lease_seconds) as keeper:
+        try:
+            result = work(keeper)
+            status, failed = "Success", False
+        except JobFailed as e:
+            status, failed = e.status, not e.status.startswith("Skipped")
+            raise
+        except Exception as e:
+            status, failed = f"Failed: {e}", True
+            raise
+        finally:
+            if status is None:
+                queue.release(owner, path) # Interrupted; leave it for the next worker
+            elif keeper.lost or not queue.finish(owner, path, status, failed):
+                log(f"Warning: the lease on {os.path.basename(path)} ran out while it was processed; "
+                    "another worker may have redone it.")
+            if status is not None:
+                result_label = 'failed' if failed else 'skipped' if status.startswith("Skipped") else 'succeeded'
+                JOBS.inc(labels=('batch', result_label))
+                QUEUE_DEPTH.set(queue.counts().get(PENDING, 0), labels=('lease',))
+    return result
+
+
+def _lease_lost(video_name):
+    return JobFailed("Skipped (lease lost)", f"Another worker took {video_name} over; its output was discarded.")
+
+
+def clone_with_chapters(mkvpropedit_path, video_path, timeline, output_path, log=None, watchdog=None, lease=None):
+    """Matroska fast path: clones the video (no media bytes are copied on a CoW or server-side-copy
+       volume) and rewrites only the chapters, tags and title in the clone's headers with mkvpropedit.
+       Returns the clone method on success, or None when the caller should remux instead. With a
+       lease (a LeaseKeeper), raises JobFailed instead of publishing the clone if it was lost."""
+    if not clone_supported(output_path):
+        return None
+    log = log or (lambda message: None)
+    watchdog = watchdog or Watchdog()
+    video_name = os.path.basename(video_path)
+    folder = os.path.dirname(os.path.abspath(output_path))
+    partial_path = os.path.join(folder, f".{os.path.basename(output_path)}.{uuid.uuid4().hex[:8]}.partial")
+    xml_fd, xml_path = tempfile.mkstemp(prefix=".chapters_", suffix=".xml", dir=folder)
+    try:
+        with os.fdopen(xml_fd, 'w', encoding='utf-8') as f:
+            f.write(timeline.to_matroska_xml())
+        try:
+            with STAGE_SECONDS.time(labels=('clone',)):
+                method = clone_file(video_path, partial_path)
+        except OSError as e:
+            log(f"Could not clone {video_name} ({e}); remuxing instead.")
+            return None
+        if method is None:
+            return None
+        command = [mkvpropedit_path, partial_path, '--chapters', xml_path, '--tags', 'all:', '--delete', 'title']
+        try:
+            returncode, stdout_output, stderr_output = watchdog.run(command, f"{video_name} (chapter patch)",
+                                                                    timeout=600, log=log, stage='chapter_patch',
+                                                                    cancel=lease and lease.cancel)
+        except ProcessStalled as e:
+            if lease is not None and lease.lost:
+                raise _lease_lost(video_name)
+            log(f"mkvpropedit stalled on {video_name} ({e.reason}); remuxing instead.")
+            return None
+        if returncode not in (0, 1): # 1 means it finished with warnings
+            log(f"mkvpropedit failed on {video_name}: {(stderr_output or stdout_output).strip()}; remuxing instead.")
+            return None
+        if lease is not None and not lease.confirm():
+            raise _lease_lost(video_name)
+        os.replace(partial_path, output_path)
+        count_bytes('clone', written_path=output_path) # Logical size; a reflink writes almost nothing
+        return method
+    finally:
+        for path in (partial_path, xml_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def apply_chapters_to_copy(ffmpeg_path, video_path, timeline, output_path=None, log=None, watchdog=None,
+                           mkvpropedit_path=None, lease=None, progress=None):
+    """Writes a copy of video_path that carries only the given chapters (the batch apply).
+
+    For .mkv files, with mkvpropedit available, the copy is first tried as
+    a clone of the video whose headers are then patched in place, which is
+    near-instant on volumes that support reflinks. Otherwise existing metadata and chapters are stripped to a temporary copy first,
+    then the chapters are muxed in from an FFMETADATA file, both with stream
+    copy, into a partial file that is renamed over the output at the end.
+    Temporary files live next to the video. Both ffmpeg runs go
+    through the watchdog (a hung one is killed and retried while its budget
+    lasts) with a timeout scaled to the file size. With a lease (the
+    LeaseKeeper of run_leased), the runs are killed as soon as the lease is
+    lost, and the output is only renamed into place once a heartbeat has
+    confirmed the lease, so a worker that lost its job never overwrites the
+    new owner's output. progress, if given, is called with the fraction
+    done (0..1) as ffmpeg reports it. Returns the output path; raises
+    JobFailed with the batch status line on failure.
+    """
+    log = log or (lambda message: None)
+    watchdog = watchdog or Watchdog()
+    output_path = output_path or batch_output_path(video_path)
+    video_name = os.path.basename(video_path)
+    base, ext = os.path.splitext(video_path)
+    if mkvpropedit_path and ext.lower() == '.mkv':
+        method = clone_with_chapters(mkvpropedit_path, video_path, timeline, output_path, log, watchdog, lease)
+        if method:
+            log(f"Created {os.path.basename(output_path)} as a {method} copy with patched chapters (no remux).")
+            return output_path
+    # Unique per run, so workers on other machines applying to the same folder never share a temp file
+    stripped_path = f"{base}_stripped_batch_{uuid.uuid4().hex[:8]}{ext}"
+    # Keeps the output's extension, which ffmpeg picks the container by
+    output_base, output_ext = os.path.splitext(output_path)
+    partial_path = os.path.join(os.path.dirname(os.path.abspath(output_path)),
+                                f".{os.path.basename(output_base)}.{uuid.uuid4().hex[:8]}.partial{output_ext}")
+    cancel = lease and lease.cancel
+    metadata_fd, metadata_path = tempfile.mkstemp(prefix=".chapters_metadata_", suffix=".txt",
+                                                  dir=os.path.dirname(os.path.abspath(video_path)))
+    os.close(metadata_fd)
+    try:
+        timeout = job_timeout(os.path.getsize(video_path))
+    except OSError:
+        timeout = None
+    try:
+        # Step 1: Strip metadata from the *original* video to a temporary stripped copy
+        log(f"Stripping all metadata from: {video_name}...")
+        command = [ffmpeg_path, '-y', '-progress', 'pipe:1', '-i', video_path, '-map_chapters', '-1',
+                   '-map_metadata', '-1', '-c', 'copy', stripped_path]
+        returncode, stdout_output, stderr_output = watchdog.run(command, f"{video_name} (strip)", stripped_path,
+                                                                timeout, log, 'strip', cancel,
+                                                                ffmpeg_progress(timeline.duration_ms, progress, 0, 0.5))
+        if returncode != 0:
+            log(f"Failed to strip metadata from {video_name} with exit code {returncode}")
+            log(f"FFmpeg stderr (strip): {stderr_output.strip()}")
+            raise JobFailed("Failed (metadata strip)", stderr_output.strip())
+        count_bytes('strip', video_path, stripped_path)
+
+        # Step 2: Create the temporary FFmpeg metadata file
+        with open(metadata_path, "w", encoding="utf-8") as f:
+            f.write(timeline.to_ffmetadata())
+
+        # Step 3: Mux the new chapters into the stripped copy, writing the final output file
+        command = [ffmpeg_path, '-y', '-progress', 'pipe:1', '-i', stripped_path, '-i', metadata_path,
+                   '-map_metadata', '1', '-map', '0', '-c', 'copy', '-movflags', 'use_metadata_tags',
+                   partial_path]
+        log(f"FFmpeg command (batch new chapter video): {' '.join(command)}")
+        returncode, stdout_output, stderr_output = watchdog.run(command, f"{video_name} (mux)", partial_path,
+                                                                timeout, log, 'mux', cancel,
+                                                                ffmpeg_progress(timeline.duration_ms, progress, 0.5, 1))
+        if returncode != 0:
+            log(f"Creating new batch video with chapters failed for {video_name} with exit code {returncode}")
+            log(f"FFmpeg stderr (batch new): {stderr_output.strip()}")
+            raise JobFailed(f"Failed: {stderr_output.strip()[:100]}...", stderr_output.strip())
+        if lease is not None and not lease.confirm():
+            raise _lease_lost(video_name)
+        os.replace(partial_path, output_path)
+        count_bytes('mux', stripped_path, output_path)
+        return output_path
+    except ProcessStalled as e:
+        if lease is not None and lease.lost:
+            log(f"Stopped {video_name}: another worker took the job over.")
+            raise _lease_lost(video_name)
+        log(f"FFmpeg stalled on {video_name} and was killed: {e.reason}")
+        raise JobFailed(f"Stalled ({e.reason})", e.stderr.strip())
+    finally:
+        for path in (metadata_path, stripped_path, partial_path):
+            if os.path.exists(path):
+                os.remove(path)
@@ -0,0 +1,234 @@
+import os
+import re
+import tempfile
+from bisect import bisect_left
+
+from chapter_timeline import ChapterTimeline
+from metrics import count_bytes
+from process_watchdog import ProcessStalled, ffmpeg_progress, job_timeout, run_watched
+
+
+def sanitize_filename(name):
+    """Removes characters that are not allowed in Windows file names (same rule as YouTube downloads)."""
+    return re.sub(r'[\\/:*?"<>|]', '', name).strip()
+
+
+def split_output_dir(video_path):
+    """Folder that receives the per-chapter files of a video ("Talk.mp4" -> "Talk - Chapters")."""
+    base = os.path.splitext(video_path)[0]
+    return f"{base} - Chapters"
+
+
+def plan_split_cuts(timeline, keyframes):
+    """Maps each chapter start to the cut a stream-copy split really makes there: the first
+       keyframe (sorted ms) at or after it. Chapters sharing a cut with the next chapter, or starting
+       after the last keyframe, get no file of their own; their content ends up in the file before.
+       Returns (cuts, merged): (cut ms, chapter number) for the chapters that start a file, and
+       the numbers of the chapters that do not. Without keyframes every chapter is cut at its start."""
+    cuts = []
+    for number, start in enumerate(timeline.starts, 1):
+        if not keyframes:
+            cut = start
+        else:
+            index = bisect_left(keyframes, start)
+            if index == 0:
+                cut = 0 # Up to the first keyframe: the file starts there, whatever its first timestamp
+            else:
+                cut = keyframes[index] if index < len(keyframes) else None
+        cuts.append((cut, number))
+    kept, merged = [], []
+    for index, (cut, number) in enumerate(cuts):
+        following = cuts[index + 1][0] if index + 1 < len(cuts) else None
+        if cut is None or cut == following:
+            merged.append(number)
+        else:
+            kept.append((cut, number))
+    return kept, merged
+
+
+def split_by_chapters(ffmpeg_path, video_path, timeline, output_dir=None, timeout=None, progress=None,
+                      keyframes=None, log=None, cancel=None):
+    """Writes one file per chapter with a single ffmpeg run of the segment muxer.
+
+    The source is read once and every stream is copied, so nothing is
+    re-encoded. Because of the stream copy each cut lands on the first
+    keyframe at or after the chapter start, and the muxer never writes an
+    empty segment. With the keyframe index (sorted ms) the cuts are planned
+    up front by plan_split_cuts(), so every file carries the chapter it is
+    named after; chapters too short to get a cut of their own are logged.
+    Without it the cuts are made at the chapter starts, and names can shift
+    when two starts fall between the same keyframes. Files are named
+    "NN - Title.ext". ffmpeg runs under the watchdog; timeout defaults to
+    one scaled to the file size. progress, if given, is called with the
+    fraction done (0..1). Setting the cancel Event kills ffmpeg. Returns
+    the list of files written; raises Exception with ffmpeg's error output
+    on failure.
+    """
+    if not timeline:
+        raise Exception("No chapters to split by.")
+    log = log or (lambda message: None)
+    output_dir = output_dir or split_output_dir(video_path)
+    os.makedirs(output_dir, exist_ok=True)
+    ext = os.path.splitext(video_path)[1]
+    pattern = os.path.join(output_dir, f".split_%04d{ext}")
+
+    kept, merged = plan_split_cuts(timeline, keyframes)
+    if not keyframes:
+        log("Warning: No keyframe index; a chapter shorter than the keyframe interval can shift the file names after it.")
+    for number in merged:
+        earlier = [kept_number for _, kept_number in kept if kept_number < number]
+        log(f"Chapter {number} ({timeline.titles[number - 1]}) gets no file: no keyframe falls between its start and the next chapter's, "
+            + (f"so it stays in the file of chapter {earlier[-1]}." if earlier else "so it is cut off with the part before the first file."))
+    if not kept:
+        raise Exception("No chapter starts at a keyframe of its own; nothing to split.")
+    # Content before the first cut becomes an extra leading segment that is discarded
+    cut_points = [cut for cut, _ in kept]
+    leading = 1 if cut_points[0] > 0 else 0
+    if not leading:
+        cut_points = cut_points[1:]
+    if keyframes:
+        # Just before the keyframe: the index rounds to whole ms, and a cut time past the keyframe would skip it
+        cut_points = [max(0, cut - 1) for cut in cut_points]
+    # -progress keeps reporting on stdout at -v error, which is what the watchdog sees as progress
+    command = [ffmpeg_path, '-y', '-v', 'error', '-nostdin', '-progress', 'pipe:1', '-i', video_path,
+               '-map', '0', '-dn', '-ignore_unknown', '-c', 'copy', '-map_chapters', '-1',
+               '-f', 'segment', '-reset_timestamps', '1']
+    if cut_points:
+        command += ['-segment_times', ','.join(f"{start / 1000:.3f}" for start in cut_points)]
+    command.append(pattern)
+
+    if timeout is None:
+        timeout = job_timeout(os.path.getsize(video_path))
+    stall = None
+    try:
+        returncode, _, stderr_output = run_watched(command, timeout=timeout, cancel=cancel, stage='split',
+                                                   on_stdout=ffmpeg_progress(timeline.duration_ms, progress))
+    except ProcessStalled as e:
+        stall = e
+    produced = sorted(name for name in os.listdir(output_dir) if name.startswith('.split_'))
+    try:
+        if stall is not None and cancel is not None and cancel.is_set():
+            raise Exception("Split cancelled.")
+        if stall is not None:
+            raise Exception(f"FFmpeg stalled and was killed ({stall.reason}): {stall.stderr.strip()}")
+        if returncode != 0:
+            raise Exception(f"FFmpeg returned error code {returncode}: {stderr_output.strip()}")
+        outputs = []
+        for position, (_, number) in enumerate(kept):
+            segment = os.path.join(output_dir, f".split_{position + leading:04d}{ext}")
+            if not os.path.exists(segment):
+                # Only without an exact keyframe index: the muxer found fewer cuts than planned
+                missing = ", ".join(str(later) for _, later in kept[position:])
+                log(f"Warning: FFmpeg made fewer cuts than planned; chapter(s) {missing} got no file.")
+                break
+            title = timeline.titles[number - 1]
+            name = sanitize_filename(title) or f"Chapter {number}"
+            output = os.path.join(output_dir, f"{number:02d} - {name}{ext}")
+            os.replace(segment, output)
+            outputs.append(output)
+            count_bytes('split', written_path=output)
+        count_bytes('split', video_path)
+        return outputs
+    finally:
+        for name in produced:
+            path = os.path.join(output_dir, name)
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def natural_sort_key(name):
+    """Sort key that orders "Part 2" before "Part 10"."""
+    return [int(part) if part.isdigit() else part.lower() for part in re.split(r'(\d+)', name)]
+
+
+def _stream_signature(record):
+    # Parameters that must match for the concat demuxer to stream-copy one clip after another
+    return [(stream.get('codec_type'), stream.get('codec_name'), stream.get('width'), stream.get('height'),
+             stream.get('pix_fmt'), stream.get('sample_rate'), stream.get('channels'))
+            for stream in record.get('streams', []) if stream.get('codec_type') in ('video', 'audio', 'subtitle')]
+
+
+def check_concat_compatible(clips):
+    """Compares the probe records of (name, record) clips with the first one.
+       Returns a list of problems; an empty list means they can be joined with stream copy."""
+    problems = []
+    if not clips:
+        return problems
+    first_name, first_record = clips[0]
+    expected = _stream_signature(first_record)
+    if not expected:
+        problems.append(f"{first_name}: no audio or video streams found")
+    for name, record in clips[1:]:
+        signature = _stream_signature(record)
+        if len(signature) != len(expected):
+            problems.append(f"{name}: has {len(signature)} streams, {first_name} has {len(expected)}")
+            continue
+        for index, (stream, reference) in enumerate(zip(signature, expected)):
+            if stream != reference:
+                problems.append(f"{name}: stream {index} is {_describe_stream(stream)}, "
+                                f"{first_name} has {_describe_stream(reference)}")
+    return problems
+
+
+def _describe_stream(signature):
+    codec_type, codec_name, width, height, pix_fmt, sample_rate, channels = signature
+    if codec_type == 'video':
+        return f"video {codec_name} {width}x{height} {pix_fmt}"
+    if codec_type == 'audio':
+        return f"audio {codec_name} {sample_rate} Hz {channels} ch"
+    return f"{codec_type} {codec_name}"
+
+
+def _concat_list_line(path):
+    # The concat demuxer quotes with single quotes; an embedded quote is written as '\''
+    escaped = os.path.abspath(path).replace("'", "'\\''")
+    return f"file '{escaped}'"
+
+
+def join_with_chapters(ffmpeg_path, clips, output_path, timeout=None):
+    """Concatenates clips into one video with a chapter per clip, in a single ffmpeg run.
+
+    clips is a list of (path, duration_ms, title) in playback order. The
+    concat demuxer reads each input once and every stream is copied; the
+    chapters start where each clip starts in the joined file and are
+    written from an FFMETADATA file. ffmpeg runs under the watchdog, which
+    also watches the output grow; timeout defaults to one scaled to the
+    total size. Returns the ChapterTimeline written; raises Exception with
+    ffmpeg's error output on failure.
+    """
+    chapters = []
+    position = 0
+    for _, duration_ms, title in clips:
+        chapters.append((position, title))
+        position += duration_ms
+    timeline = ChapterTimeline.from_chapters(chapters, duration_ms=position)
+
+    output_dir = os.path.dirname(os.path.abspath(output_path))
+    list_fd, list_path = tempfile.mkstemp(prefix=".join_", suffix=".txt", dir=output_dir)
+    metadata_fd, metadata_path = tempfile.mkstemp(prefix=".join_", suffix=".ffmetadata", dir=output_dir)
+    try:
+        with os.fdopen(list_fd, 'w', encoding='utf-8') as f:
+            f.write("\n".join(_concat_list_line(path) for path, _, _ in clips) + "\n")
+        with os.fdopen(metadata_fd, 'w', encoding='utf-8') as f:
+            f.write(timeline.to_ffmetadata())
+        command = [ffmpeg_path, '-y', '-v', 'error', '-nostdin', '-progress', 'pipe:1',
+                   '-f', 'concat', '-safe', '0', '-i', list_path,
+                   '-i', metadata_path,
+                   '-map', '0', '-map_metadata', '1', '-map_chapters', '1',
+                   '-c', 'copy', '-movflags', 'use_metadata_tags', output_path]
+        if timeout is None:
+            timeout = job_timeout(sum(os.path.getsize(path) for path, _, _ in clips))
+        try:
+            returncode, _, stderr_output = run_watched(command, output_path, timeout, stage='join')
+        except ProcessStalled as e:
+            raise Exception(f"FFmpeg stalled and was killed ({e.reason}): {e.stderr.strip()}")
+        if returncode != 0:
+            raise Exception(f"FFmpeg returned error code {returncode}: {stderr_output.strip()}")
+        for path, _, _ in clips:
+            count_bytes('join', path)
+        count_bytes('join', written_path=output_path)
+        return timeline
+    finally:
+        for path in (list_path, metadata_path):
+            if os.path.exists(path):
+                os.remove(path)
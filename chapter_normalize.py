@@ -0,0 +1,144 @@
+import os
+import sys
+import time
+import difflib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+from chapter_files import atomic_write_text
+from chapter_timeline import ChapterTimeline
+from library_audit import walk_folders
+from library_scan import VIDEO_EXTENSIONS, build_library
+
+# Outcomes of normalizing one file
+CHANGED = 'changed'
+UNCHANGED = 'unchanged'
+NO_CHAPTERS = 'no_chapters' # No timecode lines: not a chapter file, left alone
+CONFLICT = 'conflict' # Edited by someone else while it was being normalized
+ERROR = 'error'
+
+
+def normalize_chapter_text(content, on_unparsed=None):
+    """Formats chapter text to 'HH:MM:SS:FF Title' lines with '00:00:00:00 Intro' first and
+       duplicates removed (the chapter creator's Format button and save)."""
+    timeline = ChapterTimeline.parse(content, on_unparsed=on_unparsed)
+
+    # Any chapter in the first second is replaced by the standard intro, which always comes first
+    chapters = [(0, "Intro")] + [(start, title, timecode)
+                                 for start, title, timecode in zip(timeline.starts, timeline.titles, timeline.timecodes)
+                                 if start >= 1000 and not (timecode or "").startswith("00:00:00:")]
+
+    # Remove duplicates while preserving order
+    return ChapterTimeline.from_chapters(chapters, timeline.frame_rate).deduplicated().to_timecode_text()
+
+
+def normalize_file(path, dry_run=False, with_diff=False):
+    """Normalizes one chapter file in place, writing it (atomically) only if its content changes.
+       Returns (path, status, lines removed, lines added, unified diff or None, error or None)."""
+    try:
+        st = os.stat(path)
+        with open(path, 'r', encoding='utf-8-sig') as f:
+            text = f.read()
+        if not ChapterTimeline.parse(text):
+            return path, NO_CHAPTERS, 0, 0, None, None
+        normalized = normalize_chapter_text(text)
+        if normalized == text.strip():
+            return path, UNCHANGED, 0, 0, None, None
+        before, after = text.strip().split('\n'), normalized.split('\n')
+        removed = added = 0
+        for line in difflib.ndiff(before, after):
+            removed += line.startswith('- ')
+            added += line.startswith('+ ')
+        diff = None
+        if with_diff:
+            diff = "\n".join(difflib.unified_diff(before, after, path, path, lineterm=''))
+        if not dry_run:
+            current = os.stat(path)
+            if (current.st_size, current.st_mtime_ns) != (st.st_size, st.st_mtime_ns):
+                return path, CONFLICT, removed, added, diff, "file changed while it was being normalized"
+            atomic_write_text(path, normalized)
+        return path, CHANGED, removed, added, diff, None
+    except (OSError, UnicodeDecodeError) as e:
+        return path, ERROR, 0, 0, None, str(e)
+
+
+def _normalize_job(job):
+    return normalize_file(*job)
+
+
+def find_chapter_files(root, recursive=True, video_extensions=VIDEO_EXTENSIONS, on_error=None):
+    """Returns the paths of the companion chapter files under root: the .txt next to a video with the
+       video's base name, as the library lists them. Other text files (notes, subtitles, OGM
+       sidecars) are never touched, whatever they contain. on_error is passed to walk_folders()."""
+    return [os.path.join(folder, entry.chapter_file)
+            for folder, files in walk_folders(root, recursive, on_error)
+            for entry in build_library(files, video_extensions) if entry.has_chapter_file]
+
+
+def normalize_tree(root, recursive=True, dry_run=False, with_diff=False, workers=None, progress=None):
+    """Normalizes every companion chapter file under root on a process pool.
+       Returns the normalize_file() results, sorted by path; a folder that cannot be listed is
+       one ERROR result."""
+    results = []
+    paths = find_chapter_files(root, recursive,
+                               on_error=lambda folder, e: results.append((folder, ERROR, 0, 0, None, str(e))))
+    jobs = [(path, dry_run, with_diff) for path in paths]
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1:
+        mapped = map(_normalize_job, jobs)
+    else:
+        pool = ProcessPoolExecutor(max_workers=workers)
+        # Large chunks: each file is a few hundred bytes, so pickling per file would dominate
+        mapped = pool.map(_normalize_job, jobs, chunksize=max(1, min(256, len(jobs) // (workers * 4))))
+    try:
+        for done, result in enumerate(mapped, 1):
+            results.append(result)
+            if progress:
+                progress(done, len(jobs))
+    finally:
+        if workers > 1:
+            pool.shutdown()
+    return sorted(results)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Normalizes every companion chapter file (the .txt named like a video next to it) under a "
+                    "folder the way the chapter creator formats them on save (HH:MM:SS:FF timecodes, "
+                    "'00:00:00:00 Intro' first, no duplicates). Only files whose content changes are rewritten; "
+                    "other .txt files and files without timecodes are left alone.")
+    parser.add_argument('folder', help="Library folder")
+    parser.add_argument('--dry-run', '-n', action='store_true', help="Report what would change without writing")
+    parser.add_argument('--diff', action='store_true', help="Print a unified diff of every change")
+    parser.add_argument('--no-recursive', action='store_true', help="Only normalize the folder itself")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: one per CPU)")
+    args = parser.parse_args(argv)
+
+    started = time.time()
+
+    def progress(done, total):
+        if done == total or done % 5000 == 0:
+            print(f"Checked {done}/{total} files", file=sys.stderr, flush=True)
+
+    results = normalize_tree(args.folder, not args.no_recursive, args.dry_run, args.diff, args.workers, progress)
+    summary = {}
+    removed_total = added_total = 0
+    for path, status, removed, added, diff, error in results:
+        summary[status] = summary.get(status, 0) + 1
+        if status in (CHANGED, CONFLICT):
+            removed_total += removed
+            added_total += added
+            print(f"{'Would change' if args.dry_run and status == CHANGED else status.capitalize()}: "
+                  f"{path} (-{removed} +{added} lines)" + (f" [{error}]" if error else ""))
+            if diff:
+                print(diff)
+        elif status == ERROR:
+            print(f"Error: {path}: {error}")
+    print(f"{len(results)} chapter files in {time.time() - started:.1f}s: " +
+          ", ".join(f"{count} {status}" for status, count in sorted(summary.items())) +
+          f"; {removed_total} lines removed, {added_total} added" + (" (dry run, nothing written)" if args.dry_run else ""))
+    return 1 if summary.get(ERROR) or summary.get(CONFLICT) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from chapter_files import atomic_write_text
+from chapter_timeline import ChapterTimeline
+from library_scan import VIDEO_EXTENSIONS, build_library, scan_directory
+
+# Format id -> (description, file name suffix, serializer)
+SIDECAR_FORMATS = {
+    'mkvxml': ("Matroska XML", '.chapters.xml', ChapterTimeline.to_matroska_xml),
+    'webvtt': ("WebVTT", '.chapters.vtt', ChapterTimeline.to_webvtt),
+    'ogm': ("OGM text", '.chapters.txt', ChapterTimeline.to_ogm),
+    'ffmetadata': ("FFMETADATA", '.ffmetadata', ChapterTimeline.to_ffmetadata),
+}
+
+
+def sidecar_name(video_name, fmt):
+    """Returns the sidecar file name for a video in the given format ("Talk.mp4" -> "Talk.chapters.vtt")."""
+    return os.path.splitext(video_name)[0] + SIDECAR_FORMATS[fmt][1]
+
+
+def write_sidecars(video_path, timeline, formats):
+    """Writes the chapters of one video as sidecar files next to it. Returns the paths written.
+       The video itself is never opened."""
+    folder, video_name = os.path.split(video_path)
+    paths = []
+    for fmt in formats:
+        path = os.path.join(folder, sidecar_name(video_name, fmt))
+        atomic_write_text(path, SIDECAR_FORMATS[fmt][2](timeline))
+        paths.append(path)
+    return paths
+
+
+def write_folder_sidecars(folder, formats, probe_cache=None, video_extensions=VIDEO_EXTENSIONS,
+                          force=False, workers=8, log=None):
+    """Bulk mode: writes sidecars for every video in folder that has a companion chapter file.
+
+    The folder is listed once; sidecars newer than their chapter file are
+    skipped unless force is set. Durations (for the end of the last chapter)
+    come from the probe cache only, so no media byte is read. Chapter files
+    are read and sidecars written on a thread pool.
+    Returns a dict with 'videos', 'files', 'skipped' and 'errors' (list of messages).
+    """
+    log = log or (lambda message: None)
+    files = scan_directory(folder)
+    names_lower = {name.lower(): name for name in files}
+    entries = [entry for entry in build_library(files, video_extensions) if entry.has_chapter_file]
+
+    records = {}
+    if probe_cache is not None and entries:
+        records = probe_cache.get_many({os.path.join(folder, entry.name): (entry.size, entry.mtime_ns)
+                                        for entry in entries})
+
+    jobs = []
+    skipped = 0
+    for entry in entries:
+        wanted = []
+        for fmt in formats:
+            existing = names_lower.get(sidecar_name(entry.name, fmt).lower())
+            if not force and existing is not None and files[existing][1] >= entry.chapter_mtime_ns:
+                continue # Up to date
+            wanted.append(fmt)
+        if wanted:
+            jobs.append((entry, wanted))
+        else:
+            skipped += 1
+
+    def write_entry(job):
+        entry, wanted = job
+        video_path = os.path.join(folder, entry.name)
+        record = records.get(video_path) or {}
+        try:
+            with open(os.path.join(folder, entry.chapter_file), 'r', encoding='utf-8') as f:
+                timeline = ChapterTimeline.parse(f.read(), frame_rate=record.get('frame_rate'),
+                                                 duration_ms=record.get('duration_ms'))
+            if not timeline:
+                return 0, f"{entry.chapter_file}: no chapters found"
+            return len(write_sidecars(video_path, timeline, wanted)), None
+        except Exception as e:
+            return 0, f"{entry.name}: {e}"
+
+    written = 0
+    errors = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for count, error in pool.map(write_entry, jobs):
+            written += count
+            if error:
+                errors.append(error)
+                log(f"Error writing sidecars for {error}")
+    return {'videos': len(jobs) - len(errors), 'files': written, 'skipped': skipped, 'errors': errors}
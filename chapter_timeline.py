@@ -0,0 +1,267 @@
+import re
+from array import array
+from xml.sax.saxutils import escape as escape_xml
+from bisect import bisect_left, bisect_right
+
+# Frame rate assumed for HH:MM:SS:FF timecodes when the video's real rate is not known
+DEFAULT_FRAME_RATE = 30.0
+
+# HH:MM:SS:FF, HH:MM:SS, MM:SS, optionally with .mmm instead of frames. Not part of a longer number.
+TIMECODE_REGEX = re.compile(r'(?<!\d)(?<!\d:)(?:(\d{1,2}):)?(\d{1,2}):(\d{2})(?::(\d{1,2})|\.(\d{1,3}))?(?!\d)(?!:\d)')
+
+# Chapters further than this from any keyframe are left where they are when snapping
+DEFAULT_SNAP_MS = 2000
+
+# Separators allowed between a timecode and its title ("00:01:00 - Title", "Title: 00:01:00")
+TITLE_SEPARATORS = ' \t-–—:|'
+
+
+def timecode_to_ms(hours, minutes, seconds, frames=0, millis=0, frame_rate=DEFAULT_FRAME_RATE):
+    """Converts timecode components to integer milliseconds."""
+    return (hours * 3600 + minutes * 60 + seconds) * 1000 + millis + int(round(frames * 1000 / frame_rate))
+
+
+def ms_to_hms(ms):
+    """Formats milliseconds as HH:MM:SS, adding .mmm only when the time is not on a whole second."""
+    seconds, millis = divmod(ms, 1000)
+    hours, seconds = divmod(seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+    if millis:
+        return f"{hours:02d}:{minutes:02d}:{seconds:02d}.{millis:03d}"
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+
+
+def ms_to_timecode(ms, frame_rate=DEFAULT_FRAME_RATE):
+    """Formats milliseconds as HH:MM:SS:FF at the given frame rate."""
+    seconds, millis = divmod(ms, 1000)
+    frames = int(round(millis * frame_rate / 1000))
+    if frames >= frame_rate: # Rounded up into the next second
+        seconds += 1
+        frames = 0
+    hours, seconds = divmod(seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}:{frames:02d}"
+
+
+def ms_to_clock(ms):
+    """Formats milliseconds as HH:MM:SS.mmm (always with milliseconds, as sidecar formats require)."""
+    seconds, millis = divmod(ms, 1000)
+    hours, seconds = divmod(seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}.{millis:03d}"
+
+
+def _escape_ffmetadata(value):
+    # FFMETADATA treats '=', ';', '#', '\' and newlines as special
+    return re.sub(r'([=;#\\\n])', r'\\\1', value)
+
+
+class ChapterTimeline:
+    """Chapters of one video as integer millisecond starts/ends plus titles.
+
+    Chapters are kept sorted by start. Each chapter ends where the next one
+    starts; the last one ends at the video duration once that is known
+    (end == -1 until then). Text is parsed once into this form and every
+    output format is serialized straight from the integer arrays.
+    HH:MM:SS:FF timecodes parsed without a known frame rate are also kept
+    as typed, so the companion text is written back with the same frames.
+    """
+
+    __slots__ = ('starts', 'ends', 'titles', 'timecodes', 'frame_rate', 'duration_ms')
+
+    NO_END = -1
+
+    def __init__(self, frame_rate=None, duration_ms=None):
+        self.starts = array('q')
+        self.ends = array('q')
+        self.titles = []
+        self.timecodes = [] # Typed HH:MM:SS:FF per chapter when the frame rate was unknown, else None
+        self.frame_rate = frame_rate or DEFAULT_FRAME_RATE
+        self.duration_ms = duration_ms
+
+    @classmethod
+    def from_chapters(cls, chapters, frame_rate=None, duration_ms=None):
+        """Builds a timeline from (start_ms, title) pairs or (start_ms, title, typed timecode) triples."""
+        timeline = cls(frame_rate, duration_ms)
+        ordered = sorted(chapters, key=lambda chapter: chapter[0]) # Stable: equal starts keep their order
+        timeline.starts = array('q', (chapter[0] for chapter in ordered))
+        timeline.titles = [chapter[1] for chapter in ordered]
+        timeline.timecodes = [chapter[2] if len(chapter) > 2 else None for chapter in ordered]
+        timeline._link()
+        return timeline
+
+    @classmethod
+    def parse(cls, text, frame_rate=None, duration_ms=None, on_unparsed=None):
+        """Parses chapter text in any of the formats the tools read or write.
+
+        Each line needs one timecode (HH:MM:SS:FF, HH:MM:SS[.mmm] or MM:SS); the
+        title is the text after it, or before it if nothing follows. Lines without
+        a timecode are passed to on_unparsed(line) and skipped. Without a
+        frame_rate, frames are converted at DEFAULT_FRAME_RATE but also kept
+        as typed for to_timecode_text().
+        """
+        rate_known = bool(frame_rate)
+        frame_rate = frame_rate or DEFAULT_FRAME_RATE
+        chapters = []
+        for line in text.split('\n'):
+            line = line.strip()
+            if not line:
+                continue
+            match = TIMECODE_REGEX.search(line)
+            if not match:
+                if on_unparsed:
+                    on_unparsed(line)
+                continue
+            hours, minutes, seconds, frames, millis = match.groups()
+            start_ms = timecode_to_ms(int(hours or 0), int(minutes), int(seconds), int(frames or 0),
+                                      int((millis or '0').ljust(3, '0')), frame_rate)
+            title = line[match.end():].strip(TITLE_SEPARATORS) or line[:match.start()].strip(TITLE_SEPARATORS)
+            timecode = None
+            if frames is not None and not rate_known:
+                timecode = f"{int(hours or 0):02d}:{int(minutes):02d}:{int(seconds):02d}:{int(frames):02d}"
+            chapters.append((start_ms, title or f"Chapter {len(chapters) + 1}", timecode))
+        return cls.from_chapters(chapters, frame_rate, duration_ms)
+
+    def _link(self):
+        """Recomputes every end from the following start and the duration."""
+        count = len(self.starts)
+        self.ends = array('q', self.starts[1:])
+        if count:
+            self.ends.append(self.duration_ms if self.duration_ms is not None else self.NO_END)
+
+    def add(self, start_ms, title):
+        """Inserts a chapter, keeping the timeline sorted."""
+        index = bisect_right(self.starts, start_ms)
+        self.starts.insert(index, start_ms)
+        self.titles.insert(index, title)
+        self.timecodes.insert(index, None)
+        self._link()
+        return index
+
+    def set_duration(self, duration_ms):
+        """Records the video duration, which becomes the end of the last chapter."""
+        self.duration_ms = duration_ms
+        if self.ends:
+            self.ends[-1] = duration_ms if duration_ms is not None else self.NO_END
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __iter__(self):
+        """Yields (start_ms, end_ms, title); end_ms is NO_END for an open last chapter."""
+        return zip(self.starts, self.ends, self.titles)
+
+    def __getitem__(self, index):
+        return self.starts[index], self.ends[index], self.titles[index]
+
+    def validate(self, duration_ms=None):
+        """Returns a list of problems (chapters starting at or after the end of the video); empty if valid."""
+        duration_ms = self.duration_ms if duration_ms is None else duration_ms
+        problems = []
+        if duration_ms is None:
+            return problems
+        for number, (start, _, title) in enumerate(self, 1):
+            if start >= duration_ms:
+                problems.append(f"Chapter {number} '{title}' starts at {ms_to_hms(start)}, "
+                                f"at or after the end of the video ({ms_to_hms(duration_ms)})")
+        return problems
+
+    def deduplicated(self):
+        """Returns a copy without repeated (start, title) chapters."""
+        seen = set()
+        chapters = []
+        for start, title, timecode in zip(self.starts, self.titles, self.timecodes):
+            if (start, title) not in seen:
+                seen.add((start, title))
+                chapters.append((start, title, timecode))
+        return ChapterTimeline.from_chapters(chapters, self.frame_rate, self.duration_ms)
+
+    def snap_to_keyframes(self, keyframes, max_shift_ms=DEFAULT_SNAP_MS):
+        """Returns (timeline, moved): a copy with each start moved to the nearest keyframe
+           (sorted ms) within max_shift_ms, and how many starts changed. A chapter at 0 stays
+           at 0, and a start is kept if snapping would reach a neighbouring chapter."""
+        chapters = []
+        moved = 0
+        previous = -1
+        for number, (start, _, title) in enumerate(self):
+            snapped = start
+            following = self.starts[number + 1] if number + 1 < len(self.starts) else None
+            if start > 0 and keyframes:
+                index = bisect_left(keyframes, start) # O(log n) per chapter
+                nearest = min(keyframes[max(index - 1, 0):index + 1], key=lambda keyframe: abs(keyframe - start))
+                if abs(nearest - start) <= max_shift_ms and nearest > previous and (following is None or nearest < following):
+                    snapped = nearest
+            if snapped != start:
+                moved += 1
+            chapters.append((snapped, title, self.timecodes[number] if snapped == start else None))
+            previous = snapped
+        return ChapterTimeline.from_chapters(chapters, self.frame_rate, self.duration_ms), moved
+
+    def to_hms_text(self):
+        """Serializes as 'HH:MM:SS Title' lines (the chapter editor format of main_app.py)."""
+        return "\n".join(f"{ms_to_hms(start)} {title}" for start, _, title in self)
+
+    def to_timecode_text(self):
+        """Serializes as 'HH:MM:SS:FF Title' lines (the companion .txt format)."""
+        return "\n".join(f"{timecode or ms_to_timecode(start, self.frame_rate)} {title}"
+                         for start, title, timecode in zip(self.starts, self.titles, self.timecodes))
+
+    def _closed_ends(self):
+        """Ends for formats that need one; an open last chapter is given one second, as in FFMETADATA."""
+        return [start + 1000 if end == self.NO_END else end for start, end in zip(self.starts, self.ends)]
+
+    def to_matroska_xml(self, language='eng'):
+        """Serializes as a Matroska XML chapter file (mkvmerge --chapters, mkvpropedit)."""
+        lines = [
+            '<?xml version="1.0" encoding="UTF-8"?>',
+            '<!DOCTYPE Chapters SYSTEM "matroskachapters.dtd">',
+            '<Chapters>',
+            '  <EditionEntry>'
+        ]
+        for start, end, title in zip(self.starts, self._closed_ends(), self.titles):
+            lines.extend([
+                '    <ChapterAtom>',
+                f'      <ChapterTimeStart>{ms_to_clock(start)}000000</ChapterTimeStart>',
+                f'      <ChapterTimeEnd>{ms_to_clock(end)}000000</ChapterTimeEnd>',
+                '      <ChapterDisplay>',
+                f'        <ChapterString>{escape_xml(title)}</ChapterString>',
+                f'        <ChapterLanguage>{language}</ChapterLanguage>',
+                '      </ChapterDisplay>',
+                '    </ChapterAtom>'
+            ])
+        lines.extend(['  </EditionEntry>', '</Chapters>'])
+        return "\n".join(lines) + "\n"
+
+    def to_webvtt(self):
+        """Serializes as a WebVTT chapters track (one cue per chapter)."""
+        cues = ["WEBVTT"]
+        for number, (start, end, title) in enumerate(zip(self.starts, self._closed_ends(), self.titles), 1):
+            # Cue text is escaped like HTML, which also keeps "-->" out of it
+            cues.append(f"{number}\n{ms_to_clock(start)} --> {ms_to_clock(end)}\n{escape_xml(title)}")
+        return "\n\n".join(cues) + "\n"
+
+    def to_ogm(self):
+        """Serializes as OGM-style CHAPTERnn=/CHAPTERnnNAME= lines (mkvmerge simple chapter format)."""
+        lines = []
+        for number, (start, _, title) in enumerate(self, 1):
+            lines.append(f"CHAPTER{number:02d}={ms_to_clock(start)}")
+            lines.append(f"CHAPTER{number:02d}NAME={title}")
+        return "\n".join(lines) + "\n"
+
+    def to_ffmetadata(self):
+        """Serializes as an FFmpeg FFMETADATA1 document."""
+        metadata_content = [
+            ";FFMETADATA1",
+            "; This section can be used for global metadata, like video title."
+        ]
+        for start, end, title in self:
+            if end == self.NO_END:
+                end = start + 1000 # Duration unknown: just mark the point
+            metadata_content.extend([
+                "[CHAPTER]",
+                "TIMEBASE=1/1000",
+                f"START={start}",
+                f"END={end}",
+                f"title={_escape_ffmetadata(title)}"
+            ])
+        return "\n".join(metadata_content)
@@ -0,0 +1,331 @@
+import os
+import re
+import sys
+import json
+import time
+import hashlib
+import tempfile
+
+# Deterministic stand-ins for ffmpeg, ffprobe, yt-dlp and mkvpropedit, for load tests without real media.
+#
+# Fake media files are a one-line JSON header (duration and embedded chapters) followed by padding, so
+# they can be made at any size. The fake ffmpeg carries the header from input to output, dropping or
+# replacing chapters like the real stream-copy commands; the fake ffprobe reports it back. Other files
+# get a duration derived from their name.
+#
+# Markers in an input file name (or URL) pick its behaviour:
+#   __fail   exit with an error
+#   __hang   print nothing and never finish (the watchdog has to kill it)
+#   __flaky  hang on the first run, succeed on the next (a watchdog retry)
+#   __slow   ten times the normal latency
+# The fake ffprobe only reads headers, so it honours __fail and __slow but never hangs.
+# Environment: FAKE_TOOLS_LATENCY (seconds per run, default 0.01), FAKE_TOOLS_FAIL_RATE and
+# FAKE_TOOLS_HANG_RATE (fractions of unmarked inputs, picked by a hash of the name and
+# FAKE_TOOLS_SEED), FAKE_TOOLS_STATE (folder for __flaky bookkeeping; default the temp folder).
+
+TOOLS = ('ffmpeg', 'ffprobe', 'yt-dlp', 'mkvpropedit')
+KEYFRAME_INTERVAL_MS = 2000
+HEADER_LIMIT = 1 << 20
+FFMPEG_FLAGS = {'-y', '-n', '-nostdin', '-dn', '-vn', '-an', '-sn', '-hide_banner', '-ignore_unknown'} # Take no value
+
+
+def _hash_fraction(*parts):
+    digest = hashlib.sha1("\0".join(parts).encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') / 2 ** 64
+
+
+def default_duration_ms(name):
+    """Duration reported for a file that is not fake media: 10 to 70 minutes, fixed per name."""
+    return 600000 + int(_hash_fraction('duration', os.path.basename(name)) * 3600) * 1000
+
+
+def fake_media_header(duration_ms, chapters=(), title=None):
+    return {'fake_media': 1, 'duration_ms': duration_ms, 'chapters': [list(chapter) for chapter in chapters],
+            'title': title}
+
+
+def write_fake_media(path, duration_ms, size=4096, chapters=(), title=None):
+    """Writes a fake media file of about size bytes."""
+    header = (json.dumps(fake_media_header(duration_ms, chapters, title)) + "\n").encode('utf-8')
+    with open(path, 'wb') as f:
+        f.write(header)
+        f.write(b'\0' * max(0, size - len(header)))
+
+
+def read_media(path):
+    """Returns (header dict, padding size) of a fake media file, or a made-up header for any other file."""
+    try:
+        with open(path, 'rb') as f:
+            line = f.readline(HEADER_LIMIT)
+            size = os.fstat(f.fileno()).st_size
+        header = json.loads(line)
+        if isinstance(header, dict) and header.get('fake_media'):
+            return header, size - len(line)
+    except (OSError, ValueError):
+        size = 0
+    return fake_media_header(default_duration_ms(path)), size
+
+
+def _write_media(path, header, padding, latency, progress_stream=None):
+    # Written in steps over the run's latency, so the output grows like a real remux
+    steps = 10
+    data = (json.dumps(header) + "\n").encode('utf-8')
+    with open(path, 'wb') as f:
+        f.write(data)
+        chunk = padding // steps
+        for step in range(steps):
+            f.write(b'\0' * (chunk if step < steps - 1 else padding - chunk * (steps - 1)))
+            f.flush()
+            if progress_stream is not None:
+                progress_stream.write(f"out_time_ms={header['duration_ms'] * (step + 1) // steps * 1000}\n"
+                                      f"progress={'end' if step == steps - 1 else 'continue'}\n")
+                progress_stream.flush()
+            else:
+                sys.stderr.write(f"size={(step + 1) * chunk // 1024}kB time=... speed=99x\n")
+                sys.stderr.flush()
+            time.sleep(latency / steps)
+
+
+def _behaviour(tool, name, markers):
+    """Returns the marker of markers ('fail', 'hang', 'flaky', 'slow') that applies to an input name, or None."""
+    base = os.path.basename(name)
+    for marker in markers:
+        if f"__{marker}" in base:
+            return marker
+    seed = os.environ.get('FAKE_TOOLS_SEED', '0')
+    fail_rate = float(os.environ.get('FAKE_TOOLS_FAIL_RATE') or 0)
+    hang_rate = float(os.environ.get('FAKE_TOOLS_HANG_RATE') or 0)
+    roll = _hash_fraction(seed, tool, base)
+    if roll < fail_rate:
+        return 'fail'
+    if roll < fail_rate + hang_rate and 'hang' in markers:
+        return 'hang'
+    return None
+
+
+def _first_run(tool, name):
+    # True the first time tool sees this video (temporary copies of it included); later runs find the marker file
+    key = os.path.abspath(name)
+    key = key[:key.index('__flaky')]
+    state_dir = os.environ.get('FAKE_TOOLS_STATE') or tempfile.gettempdir()
+    marker = os.path.join(state_dir, f".fake_{tool}_{hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]}")
+    try:
+        os.close(os.open(marker, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        return True
+    except FileExistsError:
+        return False
+
+
+def _misbehave(tool, name, latency, markers=('fail', 'hang', 'flaky', 'slow')):
+    """Applies the input's behaviour. Returns the latency to use, or an exit code to stop with."""
+    behaviour = _behaviour(tool, name, markers)
+    if behaviour == 'fail':
+        sys.stderr.write(f"{name}: Invalid data found when processing input\n")
+        return 1
+    if behaviour == 'hang' or (behaviour == 'flaky' and _first_run(tool, name)):
+        while True:
+            time.sleep(3600)
+    if behaviour == 'slow':
+        return float(latency * 10)
+    return float(latency)
+
+
+def _parse_ffmetadata(path):
+    chapters, current = [], None
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f.read().splitlines():
+            if line == '[CHAPTER]':
+                current = [0, 0, '']
+                chapters.append(current)
+            elif current is not None and '=' in line:
+                key, value = line.split('=', 1)
+                if key == 'START':
+                    current[0] = int(value)
+                elif key == 'END':
+                    current[1] = int(value)
+                elif key == 'title':
+                    current[2] = re.sub(r'\\(.)', r'\1', value)
+    return chapters
+
+
+def ffmpeg(args):
+    if '-version' in args:
+        print("ffmpeg version 0.0-fake Copyright (c) stand-in for load tests")
+        return 0
+    inputs, options = [], {}
+    index = 0
+    while index < len(args) - 1: # The last argument is the output
+        if args[index] in FFMPEG_FLAGS or not args[index].startswith('-'):
+            index += 1
+            continue
+        if args[index] == '-i':
+            inputs.append(args[index + 1])
+        else:
+            options.setdefault(args[index], args[index + 1])
+        index += 2
+    if not inputs:
+        sys.stderr.write("Output file #0 does not contain any stream\n")
+        return 1
+    output = args[-1]
+    latency = float(os.environ.get('FAKE_TOOLS_LATENCY') or 0.01)
+    result = _misbehave('ffmpeg', inputs[0], latency)
+    if isinstance(result, int):
+        return result
+    latency = result
+    progress_stream = sys.stdout if options.get('-progress') == 'pipe:1' else None
+
+    if options.get('-f') == 'concat':
+        with open(inputs[0], 'r', encoding='utf-8') as f:
+            clips = [line[len("file '"):-1].replace("'\\''", "'") for line in f.read().splitlines()
+                     if line.startswith("file '")]
+        duration = padding = 0
+        for clip in clips:
+            header, clip_padding = read_media(clip)
+            duration += header['duration_ms']
+            padding += clip_padding
+        header = fake_media_header(duration)
+    else:
+        header, padding = read_media(inputs[0])
+    if options.get('-map_chapters') == '-1' or options.get('-map_metadata') == '-1':
+        header['chapters'] = []
+    if options.get('-map_metadata') == '1' and len(inputs) > 1:
+        header['chapters'] = _parse_ffmetadata(inputs[1])
+
+    if options.get('-f') == 'segment':
+        cuts = [int(float(value) * 1000) for value in options.get('-segment_times', '').split(',') if value]
+        bounds = [0] + cuts + [header['duration_ms']]
+        segments = len(bounds) - 1
+        for number, (start, end) in enumerate(zip(bounds, bounds[1:])):
+            _write_media(output % number, fake_media_header(end - start), padding // segments, latency / segments,
+                         progress_stream)
+        return 0
+    if output in ('-', 'pipe:1', 'pipe:'):
+        time.sleep(latency)
+        sys.stdout.buffer.write(json.dumps(header).encode('utf-8'))
+        return 0
+    _write_media(output, header, padding, latency, progress_stream)
+    return 0
+
+
+def ffprobe(args):
+    if '-version' in args:
+        print("ffprobe version 0.0-fake")
+        return 0
+    path = args[-1]
+    latency = float(os.environ.get('FAKE_TOOLS_LATENCY') or 0.01) / 4 # Probes only read headers
+    result = _misbehave('ffprobe', path, latency, markers=('fail', 'slow'))
+    if isinstance(result, int):
+        return result
+    time.sleep(result)
+    if not os.path.exists(path):
+        sys.stderr.write(f"{path}: No such file or directory\n")
+        return 1
+    header, padding = read_media(path)
+    duration_ms = header['duration_ms']
+    if 'packet=pts_time,dts_time,flags' in args:
+        for ms in range(0, duration_ms, KEYFRAME_INTERVAL_MS):
+            print(f"{ms / 1000:.6f},{ms / 1000:.6f},K__")
+        return 0
+    size = padding + 256
+    print(json.dumps({
+        'format': {'duration': f"{duration_ms / 1000:.6f}", 'format_name': 'mov,mp4,m4a,3gp,3g2,mj2',
+                   'size': str(size), 'bit_rate': str(int(size * 8000 / max(duration_ms, 1)))},
+        'streams': [
+            {'index': 0, 'codec_type': 'video', 'codec_name': 'h264', 'width': 1920, 'height': 1080,
+             'pix_fmt': 'yuv420p', 'avg_frame_rate': '25/1', 'r_frame_rate': '25/1', 'time_base': '1/12800'},
+            {'index': 1, 'codec_type': 'audio', 'codec_name': 'aac', 'sample_rate': '48000', 'channels': 2,
+             'channel_layout': 'stereo', 'time_base': '1/48000'},
+        ],
+        'chapters': [{'id': number, 'start_time': f"{start / 1000:.6f}", 'end_time': f"{end / 1000:.6f}",
+                      'tags': {'title': title}} for number, (start, end, title) in enumerate(header['chapters'])],
+    }))
+    return 0
+
+
+def yt_dlp(args):
+    if '--version' in args:
+        print("2099.01.01-fake")
+        return 0
+    urls = [arg for arg in args if '://' in arg]
+    if not urls:
+        sys.stderr.write("ERROR: You must provide at least one URL.\n")
+        return 2
+    url = urls[0]
+    title = f"Fake video {hashlib.sha1(url.encode('utf-8')).hexdigest()[:8]}"
+    latency = float(os.environ.get('FAKE_TOOLS_LATENCY') or 0.01)
+    result = _misbehave('yt-dlp', url, latency)
+    if isinstance(result, int):
+        return result
+    if '--get-title' in args:
+        time.sleep(result / 4)
+        print(title)
+        return 0
+    template = args[args.index('-o') + 1] if '-o' in args else "%(title)s.%(ext)s"
+    output = template.replace('%(title)s', title).replace('%(ext)s', 'mp4').replace('%%', '%')
+    duration_ms = default_duration_ms(url)
+    for percent in range(0, 101, 10):
+        print(f"[download] {percent:5.1f}% of 1.00MiB at 10.00MiB/s ETA 00:00", flush=True)
+        time.sleep(result / 11)
+    write_fake_media(output, duration_ms, 1 << 20, title=title)
+    print(f'[Merger] Merging formats into "{output}"', flush=True)
+    return 0
+
+
+def mkvpropedit(args):
+    if '--version' in args:
+        print("mkvpropedit v0.0-fake")
+        return 0
+    path = args[0]
+    result = _misbehave('mkvpropedit', path, float(os.environ.get('FAKE_TOOLS_LATENCY') or 0.01) / 4)
+    if isinstance(result, int):
+        return 2 # mkvpropedit's error status
+    header, padding = read_media(path)
+    if '--chapters' in args:
+        with open(args[args.index('--chapters') + 1], 'r', encoding='utf-8') as f:
+            xml = f.read()
+        atoms = re.findall(r'<ChapterTimeStart>(\d+):(\d+):(\d+)\.(\d{3})\d*</ChapterTimeStart>\s*'
+                           r'<ChapterTimeEnd>(\d+):(\d+):(\d+)\.(\d{3})\d*</ChapterTimeEnd>.*?'
+                           r'<ChapterString>(.*?)</ChapterString>', xml, re.S)
+        to_ms = lambda h, m, s, ms: ((int(h) * 60 + int(m)) * 60 + int(s)) * 1000 + int(ms)
+        header['chapters'] = [[to_ms(*atom[0:4]), to_ms(*atom[4:8]), atom[8]] for atom in atoms]
+    time.sleep(result)
+    _write_media(path, header, padding, 0)
+    print("The changes are written to the file.")
+    return 0
+
+
+RUNNERS = {'ffmpeg': ffmpeg, 'ffprobe': ffprobe, 'yt-dlp': yt_dlp, 'mkvpropedit': mkvpropedit}
+
+
+def install(bin_dir):
+    """Writes a launcher for every stand-in into bin_dir and returns {tool name: launcher path}.
+       Point the applications at them with VIDEO_CHAPTER_TOOL_BIN=<bin_dir> (see tool_paths)."""
+    os.makedirs(bin_dir, exist_ok=True)
+    here = os.path.dirname(os.path.abspath(__file__))
+    paths = {}
+    for tool in TOOLS:
+        if sys.platform == "win32":
+            path = os.path.join(bin_dir, f"{tool}.cmd")
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(f'@"{sys.executable}" -S "{os.path.join(here, "fake_tools.py")}" {tool} %*\n')
+        else:
+            path = os.path.join(bin_dir, tool)
+            # -S skips site-packages: interpreter startup is most of a stand-in's cost
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(f"#!{sys.executable} -S\nimport sys\nsys.path.insert(0, {here!r})\n"
+                        f"import fake_tools\nsys.exit(fake_tools.main([{tool!r}] + sys.argv[1:]))\n")
+            os.chmod(path, 0o755)
+        paths[tool] = path
+    return paths
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] not in RUNNERS:
+        sys.stderr.write(f"usage: fake_tools.py {{{','.join(TOOLS)}}} [tool arguments]\n")
+        return 2
+    return RUNNERS[argv[0]](argv[1:])
+
+
+if __name__ == "__main__":
+    sys.exit(main())
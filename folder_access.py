@@ -0,0 +1,108 @@
+import os
+import sys
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from library_scan import scan_directory
+
+
+class AccessCancelled(Exception):
+    """Raised inside a background access job once it has been cancelled."""
+
+
+class AccessJob:
+    """Handle for a job running on a FolderAccessor. cancel() interrupts retries and backoff waits."""
+
+    def __init__(self):
+        self._cancel_event = threading.Event()
+        self.future = None
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    def done(self):
+        return self.future is not None and self.future.done()
+
+    def check(self):
+        """Raises AccessCancelled if the job has been cancelled."""
+        if self._cancel_event.is_set():
+            raise AccessCancelled()
+
+    def sleep(self, seconds):
+        """Waits for the given time, returning early (with AccessCancelled) if cancelled."""
+        if self._cancel_event.wait(seconds):
+            raise AccessCancelled()
+
+
+class FolderAccessor:
+    """Runs folder listings and network diagnostics off the UI thread.
+
+    Listings are retried with exponential backoff, can be cancelled at any
+    point, report partial results while a slow share is being enumerated and
+    remember the last successful listing of every folder.
+    """
+
+    def __init__(self, max_workers=2):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="FolderAccess")
+        self._last_good = {} # normalized folder -> {file name: (size, mtime_ns)}
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args):
+        """Runs fn(job, *args) in the background and returns its AccessJob."""
+        job = AccessJob()
+        job.future = self._executor.submit(fn, job, *args)
+        return job
+
+    def last_good_listing(self, folder):
+        """Returns the last successful listing of folder, or None if it was never listed."""
+        with self._lock:
+            files = self._last_good.get(os.path.normpath(folder))
+        return dict(files) if files is not None else None
+
+    def list_folder(self, folder, log=None, on_partial=None, max_retries=5, base_delay=0.5, max_delay=8.0):
+        """Lists folder in the background with exponential backoff between attempts.
+           The job's result is a {file name: (size, mtime_ns)} dict from a single scandir pass;
+           on_partial(names) receives batches of file names as they are enumerated."""
+        return self.submit(self._list_with_backoff, os.path.normpath(folder), log or (lambda message: None),
+                           on_partial, max_retries, base_delay, max_delay)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _list_with_backoff(self, job, folder, log, on_partial, max_retries, base_delay, max_delay):
+        delay = base_delay
+        for attempt in range(max_retries):
+            job.check()
+            log(f"Access attempt {attempt + 1}/{max_retries} for: {folder}")
+            try:
+                # On Windows, for UNC paths, sometimes opening in explorer helps trigger auth
+                if sys.platform.startswith('win') and folder.startswith('\\\\') and attempt == 0:
+                    try:
+                        log("   Attempting to open path in Explorer to trigger potential authentication...")
+                        subprocess.Popen(f'explorer "{folder}"', shell=True)
+                        job.sleep(1) # Give Explorer a moment to start/authenticate
+                    except AccessCancelled:
+                        raise
+                    except Exception as e:
+                        log(f"   Could not open Explorer (may not be necessary): {e}")
+
+                files = scan_directory(folder, check=job.check, on_partial=on_partial)
+                with self._lock:
+                    self._last_good[folder] = files
+                log(f"✓ Successfully accessed folder on attempt {attempt + 1}.")
+                return dict(files)
+
+            except AccessCancelled:
+                raise
+            except Exception as e:
+                log(f"✗ Attempt {attempt + 1} failed: {e}")
+                if attempt == max_retries - 1:
+                    raise
+                log(f"   Retrying in {delay:.1f}s...")
+                job.sleep(delay)
+                delay = min(delay * 2, max_delay)
@@ -22,7 +22,7 @@ install_python_packages() {
     python3 -m pip install --upgrade pip
     
     # Install moviepy and yt-dlp
-    python3 -m pip install moviepy yt-dlp
+    python3 -m pip install moviepy yt-dlp numpy
     
     echo "✅ Python packages installed successfully"
 }
@@ -90,7 +90,7 @@ else
     echo "Please install dependencies manually:"
     echo "1. Install Python from https://python.org/downloads/"
     echo "2. Install ffmpeg from https://ffmpeg.org/download.html"
-    echo "3. Install Python packages: pip install moviepy yt-dlp"
+    echo "3. Install Python packages: pip install moviepy yt-dlp numpy"
     exit 1
 fi
 
@@ -104,6 +104,7 @@ echo "✅ tkinter - Python GUI toolkit (for desktop applications)"
 echo "✅ ffmpeg - Video/audio processing"
 echo "✅ moviepy - Python video editing library"
 echo "✅ yt-dlp - YouTube downloader"
+echo "✅ numpy - Array maths for chapter suggestions"
 echo ""
 echo "You can now use these tools in your scripts!"
 
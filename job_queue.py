@@ -0,0 +1,218 @@
+import os
+import time
+import socket
+import sqlite3
+import threading
+
+QUEUE_FILE_NAME = '.chapter_queue.sqlite3'
+DEFAULT_LEASE_SECONDS = 120 # A claim not renewed for this long is taken to belong to a dead worker
+MAX_ATTEMPTS = 3 # Claims per job before it is left as failed
+
+PENDING = 'pending'
+LEASED = 'leased'
+DONE = 'done'
+FAILED = 'failed'
+
+
+def queue_path(folder):
+    """The shared queue of a batch folder lives inside the folder, so every machine that can see it finds it."""
+    return os.path.join(folder, QUEUE_FILE_NAME)
+
+
+def worker_id():
+    """Identifies this process in claims ("host:pid")."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class LeaseQueue:
+    """Job queue in an SQLite file that several processes, on one or several machines, work off together.
+
+    A worker claims a job by taking a lease on it, renews the lease with
+    heartbeats while it works, and finishes it with a status line. A lease
+    that runs out (the worker crashed or lost the share) makes the job
+    claimable again, up to MAX_ATTEMPTS claims. Every change is one short
+    BEGIN IMMEDIATE transaction, so claims never overlap. The rollback
+    journal is used instead of WAL because WAL needs shared memory, which
+    network shares do not provide. Leases are compared against each
+    claimant's clock, so hosts should keep their clocks roughly in sync.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, timeout=60, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=DELETE")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                signature TEXT NOT NULL,
+                state TEXT NOT NULL,
+                owner TEXT,
+                lease_until REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                status TEXT
+            )""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs(state, size)")
+
+    def _transaction(self, work):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = work(self._conn)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                # Also when COMMIT itself failed (e.g. the share dropped out), so the connection is not
+                # left inside a transaction that makes every later BEGIN fail
+                try:
+                    self._conn.execute("ROLLBACK")
+                except sqlite3.Error:
+                    pass # Already rolled back
+                raise
+            return result
+
+    def enqueue(self, jobs):
+        """Adds (path, size, signature, redo) jobs. A known job is queued again when its signature (the
+           identity of its inputs) changed, when redo is set, or when it failed; jobs that are done
+           or being worked on are left alone. Returns the number of jobs made pending."""
+        def work(conn):
+            queued = 0
+            for path, size, signature, redo in jobs:
+                row = conn.execute("SELECT signature, state FROM jobs WHERE path = ?", (path,)).fetchone()
+                if row is None:
+                    conn.execute("INSERT INTO jobs (path, size, signature, state) VALUES (?, ?, ?, ?)",
+                                 (path, size, signature, PENDING))
+                    queued += 1
+                elif row[1] != LEASED and (row[0] != signature or redo or row[1] == FAILED):
+                    conn.execute("UPDATE jobs SET size = ?, signature = ?, state = ?, owner = NULL, lease_until = NULL, "
+                                 "attempts = 0, status = NULL WHERE path = ?", (size, signature, PENDING, path))
+                    queued += 1
+            return queued
+        return self._transaction(work)
+
+    def claim(self, owner, lease_seconds=DEFAULT_LEASE_SECONDS, path=None, largest_first=False):
+        """Leases the next pending job (or one whose lease ran out) to owner, smallest first unless
+           largest_first. With path, only that job is tried. Returns the job's path, or None."""
+        def work(conn):
+            now = time.time()
+            query = ("SELECT path FROM jobs WHERE (state = ? OR (state = ? AND lease_until < ?)) AND attempts < ?")
+            params = [PENDING, LEASED, now, MAX_ATTEMPTS]
+            if path is not None:
+                query += " AND path = ?"
+                params.append(path)
+            query += f" ORDER BY size {'DESC' if largest_first else 'ASC'} LIMIT 1"
+            row = conn.execute(query, params).fetchone()
+            if row is None:
+                # Jobs whose last lease ran out with no claims left are given up on
+                conn.execute("UPDATE jobs SET state = ?, status = 'Failed (worker lost, no attempts left)' "
+                             "WHERE state = ? AND lease_until < ? AND attempts >= ?", (FAILED, LEASED, now, MAX_ATTEMPTS))
+                return None
+            conn.execute("UPDATE jobs SET state = ?, owner = ?, lease_until = ?, attempts = attempts + 1 WHERE path = ?",
+                         (LEASED, owner, now + lease_seconds, row[0]))
+            return row[0]
+        return self._transaction(work)
+
+    def heartbeat(self, owner, path, lease_seconds=DEFAULT_LEASE_SECONDS):
+        """Extends owner's lease on path. Returns False if the lease was lost to another worker."""
+        def work(conn):
+            cursor = conn.execute("UPDATE jobs SET lease_until = ? WHERE path = ? AND owner = ? AND state = ?",
+                                  (time.time() + lease_seconds, path, owner, LEASED))
+            return cursor.rowcount == 1
+        return self._transaction(work)
+
+    def finish(self, owner, path, status, failed=False):
+        """Records the outcome of a leased job. Returns False if owner no longer held the lease."""
+        def work(conn):
+            cursor = conn.execute("UPDATE jobs SET state = ?, status = ?, lease_until = NULL "
+                                  "WHERE path = ? AND owner = ? AND state = ?",
+                                  (FAILED if failed else DONE, status, path, owner, LEASED))
+            return cursor.rowcount == 1
+        return self._transaction(work)
+
+    def release(self, owner, path):
+        """Hands a leased job back unfinished (e.g. on cancel) without using up an attempt."""
+        def work(conn):
+            conn.execute("UPDATE jobs SET state = ?, owner = NULL, lease_until = NULL, attempts = MAX(attempts - 1, 0) "
+                         "WHERE path = ? AND owner = ? AND state = ?", (PENDING, path, owner, LEASED))
+        self._transaction(work)
+
+    def job(self, path):
+        """Returns (state, owner, status) of a job, or None."""
+        with self._lock:
+            return self._conn.execute("SELECT state, owner, status FROM jobs WHERE path = ?", (path,)).fetchone()
+
+    def counts(self):
+        """Returns {state: number of jobs}; leases that ran out are counted as pending."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT CASE WHEN state = ? AND lease_until < ? THEN ? ELSE state END, COUNT(*) FROM jobs GROUP BY 1",
+                (LEASED, time.time(), PENDING)).fetchall()
+        return dict(rows)
+
+    def done_signatures(self):
+        """Returns {path: signature} for the jobs that are done (what enqueue() would leave alone)."""
+        with self._lock:
+            return dict(self._conn.execute("SELECT path, signature FROM jobs WHERE state = ?", (DONE,)).fetchall())
+
+    def results(self):
+        """Returns (path, state, owner, status) for every job, by path."""
+        with self._lock:
+            return self._conn.execute("SELECT path, state, owner, status FROM jobs ORDER BY path").fetchall()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class LeaseKeeper:
+    """Context manager that renews a lease from a background thread while the job runs.
+       `lost` is set, and the `cancel` Event with it, if another worker took the job over in the
+       meantime; pass `cancel` to the job's processes so they stop instead of racing the new owner."""
+
+    def __init__(self, queue, owner, path, lease_seconds=DEFAULT_LEASE_SECONDS):
+        self.queue = queue
+        self.owner = owner
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.lost = False
+        self.cancel = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.lease_seconds / 4):
+            try:
+                if not self.queue.heartbeat(self.owner, self.path, self.lease_seconds):
+                    self._lose()
+                    return
+            except sqlite3.Error:
+                pass # Share briefly unreachable; the next heartbeat tries again before the lease runs out
+
+    def _lose(self):
+        self.lost = True
+        self.cancel.set()
+
+    def confirm(self, attempts=3):
+        """Renews the lease now, right before the job publishes its output. Returns False (and sets
+           `cancel`) if the lease is lost, or if the queue stays unreachable so it cannot be confirmed."""
+        if self.lost:
+            return False
+        for attempt in range(attempts):
+            try:
+                if self.queue.heartbeat(self.owner, self.path, self.lease_seconds):
+                    return True
+                break
+            except sqlite3.Error:
+                time.sleep(1)
+        self._lose()
+        return False
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        return False
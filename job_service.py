@@ -0,0 +1,481 @@
+import json
+import time
+import queue
+import argparse
+import threading
+import itertools
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from batch_worker import plan_video
+from chapter_jobs import JobFailed, apply_chapters_to_copy
+from chapter_media import split_by_chapters
+from metrics import JOBS, OPENMETRICS_CONTENT_TYPE, PROMETHEUS_CONTENT_TYPE, QUEUE_DEPTH, REGISTRY
+from probe_cache import ProbeCache, probe_file
+from process_watchdog import Watchdog
+from tool_paths import find_tool
+from youtube_download import download_video, in_process_available
+
+DEFAULT_PORT = 8765
+DEFAULT_WORKERS = 2
+DEFAULT_QUEUE_SIZE = 1000 # Queued jobs beyond this are refused with 503 until workers catch up
+KEEP_FINISHED = 10000 # Finished jobs kept for GET /jobs/<id>; older ones are forgotten
+SSE_KEEPALIVE = 15 # Seconds between comment lines on an idle event stream
+
+# Job type -> (required parameters, tool it needs)
+JOB_TYPES = {
+    'apply': (('video',), 'ffmpeg'),
+    'split': (('video',), 'ffmpeg'),
+    'probe': (('path',), 'ffprobe'),
+    'download': (('url',), 'yt-dlp'),
+}
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+
+class QueueFull(Exception):
+    pass
+
+
+class ServiceJob:
+    """State of one submitted job as reported by the API."""
+
+    __slots__ = ('id', 'type', 'params', 'state', 'progress', 'result', 'error', 'created', 'started',
+                 'finished', 'cancel', 'messages', '_last_progress')
+
+    def __init__(self, job_id, job_type, params):
+        self.id = job_id
+        self.type = job_type
+        self.params = params
+        self.state = QUEUED
+        self.progress = None # 0..1 where the job reports it
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.cancel = threading.Event()
+        self.messages = deque(maxlen=50) # Last log lines
+        self._last_progress = (0, 0.0) # (monotonic time, value) of the last progress event
+
+    def snapshot(self, messages=False):
+        data = {'id': self.id, 'type': self.type, 'params': self.params, 'state': self.state,
+                'progress': self.progress, 'result': self.result, 'error': self.error,
+                'created': self.created, 'started': self.started, 'finished': self.finished}
+        if messages:
+            data['messages'] = list(self.messages)
+        return data
+
+
+class _Subscriber:
+    __slots__ = ('job_id', 'events', 'dropped')
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.events = queue.Queue(maxsize=1000)
+        self.dropped = False # Set when the client reads too slowly and events were lost
+
+
+class JobService:
+    """Runs submitted chapter jobs on a fixed pool of worker threads.
+
+    Jobs wait in a bounded queue; submit() raises QueueFull when it is full
+    so callers back off instead of piling up work. Jobs cancelled while
+    waiting no longer count against the bound. A job leaves the queued
+    state exactly once, either to run or cancelled, under the lock. Every state change,
+    progress update and log line is published to event subscribers (the
+    server-sent event streams).
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS, queue_size=DEFAULT_QUEUE_SIZE, tools=None, probe_cache=None):
+        self.tools = tools or {}
+        self.probe_cache = probe_cache
+        self.workers = max(1, workers)
+        self.queue_size = queue_size
+        self._queue = queue.Queue() # Bounded by _waiting, which leaves out jobs cancelled while queued
+        self._waiting = 0
+        self._jobs = {}
+        self._finished = deque()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._subscribers = []
+        self._threads = []
+        self.running = 0
+
+    def start(self):
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"JobWorker-{index + 1}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def shutdown(self):
+        for thread in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join(timeout=5)
+
+    def check(self, spec):
+        """Returns (type, params) of a job spec from the API, or raises ValueError."""
+        if not isinstance(spec, dict):
+            raise ValueError("A job must be a JSON object")
+        job_type = spec.get('type')
+        if job_type not in JOB_TYPES:
+            raise ValueError(f"Unknown job type {job_type!r}; expected one of {', '.join(JOB_TYPES)}")
+        required, tool = JOB_TYPES[job_type]
+        params = {key: value for key, value in spec.items() if key != 'type'}
+        missing = [key for key in required if not params.get(key)]
+        if missing:
+            raise ValueError(f"{job_type} job needs {', '.join(missing)}")
+        if not self.tools.get(tool) and not (tool == 'yt-dlp' and in_process_available()):
+            raise ValueError(f"{tool} is not available to the service")
+        return job_type, params
+
+    def submit(self, specs):
+        """Queues a list of job specs, all or none. Returns the new jobs; raises ValueError for an
+           invalid spec and QueueFull when there is not room for all of them."""
+        checked = [self.check(spec) for spec in specs]
+        with self._lock:
+            if self._waiting + len(checked) > self.queue_size:
+                raise QueueFull(f"Queue is full ({self._waiting} of {self.queue_size} waiting)")
+            jobs = []
+            for job_type, params in checked:
+                job = ServiceJob(str(next(self._ids)), job_type, params)
+                self._jobs[job.id] = job
+                jobs.append(job)
+                self._queue.put_nowait(job)
+                self._waiting += 1
+        for job in jobs:
+            self._publish(job, 'state')
+        return jobs
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def list(self, state=None, limit=100):
+        with self._lock:
+            jobs = [job for job in self._jobs.values() if state is None or job.state == state]
+        return jobs[-limit:]
+
+    def cancel(self, job_id):
+        """Cancels a queued or running job. Returns the job, or None if unknown."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            job.cancel.set()
+            queued = job.state == QUEUED
+            if queued:
+                job.state = CANCELLED # Claimed here, so _work skips it when it comes out of the queue
+                self._waiting -= 1
+        if queued:
+            self._finish(job, CANCELLED)
+        return job
+
+    def stats(self):
+        return {'workers': self.workers, 'running': self.running, 'queued': self._waiting,
+                'queue_size': self.queue_size, 'jobs': len(self._jobs)}
+
+    def subscribe(self, job_id=None):
+        subscriber = _Subscriber(job_id)
+        with self._lock:
+            self._subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
+
+    def _publish(self, job, event, **extra):
+        data = {'id': job.id, 'state': job.state, 'progress': job.progress}
+        data.update(extra)
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            if subscriber.job_id not in (None, job.id):
+                continue
+            try:
+                subscriber.events.put_nowait((event, data))
+            except queue.Full:
+                subscriber.dropped = True
+
+    def _log(self, job, message):
+        job.messages.append(message)
+        self._publish(job, 'log', message=message)
+
+    def _progress(self, job, value):
+        job.progress = round(value, 4)
+        last_time, last_value = job._last_progress
+        now = time.monotonic()
+        # At most a few events per second per job, whatever rate the tool reports at
+        if value >= 1 or value - last_value >= 0.01 or now - last_time >= 0.5:
+            job._last_progress = (now, value)
+            self._publish(job, 'progress')
+
+    def _finish(self, job, state, result=None, error=None):
+        job.state = state
+        job.result = result
+        job.error = error
+        job.finished = time.time()
+        JOBS.inc(labels=('service', state))
+        self._publish(job, 'state', result=result, error=error)
+        with self._lock:
+            self._finished.append(job.id)
+            while len(self._finished) > KEEP_FINISHED:
+                self._jobs.pop(self._finished.popleft(), None)
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            with self._lock:
+                if job.state != QUEUED:
+                    continue # Cancelled while queued
+                job.state = RUNNING
+                job.started = time.time()
+                self._waiting -= 1
+                self.running += 1
+            self._publish(job, 'state')
+            try:
+                result = getattr(self, f"_run_{job.type}")(job)
+                self._finish(job, SUCCEEDED, result)
+            except JobFailed as e:
+                self._finish(job, CANCELLED if job.cancel.is_set() else FAILED, error=e.status)
+            except Exception as e:
+                self._finish(job, CANCELLED if job.cancel.is_set() else FAILED, error=str(e))
+            finally:
+                with self._lock:
+                    self.running -= 1
+
+    def _timeline(self, job):
+        params = job.params
+        return plan_video(params['video'], self.probe_cache, self.tools.get('ffprobe'),
+                          bool(params.get('snap')), params.get('chapters'))
+
+    def _run_apply(self, job):
+        timeline = self._timeline(job)
+        output = apply_chapters_to_copy(self.tools['ffmpeg'], job.params['video'], timeline, job.params.get('output'),
+                                        log=lambda message: self._log(job, message),
+                                        watchdog=Watchdog(cancel=job.cancel),
+                                        mkvpropedit_path=self.tools.get('mkvpropedit'),
+                                        progress=lambda value: self._progress(job, value))
+        return {'output': output, 'chapters': len(timeline)}
+
+    def _run_split(self, job):
+        timeline = self._timeline(job)
+        keyframes = None
+        if self.probe_cache is not None and self.tools.get('ffprobe'):
+            try:
+                keyframes = self.probe_cache.keyframes(job.params['video'], self.tools['ffprobe'], cancel=job.cancel)
+            except Exception as e:
+                if job.cancel.is_set():
+                    raise
+                self._log(job, f"Could not index keyframes ({e}); cutting at the chapter starts.")
+        outputs = split_by_chapters(self.tools['ffmpeg'], job.params['video'], timeline, job.params.get('output_dir'),
+                                    progress=lambda value: self._progress(job, value), keyframes=keyframes,
+                                    log=lambda message: self._log(job, message), cancel=job.cancel)
+        return {'outputs': outputs}
+
+    def _run_probe(self, job):
+        path = job.params['path']
+        if self.probe_cache is not None:
+            return self.probe_cache.probe(path, self.tools['ffprobe'], cancel=job.cancel)
+        return probe_file(path, self.tools['ffprobe'], cancel=job.cancel)
+
+    def _run_download(self, job):
+        output = download_video(self.tools.get('yt-dlp'), job.params['url'], job.params.get('folder', '.'),
+                                log=lambda message: self._log(job, message),
+                                progress=lambda value: self._progress(job, value), cancel=job.cancel)
+        return {'output': output}
+
+
+class JobRequestHandler(BaseHTTPRequestHandler):
+    """Local JSON API of the job service.
+
+    POST   /jobs               submit one job object or a list of them -> 202 with the jobs,
+                               503 (Retry-After) when the queue is full, 400 when invalid
+    GET    /jobs[?state=&limit=]  recent jobs
+    GET    /jobs/<id>          one job, with its last log lines
+    DELETE /jobs/<id>          cancel
+    GET    /jobs/<id>/events   server-sent events for one job, until it finishes
+    GET    /events             server-sent events for every job
+    GET    /health             worker and queue counts
+    GET    /metrics            OpenMetrics (or Prometheus text, by Accept header) for scraping
+    """
+
+    service = None # Set by serve()
+    server_version = "VideoChapterTool"
+
+    def log_message(self, format, *args):
+        pass # Requests are not logged; the service is driven by other tools at high rates
+
+    def _send_json(self, status, data, headers=None):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _route(self):
+        url = urlparse(self.path)
+        return [part for part in url.path.split('/') if part], parse_qs(url.query)
+
+    def do_GET(self):
+        parts, query = self._route()
+        if parts == ['health']:
+            self._send_json(200, dict(self.service.stats(), status='ok'))
+        elif parts == ['metrics']:
+            self._send_metrics()
+        elif parts == ['jobs']:
+            state = query.get('state', [None])[0]
+            try:
+                limit = int(query.get('limit', ['100'])[0])
+            except ValueError:
+                self._send_json(400, {'error': "limit must be a whole number"})
+                return
+            if limit < 1:
+                self._send_json(400, {'error': "limit must be at least 1"})
+                return
+            self._send_json(200, [job.snapshot() for job in self.service.list(state, limit)])
+        elif parts == ['events']:
+            self._stream_events(None)
+        elif len(parts) in (2, 3) and parts[0] == 'jobs':
+            job = self.service.get(parts[1])
+            if job is None:
+                self._send_json(404, {'error': 'No such job'})
+            elif len(parts) == 2:
+                self._send_json(200, job.snapshot(messages=True))
+            elif parts[2] == 'events':
+                self._stream_events(job)
+            else:
+                self._send_json(404, {'error': 'Not found'})
+        else:
+            self._send_json(404, {'error': 'Not found'})
+
+    def do_POST(self):
+        parts, _ = self._route()
+        if parts != ['jobs']:
+            self._send_json(404, {'error': 'Not found'})
+            return
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+            body = json.loads(self.rfile.read(length) or b'null')
+            specs = body if isinstance(body, list) else [body]
+            jobs = self.service.submit(specs)
+        except (ValueError, json.JSONDecodeError) as e:
+            self._send_json(400, {'error': str(e)})
+            return
+        except QueueFull as e:
+            self._send_json(503, {'error': str(e)}, {'Retry-After': '5'})
+            return
+        data = [job.snapshot() for job in jobs]
+        self._send_json(202, data if isinstance(body, list) else data[0])
+
+    def do_DELETE(self):
+        parts, _ = self._route()
+        job = self.service.cancel(parts[1]) if len(parts) == 2 and parts[0] == 'jobs' else None
+        if job is None:
+            self._send_json(404, {'error': 'No such job'})
+        else:
+            self._send_json(200, job.snapshot())
+
+    def _send_metrics(self):
+        QUEUE_DEPTH.set(self.service.stats()['queued'], labels=('service',))
+        openmetrics = 'application/openmetrics-text' in (self.headers.get('Accept') or '')
+        body = REGISTRY.render(openmetrics).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', OPENMETRICS_CONTENT_TYPE if openmetrics else PROMETHEUS_CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_event(self, event, data):
+        self.wfile.write(f"event: {event}\ndata: {json.dumps(data)}\n\n".encode('utf-8'))
+        self.wfile.flush()
+
+    def _stream_events(self, job):
+        subscriber = self.service.subscribe(job.id if job else None)
+        try:
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Cache-Control', 'no-cache')
+            self.end_headers()
+            if job is not None:
+                # Current state first, so a client that subscribes late still sees where the job is
+                self._write_event('state', job.snapshot())
+                if job.state in (SUCCEEDED, FAILED, CANCELLED):
+                    return
+            while not subscriber.dropped:
+                try:
+                    event, data = subscriber.events.get(timeout=SSE_KEEPALIVE)
+                except queue.Empty:
+                    self.wfile.write(b": keepalive\n\n")
+                    self.wfile.flush()
+                    continue
+                self._write_event(event, data)
+                if job is not None and event == 'state' and data['state'] in (SUCCEEDED, FAILED, CANCELLED):
+                    return
+        except (BrokenPipeError, ConnectionResetError):
+            pass # Client went away
+        finally:
+            self.service.unsubscribe(subscriber)
+
+
+def serve(host='127.0.0.1', port=DEFAULT_PORT, workers=DEFAULT_WORKERS, queue_size=DEFAULT_QUEUE_SIZE, tools=None):
+    """Runs the job service until interrupted."""
+    try:
+        probe_cache = ProbeCache()
+    except Exception as e:
+        probe_cache = None
+        print(f"Probe cache unavailable ({e}); probes are not cached.", flush=True)
+    service = JobService(workers, queue_size, tools, probe_cache)
+    handler = type('Handler', (JobRequestHandler,), {'service': service})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    service.start()
+    print(f"Job service listening on http://{host}:{server.server_port} "
+          f"({service.workers} workers, queue of {queue_size})", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serves a local HTTP/JSON API for submitting chapter jobs.")
+    parser.add_argument('--host', default='127.0.0.1', help="Address to listen on (default: this machine only)")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help="Jobs run at the same time")
+    parser.add_argument('--queue-size', type=int, default=DEFAULT_QUEUE_SIZE,
+                        help="Jobs that may wait before submissions are refused with 503")
+    parser.add_argument('--ffmpeg')
+    parser.add_argument('--ffprobe')
+    parser.add_argument('--yt-dlp', dest='yt_dlp')
+    args = parser.parse_args(argv)
+    tools = {
+        'ffmpeg': args.ffmpeg or find_tool('ffmpeg'),
+        'ffprobe': args.ffprobe or find_tool('ffprobe'),
+        'yt-dlp': args.yt_dlp or find_tool('yt-dlp'),
+        'mkvpropedit': find_tool('mkvpropedit'),
+    }
+    fallbacks = {'mkvpropedit': "not found (.mkv outputs are remuxed)"}
+    if in_process_available():
+        fallbacks['yt-dlp'] = "Python module (downloads run in-process)"
+    for name, path in tools.items():
+        if in_process_available() and name == 'yt-dlp':
+            path = None # The module is used even when the executable is there too
+        print(f"{name}: {path or fallbacks.get(name, 'not found (its jobs are refused)')}", flush=True)
+    serve(args.host, args.port, args.workers, args.queue_size, tools)
+    return 0
@@ -0,0 +1,210 @@
+import os
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+from chapter_timeline import ChapterTimeline
+from library_scan import VIDEO_EXTENSIONS, build_library, scan_directory
+from probe_cache import ProbeCache, probe_file
+from tool_paths import find_tool
+
+DEFAULT_TOLERANCE_MS = 100 # Container timebases round chapter starts a little
+
+# Audit statuses
+OK = 'ok'
+MISMATCH = 'mismatch'
+STALE = 'stale' # Chapters match, but the text was edited after the output was written
+MISSING_OUTPUT = 'missing_output'
+ORPHAN_OUTPUT = 'orphan_output' # "_chapters" file whose source video is gone
+ORPHAN_TEXT = 'orphan_text' # Chapter file with no video
+NO_CHAPTERS = 'no_chapters' # Chapter file that parses to nothing
+ERROR = 'error'
+
+
+def walk_folders(root, recursive=True, on_error=None):
+    """Yields (folder, scan_directory() listing) for root and, if recursive, every folder below it.
+       A folder that cannot be listed (e.g. no permission) is passed to on_error(folder, error) and
+       skipped, with the folders below it; without on_error the error is raised."""
+    pending = [root]
+    while pending:
+        folder = pending.pop()
+        try:
+            files = scan_directory(folder)
+        except OSError as e:
+            if on_error is None:
+                raise
+            on_error(folder, e)
+            continue
+        yield folder, files
+        if recursive:
+            try:
+                with os.scandir(folder) as entries:
+                    pending.extend(entry.path for entry in entries
+                                   if entry.is_dir(follow_symlinks=False) and not entry.name.startswith('.'))
+            except OSError:
+                pass
+
+
+def compare_chapters(expected, embedded, tolerance_ms=DEFAULT_TOLERANCE_MS):
+    """Compares a parsed ChapterTimeline with embedded [start_ms, end_ms, title] chapters.
+       Returns a list of differences; empty when they agree."""
+    differences = []
+    if len(expected) != len(embedded):
+        differences.append(f"{len(expected)} chapters in the text, {len(embedded)} embedded")
+    for index, ((start, _, title), (embedded_start, _, embedded_title)) in enumerate(zip(expected, embedded)):
+        if abs(start - embedded_start) > tolerance_ms:
+            differences.append(f"chapter {index + 1} starts at {start} ms in the text, {embedded_start} ms embedded")
+        if title.strip() != embedded_title.strip():
+            differences.append(f"chapter {index + 1} is titled {title!r} in the text, {embedded_title!r} embedded")
+    return differences
+
+
+def _folder_items(folder, files, video_extensions):
+    """Splits one folder listing into audit items (no file is opened here)."""
+    names_lower = {name.lower(): name for name in files}
+    entries = build_library(files, video_extensions)
+    items = []
+    video_bases = set()
+    for entry in entries:
+        base, ext = os.path.splitext(entry.name)
+        video_bases.add(base.lower())
+        if base.endswith('_chapters') and f"{base[:-len('_chapters')]}{ext}".lower() not in names_lower:
+            items.append({'status': ORPHAN_OUTPUT, 'output': os.path.join(folder, entry.name)})
+            continue
+        if not entry.has_chapter_file:
+            continue # Not managed by the tools
+        item = {'video': os.path.join(folder, entry.name), 'text': os.path.join(folder, entry.chapter_file),
+                '_video_stat': files[entry.name]}
+        if entry.output_name is None:
+            item['status'] = MISSING_OUTPUT
+        else:
+            item['output'] = os.path.join(folder, entry.output_name)
+            item['_output_stat'] = files[entry.output_name]
+            item['_text_newer'] = entry.chapter_mtime_ns > entry.output_mtime_ns
+        items.append(item)
+    for name in files:
+        base, ext = os.path.splitext(name)
+        if ext.lower() != '.txt' or name.lower().endswith('.chapters.txt'):
+            continue # Not a chapter file (OGM sidecars are outputs, not sources)
+        if base.lower() not in video_bases:
+            items.append({'status': ORPHAN_TEXT, 'text': os.path.join(folder, name)})
+    return items
+
+
+def audit_library(root, ffprobe_path, probe_cache=None, recursive=True, video_extensions=VIDEO_EXTENSIONS,
+                  tolerance_ms=DEFAULT_TOLERANCE_MS, workers=16, progress=None):
+    """Audits every managed video under root and returns the report as a dict.
+
+    For each video with a companion chapter file, the chapters embedded in
+    its "_chapters" output are compared with the parsed text. Embedded
+    chapters come from ffprobe -show_chapters, which reads container
+    headers only, and are kept in the probe cache, so unchanged outputs are
+    never opened again. Outputs are probed on a thread pool.
+    """
+    started = time.time()
+    items = []
+
+    def unreadable(folder, error):
+        items.append({'status': ERROR, 'folder': folder, 'details': [str(error)]})
+
+    for folder, files in walk_folders(root, recursive, unreadable):
+        items.extend(_folder_items(folder, files, video_extensions))
+    to_check = [item for item in items if 'status' not in item]
+
+    def check(item):
+        try:
+            with open(item['text'], 'r', encoding='utf-8') as f:
+                text = f.read()
+            expected = ChapterTimeline.parse(text)
+            if not expected:
+                return NO_CHAPTERS, []
+            if any(expected.timecodes):
+                # HH:MM:SS:FF starts need the source's frame rate; only probed when the text has them
+                video = item['video']
+                if probe_cache is not None:
+                    source = probe_cache.probe(video, ffprobe_path, stat=item['_video_stat'])
+                else:
+                    source = probe_file(video, ffprobe_path)
+                if source.get('frame_rate'):
+                    expected = ChapterTimeline.parse(text, frame_rate=source['frame_rate'])
+            output = item['output']
+            if probe_cache is not None:
+                record = probe_cache.probe(output, ffprobe_path, require=('chapters',), stat=item['_output_stat'])
+            else:
+                record = probe_file(output, ffprobe_path)
+            differences = compare_chapters(expected, record['chapters'], tolerance_ms)
+            if differences:
+                return MISMATCH, differences
+            return (STALE if item['_text_newer'] else OK), []
+        except Exception as e:
+            return ERROR, [str(e)]
+
+    done = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for item, (status, details) in zip(to_check, pool.map(check, to_check)):
+            item['status'] = status
+            if details:
+                item['details'] = details
+            done += 1
+            if progress:
+                progress(done, len(to_check))
+    for item in items:
+        for key in [key for key in item if key.startswith('_')]:
+            del item[key]
+    summary = {}
+    for item in items:
+        summary[item['status']] = summary.get(item['status'], 0) + 1
+    return {'root': os.path.abspath(root), 'generated': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'seconds': round(time.time() - started, 2), 'summary': summary,
+            'items': sorted(items, key=lambda item: item.get('video') or item.get('output') or item.get('text')
+                            or item.get('folder'))}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Compares the chapters embedded in '_chapters' outputs with their companion text files "
+                    "and reports mismatches, stale or missing outputs and orphans as JSON. Only container "
+                    "headers are read.")
+    parser.add_argument('folder', help="Library folder")
+    parser.add_argument('--output', '-o', help="Write the JSON report here instead of to stdout")
+    parser.add_argument('--no-recursive', action='store_true', help="Only audit the folder itself")
+    parser.add_argument('--workers', type=int, default=16, help="Outputs probed at the same time")
+    parser.add_argument('--tolerance-ms', type=int, default=DEFAULT_TOLERANCE_MS,
+                        help="Allowed difference between text and embedded chapter starts (raise to 2000 for outputs applied with keyframe snapping)")
+    parser.add_argument('--ffprobe', help="Path to ffprobe (default: next to this script, then PATH)")
+    parser.add_argument('--no-cache', action='store_true', help="Probe every output even if the probe cache knows it")
+    args = parser.parse_args(argv)
+
+    ffprobe_path = args.ffprobe or find_tool('ffprobe')
+    if not ffprobe_path:
+        print("FFprobe not found. Place it next to this script, put it on PATH or pass --ffprobe.", file=sys.stderr)
+        return 2
+    probe_cache = None
+    if not args.no_cache:
+        try:
+            probe_cache = ProbeCache()
+        except Exception as e:
+            print(f"Probe cache unavailable ({e}); every output is probed.", file=sys.stderr)
+
+    def progress(done, total):
+        if done == total or done % 500 == 0:
+            print(f"Checked {done}/{total} outputs", file=sys.stderr, flush=True)
+
+    report = audit_library(args.folder, ffprobe_path, probe_cache, not args.no_recursive,
+                           tolerance_ms=args.tolerance_ms, workers=args.workers, progress=progress)
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+        print(f"Report written to {args.output}: " +
+              ", ".join(f"{count} {status}" for status, count in sorted(report['summary'].items())), file=sys.stderr)
+    else:
+        print(text)
+    problems = sum(count for status, count in report['summary'].items() if status != OK)
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
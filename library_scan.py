@@ -0,0 +1,107 @@
+import os
+import re
+
+VIDEO_EXTENSIONS = ('.mp4', '.mkv', '.avi', '.mov', '.webm', '.flv', '.ts')
+
+# A chapter line is any line containing a timecode (MM:SS, HH:MM:SS or HH:MM:SS:FF)
+CHAPTER_LINE_REGEX = re.compile(r'(?:\d{1,2}:)?\d{1,2}:\d{2}')
+
+
+def is_video_file(name, video_extensions=VIDEO_EXTENSIONS):
+    return name.lower().endswith(video_extensions)
+
+
+def scan_directory(folder, check=None, on_partial=None, batch_size=500):
+    """Lists folder in a single scandir pass.
+
+    Returns a dict of file name -> (size, mtime_ns) for regular files. check() is
+    called between batches so the scan can be cancelled; on_partial(names)
+    receives each batch of names as it is enumerated.
+    """
+    if not os.path.isdir(folder):
+        raise OSError(f"Path is not a directory or does not exist: {folder}")
+    files = {}
+    batch = []
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            try:
+                if not entry.is_file():
+                    continue
+                st = entry.stat() # Served from the directory listing on Windows
+            except OSError:
+                continue
+            files[entry.name] = (st.st_size, st.st_mtime_ns)
+            batch.append(entry.name)
+            if len(batch) >= batch_size:
+                if check:
+                    check()
+                if on_partial:
+                    on_partial(batch)
+                batch = []
+    if on_partial and batch:
+        on_partial(batch)
+    return files
+
+
+class LibraryEntry:
+    """Chapter status of one video, as derived from a directory scan."""
+
+    __slots__ = ('name', 'size', 'mtime_ns', 'chapter_file', 'chapter_mtime_ns',
+                 'output_name', 'output_mtime_ns', 'duration', 'chapter_count', 'last_result')
+
+    def __init__(self, name, size, mtime_ns):
+        self.name = name
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.chapter_file = None # Companion "{base}.txt" name, if present
+        self.chapter_mtime_ns = None
+        self.output_name = None # "{base}_chapters{ext}" name, if present
+        self.output_mtime_ns = None
+        self.duration = None # Seconds, from the probe/duration cache
+        self.chapter_count = None # Filled in lazily from the chapter file
+        self.last_result = None # Result of the last apply in this session
+
+    @property
+    def has_chapter_file(self):
+        return self.chapter_file is not None
+
+    @property
+    def applied_state(self):
+        """'Applied', 'Stale' (chapter file newer than output), 'Not applied' or the last batch result."""
+        if self.last_result:
+            return self.last_result
+        if self.output_name is None:
+            return "Not applied"
+        if self.chapter_mtime_ns is not None and self.chapter_mtime_ns > self.output_mtime_ns:
+            return "Stale"
+        return "Applied"
+
+
+def build_library(files, video_extensions=VIDEO_EXTENSIONS):
+    """Builds sorted LibraryEntry objects from a scan_directory() result using dict lookups only.
+       '_chapters' outputs whose source video is present are reported on the source, not listed."""
+    names_lower = {name.lower(): name for name in files}
+    entries = []
+    for name, (size, mtime_ns) in files.items():
+        base, ext = os.path.splitext(name)
+        if ext.lower() not in video_extensions:
+            continue
+        if base.endswith('_chapters') and f"{base[:-len('_chapters')]}{ext}".lower() in names_lower:
+            continue # Output of another video in this folder
+        entry = LibraryEntry(name, size, mtime_ns)
+        chapter_file = names_lower.get(f"{base}.txt".lower())
+        if chapter_file is not None:
+            entry.chapter_file = chapter_file
+            entry.chapter_mtime_ns = files[chapter_file][1]
+        output_name = names_lower.get(f"{base}_chapters{ext}".lower())
+        if output_name is not None:
+            entry.output_name = output_name
+            entry.output_mtime_ns = files[output_name][1]
+        entries.append(entry)
+    entries.sort(key=lambda entry: entry.name)
+    return entries
+
+
+def count_chapters(text):
+    """Counts the lines of a chapter file that carry a timecode."""
+    return sum(1 for line in text.splitlines() if CHAPTER_LINE_REGEX.search(line))
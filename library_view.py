@@ -0,0 +1,141 @@
+from tkinter import ttk
+
+
+class LibraryView(ttk.Frame):
+    """Virtualized list of library entries.
+
+    Only the rows that fit in the widget are ever inserted into the Treeview;
+    scrolling re-renders that window from the entry list, so the cost of a
+    redraw does not depend on how many videos the folder holds.
+    """
+
+    def __init__(self, parent, columns, describe, on_activate=None, on_visible=None, rows=10):
+        """columns is a sequence of (id, heading, width); describe(entry) returns the row values.
+           on_activate(index) is called on double-click/Enter, on_visible(indices) after each redraw."""
+        super().__init__(parent)
+        self.describe = describe
+        self.on_activate = on_activate
+        self.on_visible = on_visible
+        self.entries = []
+        self.rows = rows
+        self.offset = 0
+        self.selected_index = None
+        self.current_index = None
+
+        column_ids = [column_id for column_id, _, _ in columns]
+        self.tree = ttk.Treeview(self, columns=column_ids, show='headings', height=rows, selectmode='browse')
+        for column_id, heading, width in columns:
+            self.tree.heading(column_id, text=heading)
+            self.tree.column(column_id, width=width, stretch=(column_id == column_ids[0]))
+        self.tree.tag_configure('current', background='#dbe9ff')
+
+        self.scrollbar = ttk.Scrollbar(self, orient='vertical', command=self._on_scrollbar)
+        self.tree.grid(row=0, column=0, sticky='nsew')
+        self.scrollbar.grid(row=0, column=1, sticky='ns')
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_rowconfigure(0, weight=1)
+
+        self.tree.bind('<MouseWheel>', self._on_mousewheel)
+        self.tree.bind('<Button-4>', lambda event: self.scroll_rows(-3))
+        self.tree.bind('<Button-5>', lambda event: self.scroll_rows(3))
+        self.tree.bind('<Up>', lambda event: self._move_selection(-1))
+        self.tree.bind('<Down>', lambda event: self._move_selection(1))
+        self.tree.bind('<Prior>', lambda event: self._move_selection(-self.rows))
+        self.tree.bind('<Next>', lambda event: self._move_selection(self.rows))
+        self.tree.bind('<Home>', lambda event: self._select(0))
+        self.tree.bind('<End>', lambda event: self._select(len(self.entries) - 1))
+        self.tree.bind('<Double-1>', self._on_activate)
+        self.tree.bind('<Return>', self._on_activate)
+        self.tree.bind('<<TreeviewSelect>>', self._on_tree_select)
+        self.tree.bind('<Configure>', self._on_configure)
+
+    def set_entries(self, entries):
+        """Replaces the entry list and redraws from the top."""
+        self.entries = entries
+        self.offset = 0
+        self.selected_index = None
+        self.current_index = None
+        self.refresh()
+
+    def refresh(self):
+        """Re-renders the visible window of rows."""
+        self.tree.delete(*self.tree.get_children())
+        end = min(self.offset + self.rows, len(self.entries))
+        for index in range(self.offset, end):
+            tags = ('current',) if index == self.current_index else ()
+            self.tree.insert('', 'end', iid=str(index), values=self.describe(self.entries[index]), tags=tags)
+        if self.selected_index is not None and self.offset <= self.selected_index < end:
+            self.tree.selection_set(str(self.selected_index))
+        total = max(len(self.entries), 1)
+        self.scrollbar.set(self.offset / total, end / total)
+        if self.on_visible and end > self.offset:
+            self.on_visible(range(self.offset, end))
+
+    def refresh_entry(self, index):
+        """Updates a single row if it is currently visible."""
+        if self.tree.exists(str(index)):
+            self.tree.item(str(index), values=self.describe(self.entries[index]))
+
+    def set_current(self, index):
+        """Highlights the entry being edited and scrolls it into view."""
+        self.current_index = index
+        self.see(index)
+
+    def see(self, index):
+        """Scrolls so that index is visible, then redraws."""
+        if index is not None and not self.offset <= index < self.offset + self.rows:
+            self.offset = max(0, index - self.rows // 2)
+        self._clamp_offset()
+        self.refresh()
+
+    def scroll_rows(self, delta):
+        self.offset += delta
+        self._clamp_offset()
+        self.refresh()
+        return "break"
+
+    def _clamp_offset(self):
+        self.offset = max(0, min(self.offset, len(self.entries) - self.rows))
+
+    def _on_scrollbar(self, action, value, units=None):
+        if action == 'moveto':
+            self.offset = int(float(value) * len(self.entries))
+        elif action == 'scroll':
+            step = self.rows if units == 'pages' else 1
+            self.offset += int(value) * step
+        self._clamp_offset()
+        self.refresh()
+
+    def _on_mousewheel(self, event):
+        return self.scroll_rows(-3 if event.delta > 0 else 3)
+
+    def _on_configure(self, event):
+        # Fit the number of rendered rows to the widget height
+        row_height = 20
+        rows = max(1, (event.height - 24) // row_height)
+        if rows != self.rows:
+            self.rows = rows
+            self._clamp_offset()
+            self.refresh()
+
+    def _select(self, index):
+        if not self.entries:
+            return "break"
+        self.selected_index = max(0, min(index, len(self.entries) - 1))
+        self.see(self.selected_index)
+        self.tree.focus(str(self.selected_index))
+        return "break"
+
+    def _move_selection(self, delta):
+        start = self.selected_index if self.selected_index is not None else self.offset - 1
+        return self._select(start + delta)
+
+    def _on_tree_select(self, event):
+        selection = self.tree.selection()
+        if selection:
+            self.selected_index = int(selection[0])
+
+    def _on_activate(self, event):
+        if self.on_activate and self.selected_index is not None:
+            self.on_activate(self.selected_index)
+        return "break"
@@ -0,0 +1,412 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import fake_tools
+
+# Planted problems by marker (see fake_tools.py); the rest of the videos must all succeed
+EXPECTED_STATUS = {
+    'fail': "Failed",
+    'hang': "Stalled",
+    'flaky': "Success", # Hangs once; the watchdog kills and retries it
+}
+SIZES = {'flaky': 1024, 'hang': 1 << 20}
+MESSY_CHAPTERS = "Intro 0:00\n{a}:15 - Part one\n{a}:15 - Part one\n\n{b}:40 Part two\nnot a chapter line\n"
+NOTES_NAME = "episode notes.txt"
+
+
+def _name(index, marker):
+    return f"video_{index:06d}" + (f"__{marker}" if marker else "")
+
+
+def generate_library(folder, count, planted, seed=0, without_chapters=0.05):
+    """Writes count fake videos with companion chapter files (some messy, some missing) into folder.
+       planted maps marker -> how many videos carry it. Returns {video name: marker or None}."""
+    os.makedirs(folder, exist_ok=True)
+    markers = []
+    for marker, number in planted.items():
+        markers.extend([marker] * number)
+    names = {}
+    for index in range(count):
+        marker = markers[index] if index < len(markers) else None
+        name = _name(index, marker) + ".mp4"
+        roll = fake_tools._hash_fraction(str(seed), name)
+        duration_ms = 600000 + int(roll * 3000) * 1000
+        # Smallest-first scheduling then runs the flaky videos first and the hanging ones last, so the
+        # flaky ones get the watchdog's retries before a hanging one can use up the shared budget
+        size = SIZES.get(marker) or 2048 + int(roll * 62) * 1024
+        fake_tools.write_fake_media(os.path.join(folder, name), duration_ms, size=size)
+        names[name] = marker
+        if marker is None and roll < without_chapters:
+            continue
+        minutes = duration_ms // 60000
+        text = MESSY_CHAPTERS.format(a=1 + minutes // 3, b=1 + minutes // 2)
+        with open(os.path.join(folder, name[:-4] + ".txt"), 'w', encoding='utf-8') as f:
+            f.write(text)
+    # Timecodes in a text file that belongs to no video: the normalizer must leave it alone
+    with open(os.path.join(folder, NOTES_NAME), 'w', encoding='utf-8') as f:
+        f.write(MESSY_CHAPTERS.format(a=1, b=2))
+    return names
+
+
+class Report:
+    def __init__(self):
+        self.stages = []
+        self.problems = []
+
+    def stage(self, name, items, seconds, note=""):
+        self.stages.append((name, items, seconds, note))
+        rate = f"{items / seconds:,.0f}/s" if seconds > 0 and items else "-"
+        print(f"{name:<12} {items:>8,} items {seconds:>8.2f}s {rate:>12}  {note}", flush=True)
+
+    def check(self, condition, message):
+        if not condition:
+            self.problems.append(message)
+            print(f"  PROBLEM: {message}", flush=True)
+
+
+def _timed(function, *args, **kwargs):
+    started = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+
+def check_batch_results(report, names, results, label, lenient=()):
+    """Compares batch statuses ({video name: status}) with what the planted markers should give.
+       Markers in lenient may also end as "Stalled" (their retry went to another video)."""
+    for name, marker in names.items():
+        status = results.get(name)
+        if status is None:
+            continue # No chapter file: never queued
+        expected = EXPECTED_STATUS.get(marker, "Success")
+        if not status.startswith(expected) and not (marker in lenient and status.startswith("Stalled")):
+            report.check(False, f"{label}: {name} ended as {status!r}, expected {expected}")
+
+
+def run_scheduler_batch(folder, tools, per_device_limit, stall_timeout):
+    """The GUI batch without Tk: plan every video, then scheduler + lease queue + watchdog, as main_app does."""
+    from batch_scheduler import BatchJob, BatchScheduler
+    from batch_worker import plan_video
+    from chapter_jobs import JobFailed, apply_chapters_to_copy, queue_jobs, run_leased
+    from job_queue import LeaseQueue, queue_path, worker_id
+    from library_scan import build_library, scan_directory
+    from probe_cache import ProbeCache
+    from process_watchdog import Watchdog
+
+    entries = [entry for entry in build_library(scan_directory(folder)) if entry.has_chapter_file]
+    probe_cache = ProbeCache()
+
+    def plan(entry):
+        try:
+            return plan_video(os.path.join(folder, entry.name), probe_cache, tools['ffprobe'], False)
+        except JobFailed as e:
+            return e.status
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        plans, plan_seconds = _timed(lambda: list(pool.map(plan, entries)))
+    queue = LeaseQueue(queue_path(folder))
+    queue.enqueue(queue_jobs(folder, entries))
+    owner = worker_id()
+    # Enough retries for every flaky video (each stalls once), none left over for the hanging ones
+    watchdog = Watchdog(stall_timeout, retry_budget=sum('__flaky' in entry.name for entry in entries))
+    results = {}
+
+    def apply_job(job):
+        if isinstance(plans[job.payload], str):
+            raise JobFailed(plans[job.payload])
+        work = lambda lease: apply_chapters_to_copy(tools['ffmpeg'], job.path, plans[job.payload], watchdog=watchdog,
+                                                    lease=lease)
+        if queue.claim(owner, path=job.path) is None:
+            raise JobFailed("Skipped (claimed by another worker)")
+        return run_leased(queue, owner, job.path, work)
+
+    def job_done(job, output, error):
+        name = entries[job.payload].name
+        results[name] = "Success" if error is None else error.status if isinstance(error, JobFailed) else f"Failed: {error}"
+
+    jobs = [BatchJob(os.path.join(folder, entry.name), entry.size, index) for index, entry in enumerate(entries)]
+    scheduler = BatchScheduler(max_workers=per_device_limit * 2, per_device_limit=per_device_limit)
+    _, batch_seconds = _timed(scheduler.run, jobs, apply_job, on_done=job_done)
+    counts = queue.counts()
+    queue.close()
+    probe_cache.close()
+    return results, plan_seconds, batch_seconds, counts, watchdog
+
+
+def _logged_worker(job):
+    # A worker's per-job lines would drown the report, so each process logs to its own file
+    from batch_worker import _worker_process
+    log_path, args = job
+    with open(f"{log_path}.{os.getpid()}.log", 'a', encoding='utf-8') as log:
+        sys.stdout = log
+        return _worker_process(args)
+
+
+def run_worker_batch(folder, tools, processes, stall_timeout):
+    """batch_worker.py processes sharing the folder's lease queue (their output goes to worker.*.log in folder)."""
+    import multiprocessing
+    from batch_worker import enqueue_folder
+    from job_queue import LeaseQueue, queue_path
+
+    queue = LeaseQueue(queue_path(folder))
+    enqueue_folder(queue, folder)
+    queue.close()
+    args = (folder, tools['ffmpeg'], tools['ffprobe'], 30, False, False, None, stall_timeout, None)
+    with multiprocessing.Pool(processes) as pool:
+        pool.map(_logged_worker, [(os.path.join(folder, 'worker'), args)] * processes, chunksize=1)
+    queue = LeaseQueue(queue_path(folder))
+    results = {os.path.basename(path): status or state for path, state, owner, status in queue.results()}
+    counts = queue.counts()
+    queue.close()
+    return results, counts
+
+
+def run_gui_batch(folder, timeout):
+    """Runs main_app's own batch on a real Tk root and measures how long the UI thread goes unresponsive.
+       Returns (batch results, seconds, worst event-loop delay) or None without a display."""
+    import tkinter as tk
+    try:
+        root = tk.Tk()
+    except tk.TclError:
+        return None
+    from main_app import VideoChapterTool
+    app = VideoChapterTool(root)
+    app.batch_jobs_per_volume.set(4)
+    lags = []
+    tick_seconds = 0.05
+    last_tick = [time.perf_counter()]
+
+    def tick():
+        now = time.perf_counter()
+        lags.append(now - last_tick[0] - tick_seconds)
+        last_tick[0] = now
+        root.after(int(tick_seconds * 1000), tick)
+
+    def start():
+        app.batch_processing = True
+        app.batch_results = []
+        threading.Thread(target=app._run_batch_processing, args=(folder,), daemon=True).start()
+
+    started = time.perf_counter()
+
+    def wait_done():
+        if app.batch_processing and time.perf_counter() - started < timeout:
+            root.after(100, wait_done)
+        else:
+            root.after(500, root.quit) # Let queued UI updates drain
+
+    root.after(0, start)
+    root.after(0, tick)
+    root.after(200, wait_done)
+    root.mainloop()
+    seconds = time.perf_counter() - started
+    results = dict(app.batch_results)
+    root.destroy()
+    return results, seconds, max(lags, default=0.0)
+
+
+class _ClipHandler(SimpleHTTPRequestHandler):
+    """Serves the download stand-in clips; "__slow" ones trickle out so a download can be cancelled midway."""
+
+    def log_message(self, format, *args):
+        pass
+
+    def copyfile(self, source, outputfile):
+        if '__slow' not in self.path:
+            return super().copyfile(source, outputfile)
+        try:
+            for chunk in iter(lambda: source.read(16384), b''):
+                outputfile.write(chunk)
+                time.sleep(0.05)
+        except (BrokenPipeError, ConnectionResetError):
+            pass # The download was cancelled
+
+
+def run_download_stage(report, folder):
+    """Downloads clips from a local HTTP server with the in-process yt-dlp session (the generic
+       extractor takes the direct links), one to completion and one cancelled midway. Returns the
+       number of downloads started, or None without the yt_dlp module."""
+    import youtube_download
+    if not youtube_download.YT_DLP_MODULE_AVAILABLE:
+        return None
+    served, downloads = os.path.join(folder, 'served'), os.path.join(folder, 'downloads')
+    os.makedirs(served, exist_ok=True)
+    os.makedirs(downloads, exist_ok=True)
+    fake_tools.write_fake_media(os.path.join(served, 'clip.mp4'), 60000, size=256 * 1024)
+    fake_tools.write_fake_media(os.path.join(served, 'clip__slow.mp4'), 60000, size=4 << 20) # ~13s to serve
+    server = ThreadingHTTPServer(('127.0.0.1', 0), functools.partial(_ClipHandler, directory=served))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    # The rest of the run forces the executable (the fake yt-dlp); this stage is about the module
+    forced = os.environ.pop('VIDEO_CHAPTER_TOOL_YTDLP', None)
+    try:
+        progress = []
+        try:
+            output = youtube_download.download_video(None, f"{base_url}/clip.mp4", downloads,
+                                                     progress=progress.append)
+            report.check(os.path.getsize(output) == os.path.getsize(os.path.join(served, 'clip.mp4')),
+                         f"download: {os.path.basename(output)} differs from the served clip")
+            report.check(progress and progress[-1] == 1.0, f"download: progress ended at {progress[-1:]}")
+        except Exception as e:
+            report.check(False, f"download: {e}")
+
+        # Cancelled on its first progress report, on the session the first download left idle
+        cancel = threading.Event()
+        started = time.perf_counter()
+        try:
+            youtube_download.download_video(None, f"{base_url}/clip__slow.mp4", downloads,
+                                            progress=lambda value: cancel.set(), cancel=cancel)
+            report.check(False, "download: a cancelled download finished anyway")
+        except Exception as e:
+            report.check('cancelled' in str(e), f"download: cancelling failed with {e}")
+        report.check(time.perf_counter() - started < 5, "download: cancelling took longer than 5s")
+        report.check(not os.path.exists(os.path.join(downloads, 'clip__slow.mp4')),
+                     "download: a cancelled download left its output file")
+    finally:
+        if forced is not None:
+            os.environ['VIDEO_CHAPTER_TOOL_YTDLP'] = forced
+        server.shutdown()
+        server.server_close()
+    return 2
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Load test: generates a library of fake videos and chapter files and drives it through "
+                    "discovery, normalization, indexing, planning, the batch scheduler with its lease queue "
+                    "and watchdog retries, optional worker processes, the audit, in-process downloads from a "
+                    "local HTTP server (with the yt_dlp module) and (with a display) the GUI "
+                    "batch, using the fake_tools.py stand-ins instead of FFmpeg. Exits 1 on wrong results "
+                    "or when a time budget is exceeded.")
+    parser.add_argument('--files', type=int, default=10000, help="Videos in the generated library")
+    parser.add_argument('--fail', type=int, default=20, help="Videos whose FFmpeg run fails")
+    parser.add_argument('--hang', type=int, default=3, help="Videos whose FFmpeg run hangs every time")
+    parser.add_argument('--flaky', type=int, default=5, help="Videos whose first FFmpeg run hangs")
+    parser.add_argument('--latency', type=float, default=0.005, help="Seconds each fake tool run takes")
+    parser.add_argument('--stall-timeout', type=float, default=2.0, help="Watchdog stall timeout for the run")
+    parser.add_argument('--jobs', type=int, default=8, help="Concurrent batch jobs on the (single) volume")
+    parser.add_argument('--processes', type=int, default=0,
+                        help="Also run the batch with this many batch_worker processes on a second library")
+    parser.add_argument('--gui', action='store_true', help="Also run main_app's batch on a Tk window (needs a display)")
+    parser.add_argument('--max-seconds', type=float, default=None, help="Fail when the whole run takes longer")
+    parser.add_argument('--keep', metavar='FOLDER', help="Work in FOLDER and keep it (default: a temporary folder)")
+    parser.add_argument('--json', metavar='FILE', help="Also write the stage timings and problems as JSON")
+    args = parser.parse_args(argv)
+
+    work = os.path.abspath(args.keep) if args.keep else tempfile.mkdtemp(prefix="chapter_load_test_")
+    os.makedirs(work, exist_ok=True)
+    tools = fake_tools.install(os.path.join(work, 'bin'))
+    os.makedirs(os.path.join(work, 'state'), exist_ok=True)
+    # Everything the applications find or cache goes to the work folder, never the user's own setup
+    os.environ.update({
+        'VIDEO_CHAPTER_TOOL_BIN': os.path.join(work, 'bin'),
+        'VIDEO_CHAPTER_TOOL_CACHE': os.path.join(work, 'cache'),
+        'VIDEO_CHAPTER_TOOL_YTDLP': 'subprocess',
+        'FAKE_TOOLS_LATENCY': str(args.latency),
+        'FAKE_TOOLS_STATE': os.path.join(work, 'state'),
+    })
+    planted = {'fail': args.fail, 'hang': args.hang, 'flaky': args.flaky}
+    report = Report()
+    started = time.perf_counter()
+    print(f"Load test in {work} ({args.files:,} videos)", flush=True)
+    try:
+        library = os.path.join(work, 'library')
+        names, seconds = _timed(generate_library, library, args.files, planted)
+        report.stage('generate', len(names), seconds)
+
+        from library_scan import build_library, scan_directory
+        files, seconds = _timed(scan_directory, library)
+        entries = build_library(files)
+        report.stage('discover', len(entries), seconds, f"{sum(e.has_chapter_file for e in entries):,} with chapters")
+        report.check(len(entries) == args.files, f"discovery found {len(entries)} videos, expected {args.files}")
+
+        from chapter_normalize import CHANGED, normalize_tree
+        results, seconds = _timed(normalize_tree, library)
+        changed = sum(status == CHANGED for _, status, *_ in results)
+        report.stage('normalize', len(results), seconds, f"{changed:,} rewritten")
+        report.check(changed == len(results), f"normalize rewrote {changed} of {len(results)} messy chapter files")
+        results, seconds = _timed(normalize_tree, library)
+        report.stage('renormalize', len(results), seconds, "nothing should change")
+        report.check(not any(status == CHANGED for _, status, *_ in results), "a second normalize still changed files")
+        with open(os.path.join(library, NOTES_NAME), 'r', encoding='utf-8') as f:
+            report.check(f.read() == MESSY_CHAPTERS.format(a=1, b=2), f"normalize rewrote {NOTES_NAME}, which is no chapter file")
+
+        from chapter_index import ChapterIndex
+        index = ChapterIndex()
+        result, seconds = _timed(index.update_folder, library, scan_directory(library))
+        report.stage('index', result['read'], seconds)
+        hits, seconds = _timed(index.search, "part one", 100000)
+        report.stage('search', len(hits), seconds)
+        index.close()
+
+        (results, plan_seconds, batch_seconds, counts, watchdog), _ = _timed(
+            run_scheduler_batch, library, tools, args.jobs, args.stall_timeout)
+        report.stage('plan', len(results), plan_seconds, "parse, probe, validate")
+        report.stage('batch', len(results), batch_seconds,
+                     f"queue {counts}; {len(watchdog.stalls)} stalls killed, {watchdog.retries_left} retries left")
+        check_batch_results(report, names, results, "batch")
+        report.check(not counts.get('pending') and not counts.get('leased'), f"jobs left in the queue: {counts}")
+        report.check(len(watchdog.stalls) == args.flaky + args.hang,
+                     f"watchdog killed {len(watchdog.stalls)} runs, expected {args.flaky + args.hang}")
+
+        from library_audit import OK, audit_library
+        from probe_cache import ProbeCache
+        audit, seconds = _timed(audit_library, library, tools['ffprobe'], ProbeCache())
+        summary = audit['summary']
+        report.stage('audit', sum(summary.values()), seconds, json.dumps(summary))
+        succeeded = sum(status == "Success" for status in results.values())
+        report.check(summary.get(OK) == succeeded, f"audit found {summary.get(OK)} applied outputs, batch made {succeeded}")
+
+        downloads, seconds = _timed(run_download_stage, report, os.path.join(work, 'download'))
+        if downloads is None:
+            print("download     skipped (yt_dlp module not installed)", flush=True)
+        else:
+            report.stage('download', downloads, seconds, "local HTTP stand-in, in-process yt-dlp, one cancelled")
+
+        if args.processes:
+            second = os.path.join(work, 'library_workers')
+            second_names = generate_library(second, args.files, planted, seed=1)
+            (results, counts), seconds = _timed(run_worker_batch, second, tools, args.processes, args.stall_timeout)
+            report.stage('workers', len(results), seconds, f"{args.processes} processes; queue {counts}")
+            check_batch_results(report, second_names, results, "workers", lenient=('flaky',))
+
+        if args.gui:
+            third = os.path.join(work, 'library_gui')
+            # No hangs: the GUI watchdog waits minutes before it calls a run stalled
+            gui_names = generate_library(third, args.files, {'fail': args.fail}, seed=2)
+            gui = run_gui_batch(third, timeout=args.max_seconds or 3600)
+            if gui is None:
+                print("gui          skipped (no display)", flush=True)
+            else:
+                results, seconds, worst_lag = gui
+                report.stage('gui', len(results), seconds, f"worst UI stall {worst_lag * 1000:.0f} ms")
+                check_batch_results(report, gui_names, results, "gui")
+                report.check(worst_lag < 0.5, f"the Tk event loop was blocked for {worst_lag:.2f}s")
+
+        total = time.perf_counter() - started
+        print(f"{'total':<12} {'':>8} {total:>15.2f}s", flush=True)
+        if args.max_seconds is not None:
+            report.check(total <= args.max_seconds, f"run took {total:.0f}s, budget {args.max_seconds:.0f}s")
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as f:
+                json.dump({'files': args.files, 'seconds': round(total, 2), 'problems': report.problems,
+                           'stages': [{'stage': name, 'items': items, 'seconds': round(seconds, 3), 'note': note}
+                                      for name, items, seconds, note in report.stages]}, f, indent=2)
+    finally:
+        if not args.keep:
+            shutil.rmtree(work, ignore_errors=True)
+    print(f"{len(report.problems)} problem(s)" if report.problems else "All checks passed", flush=True)
+    return 1 if report.problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
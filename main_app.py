@@ -1,15 +1,32 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, scrolledtext
-import re
 import subprocess
 import os
 import threading
-from pathlib import Path
-import urllib.parse
-import json
 import time
 import sys
-import shutil # Added for shutil.which
+
+from chapter_timeline import ChapterTimeline, ms_to_hms
+from probe_cache import ProbeCache
+from chapter_index import ChapterIndex
+from library_scan import scan_directory, build_library
+from library_view import LibraryView
+from media_analysis import NUMPY_AVAILABLE, suggest_chapters
+from thumbnails import ThumbnailCache, ThumbnailLoader
+from thumbnail_view import ThumbnailStrip
+from chapter_sidecars import SIDECAR_FORMATS, write_folder_sidecars, write_sidecars
+from chapter_jobs import (JobFailed, apply_chapters_to_copy, batch_output_path, clone_with_chapters, queue_jobs,
+                          run_leased)
+from job_queue import DONE, LeaseQueue, queue_path, worker_id
+from metrics import MetricsFile
+from tool_paths import find_tool
+from process_watchdog import ProcessStalled, Watchdog, job_timeout, run_watched
+from youtube_download import download_video, in_process_available
+from batch_plan import ThroughputHistory, format_plan, measure_stages, plan_batch
+from batch_scheduler import BatchJob, BatchScheduler, ORDER_LARGE_FIRST, ORDER_SMALL_FIRST
+from chapter_media import check_concat_compatible, join_with_chapters, natural_sort_key, split_by_chapters
+
+BATCH_VIDEO_EXTENSIONS = ('.mp4', '.mkv', '.avi', '.mov')
 
 class VideoChapterTool:
     def __init__(self, root):
@@ -19,7 +36,7 @@ class VideoChapterTool:
         self.video_path = tk.StringVar()
         self.youtube_url = tk.StringVar()
         self.batch_folder = tk.StringVar()
-        self.chapters = []
+        self.chapters = ChapterTimeline()
         self.processing = False
         self.downloading = False
         self.batch_processing = False
@@ -27,7 +44,20 @@ class VideoChapterTool:
         
         # Initialize paths for executables
         self.ffmpeg_path = None
+        self.ffprobe_path = None
         self.yt_dlp_path = None
+        self.mkvpropedit_path = None
+        self.probe_cache = None
+        self.chapter_index = None
+        self.throughput_history = ThroughputHistory()
+        self.metrics_file = None
+        self.suggesting = False
+        self.thumbnail_loader = None
+        self.thumbnail_cancel = None
+        self.snap_to_keyframes = tk.BooleanVar(value=False)
+        self.batch_order = tk.StringVar(value="Smallest first")
+        self.batch_jobs_per_volume = tk.IntVar(value=2)
+        self.sidecar_formats = {fmt: tk.BooleanVar(value=(fmt != 'ffmetadata')) for fmt in SIDECAR_FORMATS}
 
         self.setup_ui()
         self.check_dependencies() # Call dependency check after UI setup
@@ -57,7 +87,9 @@ class VideoChapterTool:
         batch_buttons_frame = ttk.Frame(input_frame)
         batch_buttons_frame.grid(row=1, column=2, padx=5, pady=5, sticky="w")
         ttk.Button(batch_buttons_frame, text="Browse Folder", command=self.browse_batch_folder).pack(side=tk.LEFT, fill="x", expand=True, padx=(0, 2))
-        ttk.Button(batch_buttons_frame, text="Start Batch", command=self.start_batch_processing_thread).pack(side=tk.LEFT, fill="x", expand=True)
+        ttk.Button(batch_buttons_frame, text="Start Batch", command=self.start_batch_processing_thread).pack(side=tk.LEFT, fill="x", expand=True, padx=(0, 2))
+        ttk.Button(batch_buttons_frame, text="Split Batch", command=self.start_batch_split_thread).pack(side=tk.LEFT, fill="x", expand=True, padx=(0, 2))
+        ttk.Button(batch_buttons_frame, text="Join Batch", command=self.start_batch_join_thread).pack(side=tk.LEFT, fill="x", expand=True)
 
         # --- Row 2: YouTube URL and related buttons ---
         ttk.Label(input_frame, text="YouTube URL (Optional):").grid(row=2, column=0, padx=5, pady=5, sticky="w")
@@ -68,11 +100,36 @@ class VideoChapterTool:
         ttk.Button(youtube_buttons_frame, text="Download Video", command=self.start_youtube_download_thread).pack(side=tk.LEFT, fill="x", expand=True)
         # Removed the "Extract Chapters" button from here
 
+        # --- Optional panels share one notebook, so a new panel adds a tab instead of window height ---
+        panels = ttk.Notebook(self.root)
+        panels.pack(padx=10, pady=5, fill="both", expand=True)
+
+        # --- Batch Library (per-file status of the batch folder) ---
+        library_frame = ttk.Frame(panels)
+        panels.add(library_frame, text="Batch Library")
+        self.batch_library_view = LibraryView(
+            library_frame,
+            columns=(('name', 'Video', 380), ('chapter_file', 'Chapter File', 85), ('applied', 'Status', 260)),
+            describe=lambda entry: (entry.name, "Yes" if entry.has_chapter_file else "No", entry.applied_state),
+            rows=4)
+        self.batch_library_view.pack(padx=5, pady=5, fill="both", expand=True)
+
+        # Scheduling of batch remuxes: order by size, and how many may run at once on one volume
+        schedule_frame = ttk.Frame(library_frame)
+        schedule_frame.pack(padx=5, pady=(0, 5), fill="x")
+        ttk.Label(schedule_frame, text="Batch order:").pack(side=tk.LEFT)
+        ttk.Combobox(schedule_frame, textvariable=self.batch_order, values=("Smallest first", "Largest first"),
+                     state="readonly", width=14).pack(side=tk.LEFT, padx=(2, 10))
+        ttk.Label(schedule_frame, text="Max jobs per volume:").pack(side=tk.LEFT)
+        ttk.Spinbox(schedule_frame, from_=1, to=8, textvariable=self.batch_jobs_per_volume, width=4,
+                    state="readonly").pack(side=tk.LEFT, padx=2)
+        ttk.Button(schedule_frame, text="Plan Batch (dry run)", command=self.start_batch_plan_thread).pack(side=tk.RIGHT)
+
         # --- Chapter Input and Display ---
         chapter_frame = ttk.LabelFrame(self.root, text="Chapters Input/Editor")
         chapter_frame.pack(padx=10, pady=5, fill="both", expand=True)
 
-        self.chapter_text = scrolledtext.ScrolledText(chapter_frame, wrap=tk.WORD, width=80, height=15)
+        self.chapter_text = scrolledtext.ScrolledText(chapter_frame, wrap=tk.WORD, width=80, height=10)
         self.chapter_text.pack(padx=5, pady=5, fill="both", expand=True)
 
         # Frame for buttons below the text area
@@ -82,12 +139,16 @@ class VideoChapterTool:
         # Make the columns in the frame expand equally
         chapter_buttons_frame.grid_columnconfigure(0, weight=1)
         chapter_buttons_frame.grid_columnconfigure(1, weight=1)
+        chapter_buttons_frame.grid_columnconfigure(2, weight=1)
 
         parse_button = ttk.Button(chapter_buttons_frame, text="Parse Chapters from Text", command=self.parse_chapters_from_text_wrapper)
         parse_button.grid(row=0, column=0, padx=(0, 2), sticky='ew')
 
         launch_creator_button = ttk.Button(chapter_buttons_frame, text="Launch Batch Chapter File Creator", command=self.launch_chapter_creator)
-        launch_creator_button.grid(row=0, column=1, padx=(2, 0), sticky='ew')
+        launch_creator_button.grid(row=0, column=1, padx=2, sticky='ew')
+
+        suggest_button = ttk.Button(chapter_buttons_frame, text="Suggest Chapters from Video", command=self.start_suggest_chapters_thread)
+        suggest_button.grid(row=0, column=2, padx=(2, 0), sticky='ew')
 
         # --- Actions (Apply Chapters) ---
         action_frame = ttk.LabelFrame(self.root, text="Apply Chapters to Video")
@@ -95,7 +156,24 @@ class VideoChapterTool:
 
         ttk.Button(action_frame, text="Burn Chapters into Video (Overwrite)", command=self.start_burn_chapters_thread).pack(side=tk.LEFT, padx=5, pady=5)
         ttk.Button(action_frame, text="Create New Video with Chapters ('_chapters' suffix)", command=self.start_create_new_chapter_video_thread).pack(side=tk.LEFT, padx=5, pady=5)
+        ttk.Button(action_frame, text="Split by Chapters", command=self.start_split_video_thread).pack(side=tk.LEFT, padx=5, pady=5)
         ttk.Button(action_frame, text="Clear All Inputs & Log", command=self.clear_all).pack(side=tk.RIGHT, padx=5, pady=5)
+        ttk.Checkbutton(action_frame, text="Snap to keyframes", variable=self.snap_to_keyframes).pack(side=tk.RIGHT, padx=5, pady=5)
+
+        # --- Thumbnail per parsed chapter, to check the timestamps visually ---
+        thumbnails_frame = ttk.Frame(panels)
+        panels.add(thumbnails_frame, text="Chapter Thumbnails")
+        self.thumbnail_strip = ThumbnailStrip(thumbnails_frame)
+        self.thumbnail_strip.pack(padx=5, pady=5, fill='x')
+
+        # --- Sidecar output (chapter files next to the video; the media is never read or rewritten) ---
+        sidecar_frame = ttk.Frame(panels)
+        panels.add(sidecar_frame, text="Sidecar Files Only (video untouched)")
+
+        for fmt, (description, suffix, _) in SIDECAR_FORMATS.items():
+            ttk.Checkbutton(sidecar_frame, text=f"{description} ({suffix})", variable=self.sidecar_formats[fmt]).pack(side=tk.LEFT, padx=5, pady=5)
+        ttk.Button(sidecar_frame, text="Batch Folder", command=self.start_folder_sidecars_thread).pack(side=tk.RIGHT, padx=5, pady=5)
+        ttk.Button(sidecar_frame, text="Video", command=self.write_video_sidecars).pack(side=tk.RIGHT, padx=5, pady=5)
 
         # --- Status and Log ---
         status_frame = ttk.LabelFrame(self.root, text="Status / Log")
@@ -110,30 +188,11 @@ class VideoChapterTool:
 
     def _find_executable_path(self, base_name):
         """
-        Finds the full path to an executable, prioritizing PyInstaller's temp path,
-        then the script's directory, then system PATH.
+        Finds the full path to an executable: a VIDEO_CHAPTER_TOOL_<NAME>_PATH override,
+        the VIDEO_CHAPTER_TOOL_BIN folder, PyInstaller's temp path, the script's
+        directory, then system PATH (shared with the headless tools, see tool_paths.py).
         """
-        # 1. Check PyInstaller's temporary extraction path (when bundled)
-        if getattr(sys, 'frozen', False) and hasattr(sys, '_MEIPASS'):
-            temp_path = os.path.join(sys._MEIPASS, base_name)
-            temp_path_exe = os.path.join(sys._MEIPASS, base_name + ".exe") # For Windows
-            if sys.platform == "win32" and os.path.exists(temp_path_exe):
-                return temp_path_exe
-            elif os.path.exists(temp_path):
-                return temp_path
-
-        # 2. Check the script's original directory (for non-bundled runs or if user places it there)
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        local_path = os.path.join(script_dir, base_name)
-        local_path_exe = os.path.join(script_dir, base_name + ".exe")
-
-        if sys.platform == "win32" and os.path.exists(local_path_exe) and os.path.isfile(local_path_exe):
-            return local_path_exe
-        elif os.path.exists(local_path) and os.path.isfile(local_path):
-            return local_path
-        
-        # 3. Fallback to system PATH using shutil.which
-        return shutil.which(base_name)
+        return find_tool(base_name)
 
     def check_dependencies(self):
         """Checks if FFmpeg and yt-dlp are installed and on PATH or in the script directory."""
@@ -146,55 +205,60 @@ class VideoChapterTool:
         else:
             self.log_message("WARNING: FFmpeg not found. Please place 'ffmpeg' (or 'ffmpeg.exe') in the script folder or ensure it's on your system's PATH.")
 
+        # Check FFprobe (used for durations; results are cached and shared with the chapter creator)
+        self.ffprobe_path = self._find_executable_path('ffprobe')
+        if self.ffprobe_path:
+            self.log_message(f"FFprobe found at: {self.ffprobe_path}")
+        else:
+            self.log_message("WARNING: FFprobe not found. The last chapter will end 1 second after it starts and chapters cannot be checked against the video length.")
+
+        try:
+            self.probe_cache = ProbeCache()
+            self.log_message(f"Probe cache: {self.probe_cache.db_path}")
+        except Exception as e:
+            self.log_message(f"WARNING: Probe cache unavailable ({e}). Video durations will not be cached.")
+
+        try:
+            self.chapter_index = ChapterIndex()
+        except Exception as e:
+            self.log_message(f"WARNING: Chapter index unavailable ({e}). Batch folders will not be added to the chapter search.")
+
+        # Optional: VIDEO_CHAPTER_TOOL_METRICS=<file> keeps job metrics in a textfile for dashboards
+        metrics_path = os.environ.get('VIDEO_CHAPTER_TOOL_METRICS')
+        if metrics_path:
+            self.metrics_file = MetricsFile(metrics_path).start()
+            self.log_message(f"Writing metrics to: {metrics_path}")
+
+        try:
+            thumbnail_cache = ThumbnailCache()
+        except Exception as e:
+            thumbnail_cache = None
+            self.log_message(f"WARNING: Thumbnail cache unavailable ({e}). Thumbnails will be grabbed every time.")
+        self.thumbnail_loader = ThumbnailLoader(thumbnail_cache)
+
         # Check yt-dlp
         self.yt_dlp_path = self._find_executable_path('yt-dlp')
-        if self.yt_dlp_path:
+        if in_process_available():
+            self.log_message("yt-dlp Python module found: downloads run in-process on a reused session.")
+        elif self.yt_dlp_path:
             self.log_message(f"yt-dlp found at: {self.yt_dlp_path}")
         else:
             self.log_message("WARNING: yt-dlp not found. Please place 'yt-dlp' (or 'yt-dlp.exe') in the script folder or ensure it's on your system's PATH.")
 
+        # Optional: MKVToolNix lets "create new" on .mkv files clone the video and patch only its headers
+        self.mkvpropedit_path = self._find_executable_path('mkvpropedit')
+        if self.mkvpropedit_path:
+            self.log_message(f"mkvpropedit found at: {self.mkvpropedit_path} (fast copy-on-write outputs for MKV)")
+
         self.log_message("Dependency check complete.")
 
 
     def parse_chapters_from_text(self, comment_text):
-        """Parse chapters from comment text"""
-        chapters = []
-        lines = [line.strip() for line in comment_text.split('\n') if line.strip()]
-
-        # Changed regex to explicitly capture H:M:S for better parsing
-        # It handles optional hours.
-        pattern1 = re.compile(r'^(?:(\d{1,2}):)?(\d{1,2}):(\d{2})\s*[-:]?\s*(.+?)$')  # HH:MM:SS or MM:SS followed by title
-        pattern2 = re.compile(r'^(.+?)\s*[-:]?\s*(?:(\d{1,2}):)?(\d{1,2}):(\d{2})$')  # Title followed by HH:MM:SS or MM:SS
-
-        for line in lines:
-            match = pattern1.match(line)
-            if match:
-                # If group 1 (hours) exists, use it, otherwise 0
-                hours = int(match.group(1)) if match.group(1) else 0
-                minutes = int(match.group(2))
-                seconds = int(match.group(3))
-                title = match.group(4).strip()
-                
-                # Convert to HH:MM:SS format consistently for storage
-                time_str = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
-                chapters.append((time_str, title))
-                continue
-
-            match = pattern2.match(line)
-            if match:
-                title = match.group(1).strip()
-                hours = int(match.group(2)) if match.group(2) else 0
-                minutes = int(match.group(3))
-                seconds = int(match.group(4))
-                
-                time_str = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
-                chapters.append((time_str, title))
-                continue
-            
-            self.log_message(f"Warning: Could not parse chapter from line: '{line}'")
-
-
-        return chapters
+        """Parse chapters from comment text into a ChapterTimeline (integer milliseconds).
+           Accepts HH:MM:SS, MM:SS and the chapter creator's HH:MM:SS:FF, before or after the title."""
+        return ChapterTimeline.parse(
+            comment_text,
+            on_unparsed=lambda line: self.log_message(f"Warning: Could not parse chapter from line: '{line}'"))
 
     def browse_video(self):
         file_path = filedialog.askopenfilename(
@@ -204,9 +268,10 @@ class VideoChapterTool:
         if file_path:
             self.video_path.set(file_path)
             self.log_message(f"Selected video: {file_path}")
+            self._refresh_thumbnails()
 
     def start_youtube_download_thread(self):
-        if self.yt_dlp_path is None:
+        if self.yt_dlp_path is None and not in_process_available():
             messagebox.showerror("Error", "yt-dlp executable not found. Please place it in the script folder or ensure it's on your system's PATH. Check the log for details.")
             return
 
@@ -224,105 +289,175 @@ class VideoChapterTool:
 
     def _download_youtube_video(self, url):
         try:
-            # First, get video title to use as filename
-            info_command = [self.yt_dlp_path, '--get-title', url]
-            title_process = subprocess.Popen(info_command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, encoding='utf-8')
-            title_output, title_error = title_process.communicate()
-
-            if title_process.returncode != 0:
-                self.log_message(f"Error getting video title: {title_error.strip()}")
-                return
-
-            video_title = title_output.strip()
-            # Sanitize filename
-            sanitized_title = re.sub(r'[\\/:*?"<>|]', '', video_title)
-            output_template = f"{sanitized_title}.%(ext)s"
-
-            self.log_message(f"Downloading YouTube video '{video_title}' to '{output_template}'...")
-
-            command = [self.yt_dlp_path, '-f', 'bestvideo+bestaudio/best', '--merge-output-format', 'mp4', url, '-o', output_template]
-            
-            process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-            for line in iter(process.stdout.readline, ''):
-                self.log_message(f"Download: {line.strip()}")
-                self.root.update_idletasks()
-            
-            stderr_output = process.stderr.read()
-            if stderr_output:
-                self.log_message(f"Download Error: {stderr_output.strip()}")
-            
-            process.wait()
-
-            if process.returncode == 0:
-                # Find the downloaded file based on the sanitized title and common extensions
-                downloaded_file = None
-                for ext in ['mp4', 'mkv', 'webm', 'flv', 'avi']: # Common extensions
-                    potential_path = f"{sanitized_title}.{ext}"
-                    if os.path.exists(potential_path):
-                        downloaded_file = os.path.abspath(potential_path)
-                        break
-
-                if downloaded_file:
-                    self.video_path.set(downloaded_file)
-                    self.log_message(f"YouTube video downloaded successfully to: {downloaded_file}")
-                else:
-                    self.log_message("Error: Downloaded video file not found after successful download command (check expected filename).")
-            else:
-                self.log_message(f"YouTube download failed with exit code {process.returncode}")
-                self.log_message(f"stderr: {stderr_output}")
-
+            downloaded_file = download_video(
+                self.yt_dlp_path, url, log=self._log_from_thread,
+                progress=lambda fraction: self.root.after(0, lambda: self.progress_bar.config(value=fraction * 100)))
+            self.root.after(0, self.video_path.set, downloaded_file)
+            self._log_from_thread(f"YouTube video downloaded successfully to: {downloaded_file}")
         except Exception as e:
-            self.log_message(f"An error occurred during YouTube download: {e}")
+            self._log_from_thread(f"An error occurred during YouTube download: {e}")
         finally:
             self.downloading = False
-            self.progress_bar.stop()
+            self.root.after(0, self.progress_bar.stop)
+            self.root.after(0, lambda: self.progress_bar.config(value=0))
 
     def parse_chapters_from_text_wrapper(self):
         comment_text = self.chapter_text.get("1.0", tk.END)
         self.chapters = self.parse_chapters_from_text(comment_text)
         self.log_message(f"Parsed {len(self.chapters)} chapters.")
         self.chapter_text.delete("1.0", tk.END)
-        for time_str, title in self.chapters: # Using time_str for consistency with parsing logic
-            self.chapter_text.insert(tk.END, f"{time_str} {title}\n")
-
-    def _generate_ffmpeg_chapters_metadata(self, chapters):
-        metadata_content = [
-            ";FFMETADATA1",
-            "; This section can be used for global metadata, like video title."
-            # "title=My Video Title"
-        ]
+        if self.chapters:
+            self.chapter_text.insert(tk.END, self.chapters.to_hms_text() + "\n")
+        self._refresh_thumbnails()
+
+    def _refresh_thumbnails(self):
+        """Shows a thumbnail for each parsed chapter of the selected video, grabbing missing ones in parallel."""
+        if self.thumbnail_cancel is not None:
+            self.thumbnail_cancel.set()
+            self.thumbnail_cancel = None
+        video_file = self.video_path.get()
+        if not video_file or not os.path.exists(video_file):
+            self.thumbnail_strip.clear()
+            return
+        missing = self.thumbnail_strip.set_chapters([(start, title) for start, _, title in self.chapters], video_file)
+        if missing and self.ffmpeg_path is not None and self.thumbnail_loader is not None:
+            self.thumbnail_cancel = self.thumbnail_loader.request(
+                self.ffmpeg_path, video_file, missing,
+                lambda ms, data: self.root.after(0, self._on_thumbnail_ready, video_file, ms, data))
+
+    def _on_thumbnail_ready(self, video_file, ms, data):
+        if self.thumbnail_strip.source == video_file:
+            self.thumbnail_strip.set_image(ms, data)
+
+    def start_suggest_chapters_thread(self):
+        if self.suggesting:
+            messagebox.showinfo("Info", "Chapter suggestions are already being computed.")
+            return
+        video_file = self.video_path.get()
+        if not video_file or not os.path.exists(video_file):
+            messagebox.showerror("Error", "Please select a valid video file.")
+            return
+        if self.ffmpeg_path is None or not NUMPY_AVAILABLE:
+            messagebox.showerror("Error", "Chapter suggestions need FFmpeg and NumPy (pip install numpy).")
+            return
+        self.suggesting = True
+        self.log_message(f"Analysing {os.path.basename(video_file)} for scene changes and pauses...")
+        threading.Thread(target=self._suggest_chapters, args=(video_file,), daemon=True).start()
 
-        # Process chapters to include START and calculated END times
-        processed_chapters = []
-        for i, (start_time_str, title) in enumerate(chapters):
-            h, m, s = map(int, start_time_str.split(':'))
-            start_ms = (h * 3600 + m * 60 + s) * 1000
+    def _suggest_chapters(self, video_file):
+        """Streams the video through the analysis engine and appends the suggestions to the chapter editor."""
+        try:
+            record = self._probe_video(video_file)
+            duration_ms = record.get('duration_ms') if record else None
+            if not duration_ms:
+                raise Exception("Could not determine the video duration (FFprobe is required).")
             
-            processed_chapters.append({
-                'start_ms': start_ms,
-                'title': title,
-            })
+            def report_progress(fraction):
+                self.root.after(0, lambda: self.progress_bar.config(value=fraction * 100))
             
-        # Calculate END times based on the next chapter's start time
-        for i in range(len(processed_chapters)):
-            # If not the last chapter, end_ms is the start_ms of the next chapter
-            if i < len(processed_chapters) - 1:
-                processed_chapters[i]['end_ms'] = processed_chapters[i+1]['start_ms']
+            suggestions = suggest_chapters(video_file, self.ffmpeg_path, duration_ms, progress=report_progress)
+            self.root.after(0, self._show_suggestions, suggestions)
+        except Exception as e:
+            error_msg = f"Error suggesting chapters: {e}"
+            self.root.after(0, lambda: self.log_message(error_msg))
+        finally:
+            self.suggesting = False
+            self.root.after(0, lambda: self.progress_bar.config(value=0))
+
+    def _show_suggestions(self, suggestions):
+        if not suggestions:
+            self.log_message("No chapter suggestions found for this video.")
+            return
+        lines = "\n".join(f"{ms_to_hms(start_ms)} {reason}" for start_ms, reason in suggestions)
+        current_content = self.chapter_text.get("1.0", tk.END).strip()
+        if not current_content:
+            lines = "00:00:00 Intro\n" + lines
+        self.chapter_text.insert(tk.END, f"\n{lines}\n" if current_content else f"{lines}\n")
+        self.log_message(f"Added {len(suggestions)} suggested chapter(s). Rename them, then parse and apply.")
+
+    def _generate_ffmpeg_chapters_metadata(self, chapters):
+        """Serializes a ChapterTimeline as FFMETADATA; START/END come straight from its millisecond arrays."""
+        return chapters.to_ffmetadata()
+
+    def _probe_video(self, video_path, stat=None):
+        """Returns the cached probe record for a video, running ffprobe only on a cache miss."""
+        if self.probe_cache is None or self.ffprobe_path is None:
+            return None
+        record = self.probe_cache.get(video_path, stat) if stat is not None else None
+        if record is None:
+            record = self.probe_cache.probe(video_path, self.ffprobe_path)
+        return record
+
+    def _fit_chapters_to_video(self, video_path, chapters, record=None, log=None):
+        """Ends the last chapter at the video's real duration and checks every chapter fits inside it.
+           Returns a list of problems; an empty list means the chapters can be applied. Without a
+           record this may run ffprobe, so call it off the Tk thread."""
+        log = log or self.log_message
+        if record is None:
+            try:
+                record = self._probe_video(video_path)
+            except Exception as e:
+                log(f"Warning: Could not probe {os.path.basename(video_path)} for its duration: {e}")
+        duration_ms = record.get('duration_ms') if record else None
+        if duration_ms is None:
+            return []
+        chapters.set_duration(duration_ms)
+        return chapters.validate()
+
+    def _check_then(self, video_file, proceed):
+        """Calls proceed() on the Tk thread once self.chapters are checked against the video and, if
+           enabled, snapped to keyframes; shows an error instead if they don't fit. Both run on a
+           worker thread: on a cache miss the probe runs ffprobe and the keyframe index reads the whole file."""
+        self.processing = True # Nothing else starts while the video is checked
+        chapters = self.chapters
+        snap = self.snap_to_keyframes.get()
+
+        def check_thread():
+            problems = self._fit_chapters_to_video(video_file, chapters, log=self._log_from_thread)
+            if not problems and snap:
+                self._log_from_thread(f"Snapping chapters to the keyframes of {os.path.basename(video_file)}...")
+                checked = self._snap_chapters_to_keyframes(video_file, chapters, log=self._log_from_thread)
             else:
-                # For the last chapter, set a reasonable default end time
-                # A common practice is start_ms + 1000 (1 second), or total video duration
-                # For now, let's use a small duration to just mark the point.
-                processed_chapters[i]['end_ms'] = processed_chapters[i]['start_ms'] + 1000 # 1 second after start
-        
-        for chapter_data in processed_chapters:
-            metadata_content.extend([
-                "[CHAPTER]",
-                "TIMEBASE=1/1000", # Define TIMEBASE explicitly for each chapter block
-                f"START={chapter_data['start_ms']}",
-                f"END={chapter_data['end_ms']}",
-                f"title={chapter_data['title']}"
-            ])
-        return "\n".join(metadata_content)
+                checked = chapters
+
+            def done():
+                self.processing = False
+                if problems:
+                    for problem in problems:
+                        self.log_message(f"Error: {problem}")
+                    messagebox.showerror("Error", "Chapters do not fit the video:\n\n" + "\n".join(problems[:10]))
+                    return
+                self.chapters = checked
+                proceed()
+            self.root.after(0, done)
+
+        threading.Thread(target=check_thread, daemon=True).start()
+
+    def _keyframe_index(self, video_path, stat=None, log=None):
+        """Returns the cached keyframe index of a video (built from packet flags on first use), or None
+           if it cannot be built. Call it off the Tk thread."""
+        log = log or self.log_message
+        if self.probe_cache is None or self.ffprobe_path is None:
+            return None
+        try:
+            return self.probe_cache.keyframes(video_path, self.ffprobe_path, stat=stat)
+        except Exception as e:
+            log(f"Warning: Could not index keyframes of {os.path.basename(video_path)}: {e}")
+            return None
+
+    def _snap_chapters_to_keyframes(self, video_path, chapters, stat=None, log=None):
+        """Moves chapter starts onto nearby keyframes using the cached keyframe index.
+           Returns the chapters unchanged if the index cannot be built. Call it off the Tk thread."""
+        log = log or self.log_message
+        if self.probe_cache is None or self.ffprobe_path is None:
+            log("Warning: Snapping to keyframes needs FFprobe and the probe cache. Chapters left as typed.")
+            return chapters
+        keyframes = self._keyframe_index(video_path, stat, log)
+        if keyframes is None:
+            return chapters
+        snapped, moved = chapters.snap_to_keyframes(keyframes)
+        log(f"Snapped {moved} of {len(chapters)} chapter start(s) to keyframes ({len(keyframes)} keyframes indexed).")
+        return snapped
     
     def _clean_existing_chapter_files(self, video_path):
         """
@@ -366,15 +501,18 @@ class VideoChapterTool:
             output_video_path
         ]
 
-        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-        # It's generally good practice to read stdout/stderr even if not logging every line
-        stdout_output, stderr_output = process.communicate()
+        try:
+            returncode, stdout_output, stderr_output = run_watched(
+                command, output_video_path, job_timeout(os.path.getsize(input_video_path)), stage='strip')
+        except ProcessStalled as e:
+            self.log_message(f"FFmpeg stalled while stripping metadata and was killed: {e.reason}")
+            return False
         
-        if process.returncode == 0:
+        if returncode == 0:
             self.log_message(f"Metadata stripped successfully. Output to: {os.path.basename(output_video_path)}")
             return True
         else:
-            self.log_message(f"Failed to strip metadata from {os.path.basename(input_video_path)} with exit code {process.returncode}")
+            self.log_message(f"Failed to strip metadata from {os.path.basename(input_video_path)} with exit code {returncode}")
             self.log_message(f"FFmpeg stdout (strip): {stdout_output.strip()}")
             self.log_message(f"FFmpeg stderr (strip): {stderr_output.strip()}")
             return False
@@ -396,6 +534,9 @@ class VideoChapterTool:
             self.log_message("Already processing a video. Please wait.")
             return
 
+        self._check_then(video_file, lambda: self._burn_chapters(video_file))
+
+    def _burn_chapters(self, video_file):
         self.processing = True
         self.log_message(f"Starting to burn chapters into (overwrite): {video_file}")
         
@@ -403,6 +544,7 @@ class VideoChapterTool:
         base, ext = os.path.splitext(video_file)
         temp_stripped_video = f"{base}_stripped{ext}" # Video with all metadata stripped
         final_temp_output = f"{base}.temp{ext}"       # Final temporary output with new chapters
+        metadata_file = "chapters_metadata.txt"
 
         try:
             # Step 1: Strip all existing metadata from the input video
@@ -412,7 +554,6 @@ class VideoChapterTool:
                 return
 
             # Step 2: Create the temporary FFmpeg metadata file
-            metadata_file = "chapters_metadata.txt"
             with open(metadata_file, "w", encoding="utf-8") as f:
                 f.write(self._generate_ffmpeg_chapters_metadata(self.chapters))
             
@@ -430,15 +571,15 @@ class VideoChapterTool:
             
             self.log_message(f"FFmpeg command (burn chapters): {' '.join(command)}")
 
-            process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-            # It's generally good practice to read stdout/stderr even if not logging every line
-            stdout_output, stderr_output = process.communicate() # Changed to communicate to get all output at once
+            # The watchdog kills ffmpeg if the output stops growing (e.g. a stale network share)
+            returncode, stdout_output, stderr_output = run_watched(
+                command, final_temp_output, job_timeout(os.path.getsize(temp_stripped_video)), stage='mux')
             
-            if process.returncode == 0:
+            if returncode == 0:
                 os.replace(final_temp_output, video_file) # Overwrite original with the new final temp
                 self.log_message(f"Chapters burned successfully into: {video_file}")
             else:
-                self.log_message(f"Burning chapters failed with exit code {process.returncode}")
+                self.log_message(f"Burning chapters failed with exit code {returncode}")
                 self.log_message(f"FFmpeg stdout (burn): {stdout_output.strip()}")
                 self.log_message(f"FFmpeg stderr (burn): {stderr_output.strip()}")
 
@@ -473,6 +614,9 @@ class VideoChapterTool:
             self.log_message("Already processing a video. Please wait.")
             return
 
+        self._check_then(video_file, lambda: self._create_new_chapter_video(video_file))
+
+    def _create_new_chapter_video(self, video_file):
         self.processing = True
         self.log_message(f"Starting to create new video with chapters from: {video_file}")
         
@@ -480,8 +624,17 @@ class VideoChapterTool:
         base, ext = os.path.splitext(video_file)
         temp_stripped_video = f"{base}_stripped{ext}" # Video with all metadata stripped
         output_file = f"{base}_chapters{ext}"       # Final new output file with new chapters
+        metadata_file = "chapters_metadata.txt"
 
         try:
+            # MKV on a volume with reflinks: clone the file and patch only the chapters in its headers
+            if self.mkvpropedit_path and ext.lower() == '.mkv':
+                method = clone_with_chapters(self.mkvpropedit_path, video_file, self.chapters, output_file,
+                                             log=self.log_message)
+                if method:
+                    self.log_message(f"New video with chapters created as a {method} copy (no remux): {output_file}")
+                    return
+
             # Step 1: Strip all existing metadata from the input video
             # (This will create temp_stripped_video)
             if not self._strip_all_metadata_from_video(video_file, temp_stripped_video):
@@ -489,7 +642,6 @@ class VideoChapterTool:
                 return
 
             # Step 2: Create the temporary FFmpeg metadata file
-            metadata_file = "chapters_metadata.txt"
             with open(metadata_file, "w", encoding="utf-8") as f:
                 f.write(self._generate_ffmpeg_chapters_metadata(self.chapters))
 
@@ -507,14 +659,14 @@ class VideoChapterTool:
             
             self.log_message(f"FFmpeg command (create new with chapters): {' '.join(command)}")
 
-            process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-            # It's generally good practice to read stdout/stderr even if not logging every line
-            stdout_output, stderr_output = process.communicate() # Changed to communicate to get all output at once
+            # The watchdog kills ffmpeg if the output stops growing (e.g. a stale network share)
+            returncode, stdout_output, stderr_output = run_watched(
+                command, output_file, job_timeout(os.path.getsize(temp_stripped_video)), stage='mux')
 
-            if process.returncode == 0:
+            if returncode == 0:
                 self.log_message(f"New video with chapters created successfully: {output_file}")
             else:
-                self.log_message(f"Creating new video with chapters failed with exit code {process.returncode}")
+                self.log_message(f"Creating new video with chapters failed with exit code {returncode}")
                 self.log_message(f"FFmpeg stdout (create): {stdout_output.strip()}")
                 self.log_message(f"FFmpeg stderr (create): {stderr_output.strip()}")
 
@@ -530,13 +682,166 @@ class VideoChapterTool:
                 os.remove(temp_stripped_video)
 
 
+    def start_split_video_thread(self):
+        if self.ffmpeg_path is None:
+            messagebox.showerror("Error", "FFmpeg executable not found. Please place it in the script folder or ensure it's on your system's PATH. Check the log for details.")
+            return
+
+        video_file = self.video_path.get().strip()
+        if not video_file or not os.path.exists(video_file):
+            messagebox.showerror("Error", "Please select a valid video file.")
+            return
+        if not self.chapters:
+            messagebox.showerror("Error", "No chapters parsed. Please enter or extract chapters first.")
+            return
+        
+        if self.processing:
+            self.log_message("Already processing a video. Please wait.")
+            return
+
+        self._check_then(video_file, lambda: self._start_split_video(video_file))
+
+    def _start_split_video(self, video_file):
+        self.processing = True
+        self.log_message(f"Splitting {os.path.basename(video_file)} into {len(self.chapters)} chapter file(s)...")
+        threading.Thread(target=self._split_video, args=(video_file, self.chapters), daemon=True).start()
+
+    def _split_video(self, video_file, chapters):
+        try:
+            outputs = split_by_chapters(self.ffmpeg_path, video_file, chapters,
+                                        keyframes=self._keyframe_index(video_file, log=self._log_from_thread),
+                                        log=self._log_from_thread)
+            for output in outputs:
+                self.log_message(f"Wrote chapter file: {output}")
+            if len(outputs) < len(chapters):
+                self.log_message(f"Warning: Only {len(outputs)} of {len(chapters)} chapters produced a file (see above).")
+            self.log_message(f"Split complete: {len(outputs)} file(s) written.")
+        except Exception as e:
+            self.log_message(f"Splitting {os.path.basename(video_file)} failed: {e}")
+        finally:
+            self.processing = False
+
+    def start_batch_split_thread(self):
+        batch_folder = self.batch_folder.get().strip()
+        if not batch_folder or not os.path.isdir(batch_folder):
+            messagebox.showerror("Error", "Please select a valid batch folder.")
+            return
+        if self.batch_processing:
+            self.log_message("Batch processing is already running. Please wait.")
+            return
+        if self.ffmpeg_path is None:
+            messagebox.showerror("Error", "FFmpeg executable not found. FFmpeg is required to split videos. Please place it in the script folder or ensure it's on your system's PATH.")
+            return
+
+        self.batch_processing = True
+        self.batch_results = []
+        self.log_message(f"Splitting every video with a chapter file in: {batch_folder}")
+        threading.Thread(target=self._run_batch_split, args=(batch_folder,), daemon=True).start()
+
+    def _run_batch_split(self, folder_path):
+        try:
+            entries = build_library(scan_directory(folder_path), BATCH_VIDEO_EXTENSIONS)
+            self.root.after(0, self.batch_library_view.set_entries, entries)
+            batch_plans = self._plan_batch_chapters(folder_path, entries)
+            for i, entry in enumerate(entries):
+                self.root.after(0, self.batch_library_view.set_current, i)
+                plan = batch_plans[i]
+                if isinstance(plan, str):
+                    self._record_batch_result(entries, i, plan)
+                    continue
+                try:
+                    video_path = os.path.join(folder_path, entry.name)
+                    keyframes = self._keyframe_index(video_path, (entry.size, entry.mtime_ns), self._log_from_thread)
+                    outputs = split_by_chapters(self.ffmpeg_path, video_path, plan, keyframes=keyframes,
+                                                log=lambda message, name=entry.name: self._log_from_thread(f"{name}: {message}"))
+                    self.log_message(f"Split {entry.name} into {len(outputs)} file(s).")
+                    self._record_batch_result(entries, i, f"Split ({len(outputs)} files)")
+                except Exception as e:
+                    self.log_message(f"Splitting {entry.name} failed: {e}")
+                    self._record_batch_result(entries, i, f"Failed: {str(e)[:100]}")
+                self.root.after(0, lambda value=(i + 1) / len(entries) * 100: self.progress_bar.config(value=value))
+        except Exception as e:
+            self.log_message(f"Could not split batch folder: {e}")
+        finally:
+            self.log_message("\nBatch split complete.")
+            for item, status in self.batch_results:
+                self.log_message(f"- {item}: {status}")
+            self.batch_processing = False
+            self.root.after(0, lambda: self.progress_bar.config(value=0))
+
+    def start_batch_join_thread(self):
+        batch_folder = self.batch_folder.get().strip()
+        if not batch_folder or not os.path.isdir(batch_folder):
+            messagebox.showerror("Error", "Please select a valid batch folder.")
+            return
+        if self.batch_processing:
+            self.log_message("Batch processing is already running. Please wait.")
+            return
+        if self.ffmpeg_path is None or self.ffprobe_path is None:
+            messagebox.showerror("Error", "FFmpeg and FFprobe are required to join videos (clip durations and stream parameters come from FFprobe).")
+            return
+
+        self.batch_processing = True
+        self.log_message(f"Joining the videos in {batch_folder} into one chaptered video...")
+        threading.Thread(target=self._run_batch_join, args=(batch_folder,), daemon=True).start()
+
+    def _run_batch_join(self, folder_path):
+        """Joins every batch video (in natural name order) into one file with a chapter per clip."""
+        try:
+            files = scan_directory(folder_path)
+            # The joined file is written into the same folder, so never take a previous one as a clip
+            entries = [entry for entry in build_library(files, BATCH_VIDEO_EXTENSIONS)
+                       if not os.path.splitext(entry.name)[0].endswith('_joined')]
+            entries.sort(key=lambda entry: natural_sort_key(entry.name))
+            if len(entries) < 2:
+                self.log_message("Join needs at least two videos in the batch folder.")
+                return
+            self.root.after(0, self.batch_library_view.set_entries, entries)
+
+            # Durations and stream parameters come from the probe cache; only uncached clips are probed
+            paths = {os.path.join(folder_path, entry.name): (entry.size, entry.mtime_ns) for entry in entries}
+            records = self.probe_cache.get_many(paths) if self.probe_cache is not None else {}
+            clips = []
+            for path, stat in paths.items():
+                record = records.get(path) or self._probe_video(path, stat)
+                if not record or not record.get('duration_ms'):
+                    self.log_message(f"Join aborted: the duration of {os.path.basename(path)} is unknown.")
+                    return
+                clips.append((path, record))
+
+            # Fail before copying anything if the clips cannot be stream-copied one after another
+            problems = check_concat_compatible([(os.path.basename(path), record) for path, record in clips])
+            if problems:
+                self.log_message("Join aborted: the clips have different stream parameters:")
+                for problem in problems:
+                    self.log_message(f"- {problem}")
+                return
+
+            ext = os.path.splitext(entries[0].name)[1]
+            output_file = os.path.join(folder_path, f"{os.path.basename(os.path.normpath(folder_path))}_joined{ext}")
+            self.log_message(f"Joining {len(clips)} clips into {os.path.basename(output_file)} (stream copy)...")
+            timeline = join_with_chapters(
+                self.ffmpeg_path,
+                [(path, record['duration_ms'], os.path.splitext(os.path.basename(path))[0]) for path, record in clips],
+                output_file)
+            for index in range(len(entries)):
+                entries[index].last_result = "Joined"
+            self.root.after(0, self.batch_library_view.refresh)
+            self.log_message(f"Joined video written: {output_file}")
+            self.log_message(timeline.to_hms_text())
+        except Exception as e:
+            self.log_message(f"Join failed: {e}")
+        finally:
+            self.batch_processing = False
+
     def clear_all(self):
         self.log_message("Clearing all inputs and log...")
         self.video_path.set("")
         self.youtube_url.set("")
         self.batch_folder.set("")
         self.chapter_text.delete("1.0", tk.END)
-        self.chapters = []
+        self.chapters = ChapterTimeline()
+        self._refresh_thumbnails()
         self.clear_log()
         self.progress_bar.stop()
         self.processing = False
@@ -550,6 +855,85 @@ class VideoChapterTool:
         if folder_path:
             self.batch_folder.set(folder_path)
             self.log_message(f"Selected batch folder: {folder_path}")
+            threading.Thread(target=self._scan_batch_library, args=(folder_path,), daemon=True).start()
+
+    def _scan_batch_library(self, folder_path):
+        """Scans the batch folder once and shows every video with its chapter status."""
+        try:
+            entries = build_library(scan_directory(folder_path), BATCH_VIDEO_EXTENSIONS)
+        except Exception as e:
+            self.log_message(f"Could not scan batch folder: {e}")
+            return
+        self.root.after(0, self.batch_library_view.set_entries, entries)
+        self.log_message(f"Batch folder contains {len(entries)} videos ({sum(1 for e in entries if e.has_chapter_file)} with chapter files).")
+
+    def _record_batch_result(self, entries, index, status):
+        """Adds a batch result to the report and to the video's row in the library view."""
+        self.batch_results.append((entries[index].name, status))
+        entries[index].last_result = status
+        self.root.after(0, self.batch_library_view.refresh_entry, index)
+
+    def _selected_sidecar_formats(self):
+        formats = [fmt for fmt, selected in self.sidecar_formats.items() if selected.get()]
+        if not formats:
+            messagebox.showerror("Error", "Select at least one sidecar format.")
+        return formats
+
+    def write_video_sidecars(self):
+        """Writes the parsed chapters next to the selected video as sidecar files, without remuxing it."""
+        video_file = self.video_path.get()
+        if not video_file or not os.path.exists(video_file):
+            messagebox.showerror("Error", "Please select a valid video file.")
+            return
+        if not self.chapters:
+            messagebox.showerror("Error", "No chapters parsed. Please parse chapters first.")
+            return
+        formats = self._selected_sidecar_formats()
+        if not formats:
+            return
+        # Only an already cached duration is used for the last chapter's end; the video is not probed
+        record = None
+        if self.probe_cache is not None:
+            try:
+                record = self.probe_cache.get(video_file)
+            except Exception:
+                record = None
+        if record and record.get('duration_ms') is not None:
+            self.chapters.set_duration(record['duration_ms'])
+        try:
+            paths = write_sidecars(video_file, self.chapters, formats)
+        except Exception as e:
+            self.log_message(f"Error writing sidecar files: {e}")
+            messagebox.showerror("Error", f"Could not write sidecar files:\n{e}")
+            return
+        for path in paths:
+            self.log_message(f"Wrote sidecar: {os.path.basename(path)}")
+        messagebox.showinfo("Success", f"Wrote {len(paths)} sidecar file(s) next to {os.path.basename(video_file)}.")
+
+    def start_folder_sidecars_thread(self):
+        batch_folder = self.batch_folder.get().strip()
+        if not batch_folder or not os.path.isdir(batch_folder):
+            messagebox.showerror("Error", "Please select a valid batch folder.")
+            return
+        formats = self._selected_sidecar_formats()
+        if not formats:
+            return
+        self.log_message(f"Writing chapter sidecars for every video with a chapter file in: {batch_folder}")
+        threading.Thread(target=self._write_folder_sidecars, args=(batch_folder, formats), daemon=True).start()
+
+    def _write_folder_sidecars(self, folder_path, formats):
+        start_time = time.time()
+        try:
+            summary = write_folder_sidecars(folder_path, formats, self.probe_cache, BATCH_VIDEO_EXTENSIONS,
+                                            log=lambda message: self.root.after(0, self.log_message, message))
+        except Exception as e:
+            error_msg = f"Error writing folder sidecars: {e}"
+            self.root.after(0, lambda: self.log_message(error_msg))
+            return
+        elapsed = time.time() - start_time
+        message = (f"Sidecars: wrote {summary['files']} file(s) for {summary['videos']} video(s), "
+                   f"{summary['skipped']} already up to date, {len(summary['errors'])} error(s) in {elapsed:.2f}s.")
+        self.root.after(0, lambda: self.log_message(message))
 
     def start_batch_processing_thread(self):
         batch_folder = self.batch_folder.get().strip()
@@ -574,8 +958,39 @@ class VideoChapterTool:
         self.log_message(f"Starting batch processing in folder: {batch_folder}")
         threading.Thread(target=self._run_batch_processing, args=(batch_folder,)).start()
 
+    def start_batch_plan_thread(self):
+        batch_folder = self.batch_folder.get().strip()
+        if not batch_folder or not os.path.isdir(batch_folder):
+            messagebox.showerror("Error", "Please select a valid batch folder.")
+            return
+        self.log_message(f"Planning a batch for folder (dry run, nothing is written): {batch_folder}")
+        threading.Thread(target=self._run_batch_plan, args=(batch_folder,), daemon=True).start()
+
+    def _run_batch_plan(self, folder_path):
+        """Logs what Start Batch would do with each video and its estimated I/O, temporary space and time."""
+        try:
+            plan = plan_batch(folder_path, self.probe_cache, self.ffprobe_path, self.mkvpropedit_path,
+                              snap=self.snap_to_keyframes.get(), jobs_per_volume=self.batch_jobs_per_volume.get(),
+                              history=self.throughput_history, video_extensions=BATCH_VIDEO_EXTENSIONS)
+        except Exception as e:
+            self.log_message(f"Error planning the batch: {e}")
+            return
+        for line in format_plan(plan):
+            self.log_message(line)
+
     def _run_batch_processing(self, folder_path):
-        video_files = [f for f in os.listdir(folder_path) if f.lower().endswith(('.mp4', '.mkv', '.avi', '.mov'))]
+        stages_before = measure_stages()
+        # One scandir pass gives every video plus its companion/output status via dict lookups
+        try:
+            files = scan_directory(folder_path)
+            entries = build_library(files, BATCH_VIDEO_EXTENSIONS)
+        except Exception as e:
+            self.log_message(f"Could not read batch folder: {e}")
+            self.batch_processing = False
+            self.progress_bar.stop()
+            return
+        video_files = [entry.name for entry in entries]
+        self.root.after(0, self.batch_library_view.set_entries, entries)
         
         if not video_files:
             self.log_message("No video files found in the selected batch folder.")
@@ -585,99 +1000,162 @@ class VideoChapterTool:
 
         self.log_message(f"Found {len(video_files)} video files in batch folder.")
         
-        for i, video_file_name in enumerate(video_files):
-            full_video_path = os.path.join(folder_path, video_file_name)
-            self.log_message(f"\nProcessing batch video {i+1}/{len(video_files)}: {full_video_path}")
-            
-            chapter_txt_path = os.path.splitext(full_video_path)[0] + ".txt"
-            batch_chapters = []
-            if os.path.exists(chapter_txt_path):
-                self.log_message(f"Found companion chapter text file: {chapter_txt_path}")
-                try:
-                    with open(chapter_txt_path, 'r', encoding='utf-8') as f:
-                        text_content = f.read()
-                    batch_chapters = self.parse_chapters_from_text(text_content)
-                    if batch_chapters:
-                        self.log_message(f"Parsed {len(batch_chapters)} chapters from {chapter_txt_path}")
-                    else:
-                        self.log_message(f"No chapters parsed from {chapter_txt_path}. Skipping.")
-                except Exception as e:
-                    self.log_message(f"Error reading/parsing {chapter_txt_path}: {e}")
+        # Parse and validate every chapter file up front, so bad inputs fail before any video is copied
+        batch_plans = self._plan_batch_chapters(folder_path, entries)
+        self._index_chapter_files(folder_path, files)
+        
+        # Videos with chapters are remuxed by the scheduler: per-volume limits, size order, adaptive parallelism
+        jobs = []
+        for i, entry in enumerate(entries):
+            if isinstance(batch_plans[i], str):
+                self._record_batch_result(entries, i, batch_plans[i])
             else:
-                self.log_message(f"No companion chapter text file found for {video_file_name}. Skipping chapters for this video.")
-
-            if batch_chapters:
-                original_chapters = list(self.chapters) 
-                self.chapters = batch_chapters
-                
-                # In batch mode, we always create a new file with chapters
-                # So we strip metadata from the original video, then add chapters to a NEW output file.
-                base_name_for_new_file, ext_for_new_file = os.path.splitext(full_video_path)
-                batch_stripped_video = f"{base_name_for_new_file}_stripped_batch{ext_for_new_file}"
-                final_output_file_batch = f"{base_name_for_new_file}_chapters{ext_for_new_file}"
-
-                self.log_message(f"Applying chapters to {video_file_name} (creating new file '{os.path.basename(final_output_file_batch)}')")
-                try:
-                    # Step 1: Strip metadata from the *original* video to a temporary stripped copy
-                    if not self._strip_all_metadata_from_video(full_video_path, batch_stripped_video):
-                        self.log_message(f"Aborting processing for {video_file_name} due to metadata stripping failure.")
-                        self.batch_results.append((video_file_name, "Failed (metadata strip)"))
-                        continue # Move to next video in batch
-
-                    # Step 2: Create the temporary FFmpeg metadata file (for this video in batch)
-                    batch_metadata_file = f"chapters_metadata_batch_{i}.txt" # Unique name for batch files
-                    with open(batch_metadata_file, "w", encoding="utf-8") as f:
-                        f.write(self._generate_ffmpeg_chapters_metadata(self.chapters))
-
-                    # Step 3: Burn new chapters into the stripped video to the final output file
-                    command = [
-                        self.ffmpeg_path,
-                        '-i', batch_stripped_video, # Use the stripped video as input
-                        '-i', batch_metadata_file,
-                        '-map_metadata', '1',
-                        '-map', '0',
-                        '-c', 'copy',
-                        '-movflags', 'use_metadata_tags',
-                        final_output_file_batch
-                    ]
-                    
-                    self.log_message(f"FFmpeg command (batch new chapter video): {' '.join(command)}")
-
-                    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-                    # Reading stderr directly instead of iter() for simpler batch error handling
-                    stdout_output, stderr_output = process.communicate() 
-
-                    if process.returncode == 0:
-                        self.log_message(f"Batch new video with chapters created successfully: {os.path.basename(final_output_file_batch)}")
-                        self.batch_results.append((video_file_name, "Success"))
-                    else:
-                        self.log_message(f"Creating new batch video with chapters failed for {video_file_name} with exit code {process.returncode}")
-                        self.log_message(f"FFmpeg stdout (batch new): {stdout_output.strip()}")
-                        self.log_message(f"FFmpeg stderr (batch new): {stderr_output.strip()}")
-                        self.batch_results.append((video_file_name, f"Failed: {stderr_output.strip()[:100]}...")) # Log a snippet
-                        
-                except Exception as e:
-                    self.log_message(f"An unexpected error occurred during batch processing for {video_file_name}: {e}")
-                    self.batch_results.append((video_file_name, f"Failed: {e}"))
-                finally:
-                    self.chapters = original_chapters
-                    # Clean up temporary files for this specific video in batch
-                    if os.path.exists(batch_metadata_file):
-                        os.remove(batch_metadata_file)
-                    if os.path.exists(batch_stripped_video):
-                        os.remove(batch_stripped_video)
+                jobs.append(BatchJob(os.path.join(folder_path, entry.name), entry.size, i))
+        self._update_batch_progress(len(self.batch_results), len(entries))
+
+        # Claims go through the folder's shared lease queue, so other GUIs and batch_worker.py
+        # processes working the same folder (from any machine) never do a video twice
+        try:
+            queue = LeaseQueue(queue_path(folder_path))
+            queue.enqueue(queue_jobs(folder_path, [entries[job.payload] for job in jobs]))
+        except Exception as e:
+            queue = None
+            self.log_message(f"Warning: Could not open the shared job queue in the batch folder ({e}); "
+                             "other machines working this folder are not coordinated with.")
+        owner = worker_id()
+
+        # One watchdog for the whole batch: hung ffmpeg runs are killed, and retried while the shared budget lasts
+        watchdog = Watchdog()
+        snap = self.snap_to_keyframes.get()
+
+        def apply_job(job):
+            i = job.payload
+            # Several jobs may run at once, so their log lines go through the Tk event queue
+            self._log_from_thread(f"\nProcessing batch video {i+1}/{len(video_files)}: {job.path}")
+            self.root.after(0, self.batch_library_view.set_current, i)
+            self._log_from_thread(f"Applying chapters to {entries[i].name} (creating new file '{os.path.basename(batch_output_path(job.path))}')")
+
+            def work(lease=None):
+                chapters = batch_plans[i]
+                if snap:
+                    # Per job, once claimed: a cold keyframe index reads the whole file
+                    chapters = self._snap_chapters_to_keyframes(job.path, chapters, (entries[i].size, entries[i].mtime_ns),
+                                                                log=self._log_from_thread)
+                return apply_chapters_to_copy(self.ffmpeg_path, job.path, chapters, log=self._log_from_thread,
+                                              watchdog=watchdog, mkvpropedit_path=self.mkvpropedit_path, lease=lease)
+
+            if queue is None:
+                return work()
+            if queue.claim(owner, path=job.path) is None:
+                state, holder, status = queue.job(job.path) or (None, None, None)
+                if state == DONE:
+                    raise JobFailed(f"Skipped (done by {holder}: {status})")
+                raise JobFailed(f"Skipped (claimed by {holder})")
+            return run_leased(queue, owner, job.path, work, self._log_from_thread)
+
+        def job_done(job, output_file, error):
+            i = job.payload
+            if error is None:
+                self.log_message(f"Batch new video with chapters created successfully: {os.path.basename(output_file)}")
+                self._record_batch_result(entries, i, "Success")
+            elif isinstance(error, JobFailed):
+                self._record_batch_result(entries, i, error.status)
             else:
-                self.batch_results.append((video_file_name, "Skipped (no chapters found)"))
-            
-            self.root.after(0, lambda: self.progress_bar.set((i + 1) / len(video_files) * 100))
+                self.log_message(f"An unexpected error occurred during batch processing for {entries[i].name}: {error}")
+                self._record_batch_result(entries, i, f"Failed: {error}")
+            self._update_batch_progress(len(self.batch_results), len(entries))
 
+        scheduler = BatchScheduler(max_workers=self.batch_jobs_per_volume.get() * 2,
+                                   per_device_limit=self.batch_jobs_per_volume.get(),
+                                   order=ORDER_LARGE_FIRST if self.batch_order.get() == "Largest first" else ORDER_SMALL_FIRST)
+        scheduler.run(jobs, apply_job, on_done=job_done, log=self.log_message)
+        if queue is not None:
+            queue.close()
 
         self.log_message("\nBatch processing complete.")
         for item, status in self.batch_results:
             self.log_message(f"- {item}: {status}")
+        if watchdog.stalls:
+            self.log_message(f"\nStalled FFmpeg runs killed by the watchdog ({watchdog.retries_left} retries left unused):")
+            for label, reason in watchdog.stalls:
+                self.log_message(f"- {label}: {reason}")
+        # What this batch measured makes the next dry-run plan's estimates more accurate
+        try:
+            self.throughput_history.record_since(stages_before)
+        except Exception as e:
+            self.log_message(f"Warning: Could not save the batch throughput measurements: {e}")
         self.batch_processing = False
         self.progress_bar.stop()
 
+    def _index_chapter_files(self, folder_path, files):
+        """Adds the folder's chapter files to the chapter search index (only changed files are read)."""
+        if self.chapter_index is None:
+            return
+        try:
+            result = self.chapter_index.update_folder(folder_path, files, video_extensions=BATCH_VIDEO_EXTENSIONS)
+            if result['read'] or result['removed']:
+                self.log_message(f"Chapter index: {result['read']} chapter file(s) indexed, {result['removed']} removed.")
+        except Exception as e:
+            self.log_message(f"Warning: Could not update the chapter index: {e}")
+
+    def _update_batch_progress(self, done, total):
+        value = done / total * 100 if total else 0
+        self.root.after(0, lambda: self.progress_bar.config(value=value))
+
+    def _plan_batch_chapters(self, folder_path, entries):
+        """Reads, parses and validates the chapter file of every batch video before any remux starts.
+           Returns one item per entry: a ChapterTimeline to apply, or a skip/failure status string."""
+        plans = ["Skipped (no chapters found)"] * len(entries)
+        texts = {}
+        for i, entry in enumerate(entries):
+            if not entry.has_chapter_file:
+                self.log_message(f"No companion chapter text file found for {entry.name}. Skipping chapters for this video.")
+                continue
+            chapter_txt_path = os.path.join(folder_path, entry.chapter_file)
+            try:
+                with open(chapter_txt_path, 'r', encoding='utf-8') as f:
+                    texts[i] = f.read()
+            except Exception as e:
+                self.log_message(f"Error reading/parsing {chapter_txt_path}: {e}")
+
+        # Durations and frame rates for all videos in one cache query; only never-seen files are probed
+        records = {}
+        if self.probe_cache is not None and texts:
+            paths = {os.path.join(folder_path, entries[i].name): (entries[i].size, entries[i].mtime_ns) for i in texts}
+            records = self.probe_cache.get_many(paths)
+            missing = [path for path in paths if path not in records]
+            if missing and self.ffprobe_path:
+                self.log_message(f"Probing {len(missing)} video(s) not yet in the probe cache...")
+                for path in missing:
+                    try:
+                        records[path] = self._probe_video(path, paths[path])
+                    except Exception as e:
+                        self.log_message(f"Warning: Could not probe {os.path.basename(path)} for its duration: {e}")
+
+        invalid = 0
+        for i, text_content in texts.items():
+            entry = entries[i]
+            full_video_path = os.path.join(folder_path, entry.name)
+            record = records.get(full_video_path) or {}
+            batch_chapters = ChapterTimeline.parse(
+                text_content, frame_rate=record.get('frame_rate'), duration_ms=record.get('duration_ms'),
+                on_unparsed=lambda line: self.log_message(f"Warning: Could not parse chapter from line: '{line}'"))
+            if not batch_chapters:
+                self.log_message(f"No chapters parsed from {entry.chapter_file}. Skipping.")
+                continue
+            problems = batch_chapters.validate()
+            if problems:
+                invalid += 1
+                for problem in problems:
+                    self.log_message(f"{entry.name}: {problem}")
+                plans[i] = f"Failed (chapters beyond video end: {len(problems)})"
+                continue
+            self.log_message(f"Parsed {len(batch_chapters)} chapters from {entry.chapter_file}")
+            plans[i] = batch_chapters
+        if invalid:
+            self.log_message(f"{invalid} video(s) have chapters outside the video duration and will not be processed.")
+        return plans
+
     def launch_chapter_creator(self):
         """Launches the chapter_file_creator.py script in a new process."""
         script_name = "chapter_file_creator.py"
@@ -717,12 +1195,22 @@ class VideoChapterTool:
         self.status_text.see(tk.END)
         self.status_text.config(state='disabled')
 
+    def _log_from_thread(self, message):
+        """Logs from a worker thread by handing the message to the Tk thread."""
+        self.root.after(0, self.log_message, message)
+
     def clear_log(self):
         self.status_text.config(state='normal')
         self.status_text.delete("1.0", tk.END)
         self.status_text.config(state='disabled')
 
 if __name__ == "__main__":
+    # "main_app.py --serve [--port N ...]" runs the headless job service instead of the GUI
+    if '--serve' in sys.argv[1:]:
+        from job_service import main as serve_main
+        sys.exit(serve_main([arg for arg in sys.argv[1:] if arg != '--serve']))
     root = tk.Tk()
     app = VideoChapterTool(root)
-    root.mainloop()
\ No newline at end of file
+    root.mainloop()
+    if app.metrics_file is not None:
+        app.metrics_file.stop()
\ No newline at end of file
@@ -0,0 +1,204 @@
+import os
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# NumPy does the per-frame and per-window maths; analysis is unavailable without it
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+# Scene detection works on tiny greyscale frames sampled a few times per second
+ANALYSIS_FPS = 4
+FRAME_WIDTH = 64
+FRAME_HEIGHT = 36
+FRAMES_PER_READ = 256
+
+# Silence detection works on downmixed mono 16-bit PCM
+AUDIO_RATE = 8000
+AUDIO_WINDOW_MS = 50
+WINDOWS_PER_READ = 400
+
+
+class AnalysisCancelled(Exception):
+    """Raised when a running analysis is cancelled."""
+
+
+class FFmpegFailed(Exception):
+    """Raised when an analysis ffmpeg run exits with an error; carries its error output."""
+
+    def __init__(self, returncode, stderr):
+        super().__init__(f"FFmpeg returned error code {returncode}: {stderr.strip()[-500:]}")
+        self.returncode = returncode
+        self.stderr = stderr
+
+
+def stream_ffmpeg_output(command, chunk_bytes, cancel=None, missing_ok=False):
+    """Runs an ffmpeg command and yields its stdout in fixed-size chunks.
+       Only one chunk is held at a time, so memory use does not depend on the file length.
+       Raises FFmpegFailed after the last chunk if ffmpeg exits with an error; with missing_ok,
+       a run that failed only because the file has no stream of the mapped type yields nothing."""
+    creationflags = subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                               stdin=subprocess.DEVNULL, creationflags=creationflags)
+    errors = []
+    # Drained on its own thread, so ffmpeg never blocks on a full stderr pipe
+    drain = threading.Thread(target=lambda: errors.extend(iter(lambda: process.stderr.read(4096), b'')), daemon=True)
+    drain.start()
+    try:
+        while True:
+            if cancel is not None and cancel.is_set():
+                raise AnalysisCancelled()
+            data = process.stdout.read(chunk_bytes)
+            if not data:
+                break
+            yield data
+    finally:
+        process.stdout.close()
+        if process.poll() is None:
+            process.kill()
+        process.wait()
+        drain.join(timeout=5)
+    if process.returncode != 0:
+        stderr = b''.join(errors).decode('utf-8', errors='replace')
+        if missing_ok and "matches no streams" in stderr:
+            return # e.g. no audio track: nothing to analyse, not a failure
+        raise FFmpegFailed(process.returncode, stderr)
+
+
+def _segment_input_args(ffmpeg_path, video_path, start_s, length_s):
+    # Input-side -ss seeks straight to the segment instead of decoding from the start
+    return [ffmpeg_path, '-v', 'error', '-nostdin', '-ss', f"{start_s:.3f}", '-t', f"{length_s:.3f}", '-i', video_path]
+
+
+def scene_changes(ffmpeg_path, video_path, start_s, length_s, cancel=None, sensitivity=6.0):
+    """Returns [(time_s, strength)] for scene cuts in one segment of the video.
+
+    Each sampled frame is compared with the previous one (mean absolute pixel
+    difference). A cut is a local peak that stands out from the segment's
+    median difference by `sensitivity` median absolute deviations; strength
+    is how many times over that threshold it is.
+    """
+    frame_bytes = FRAME_WIDTH * FRAME_HEIGHT
+    command = _segment_input_args(ffmpeg_path, video_path, start_s, length_s) + [
+        '-map', '0:v:0', '-an', '-sn',
+        '-vf', f"fps={ANALYSIS_FPS},scale={FRAME_WIDTH}:{FRAME_HEIGHT},format=gray",
+        '-f', 'rawvideo', '-pix_fmt', 'gray', '-']
+    previous = None
+    differences = []
+    for data in stream_ffmpeg_output(command, frame_bytes * FRAMES_PER_READ, cancel, missing_ok=True):
+        usable = len(data) - len(data) % frame_bytes
+        if not usable:
+            continue
+        frames = np.frombuffer(data, np.uint8, count=usable).reshape(-1, frame_bytes).astype(np.int16)
+        if previous is not None:
+            frames = np.vstack((previous, frames))
+        if len(frames) > 1:
+            differences.append(np.abs(np.diff(frames, axis=0)).mean(axis=1).astype(np.float32))
+        previous = frames[-1:]
+    if not differences:
+        return []
+
+    scores = np.concatenate(differences) # scores[k] compares sampled frames k and k + 1
+    median = float(np.median(scores))
+    spread = float(np.median(np.abs(scores - median))) or 1.0
+    threshold = max(median + sensitivity * spread, 8.0) # Ignore tiny flickers on static content
+    padded = np.concatenate(([-1.0], scores, [-1.0]))
+    peaks = np.flatnonzero((scores >= threshold) & (scores >= padded[:-2]) & (scores > padded[2:]))
+    return [(start_s + (k + 1) / ANALYSIS_FPS, float(scores[k] / threshold)) for k in peaks]
+
+
+def silences(ffmpeg_path, video_path, start_s, length_s, cancel=None, threshold_db=-45.0, min_silence_s=1.0):
+    """Returns [(start_s, end_s)] runs of audio quieter than threshold_db in one segment of the video."""
+    window = AUDIO_RATE * AUDIO_WINDOW_MS // 1000
+    window_s = AUDIO_WINDOW_MS / 1000
+    command = _segment_input_args(ffmpeg_path, video_path, start_s, length_s) + [
+        '-map', '0:a:0', '-vn', '-sn', '-ac', '1', '-ar', str(AUDIO_RATE), '-f', 's16le', '-acodec', 'pcm_s16le', '-']
+    runs = []
+    run_start = None
+    windows_seen = 0
+    for data in stream_ffmpeg_output(command, window * 2 * WINDOWS_PER_READ, cancel, missing_ok=True):
+        count = len(data) // (window * 2)
+        if not count:
+            continue
+        samples = np.frombuffer(data, np.int16, count=count * window).reshape(count, window).astype(np.float32)
+        rms = np.sqrt(np.mean(samples * samples, axis=1)) / 32768.0
+        quiet = 20 * np.log10(rms + 1e-10) < threshold_db
+        # Edges of quiet runs within this chunk, carrying the open run over from the previous one
+        edges = np.flatnonzero(np.diff(np.concatenate(([run_start is not None], quiet)).astype(np.int8)))
+        for edge in edges:
+            position = windows_seen + int(edge)
+            if quiet[edge]:
+                run_start = position
+            else:
+                if (position - run_start) * window_s >= min_silence_s:
+                    runs.append((start_s + run_start * window_s, start_s + position * window_s))
+                run_start = None
+        windows_seen += count
+    if run_start is not None and (windows_seen - run_start) * window_s >= min_silence_s:
+        runs.append((start_s + run_start * window_s, start_s + windows_seen * window_s))
+    return runs
+
+
+def _merge_runs(runs, gap_s=AUDIO_WINDOW_MS / 1000 * 2):
+    """Joins silence runs that were split by a segment boundary."""
+    merged = []
+    for start, end in sorted(runs):
+        if merged and start - merged[-1][1] <= gap_s:
+            merged[-1] = (merged[-1][0], max(end, merged[-1][1]))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def suggest_chapters(video_path, ffmpeg_path, duration_ms, min_gap_s=30.0, segment_s=300.0,
+                     workers=None, cancel=None, progress=None, min_silence_s=1.0):
+    """Proposes chapter start times for a video from scene cuts and silences.
+
+    The video is split into segments that are decoded by separate ffmpeg
+    processes in parallel (one for frames, one for audio per segment).
+    Returns a sorted list of (start_ms, reason). No suggestion is made in the
+    first min_gap_s (the Intro chapter) or within min_gap_s of another one.
+    """
+    if not NUMPY_AVAILABLE:
+        raise RuntimeError("NumPy is required for chapter suggestions (pip install numpy).")
+    duration_s = duration_ms / 1000
+    segments = []
+    position = 0.0
+    while position < duration_s:
+        segments.append((position, min(segment_s, duration_s - position)))
+        position += segment_s
+
+    scenes = []
+    quiet_runs = []
+    workers = workers or os.cpu_count() or 2
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {}
+        for start_s, length_s in segments:
+            futures[pool.submit(scene_changes, ffmpeg_path, video_path, start_s, length_s, cancel)] = scenes
+            futures[pool.submit(silences, ffmpeg_path, video_path, start_s, length_s, cancel,
+                                min_silence_s=min_silence_s)] = quiet_runs
+        for done, future in enumerate(as_completed(futures), 1):
+            futures[future].extend(future.result())
+            if progress:
+                progress(done / len(futures))
+
+    # Candidates: the end of each pause (where speech resumes) and each cut; a cut right after a pause is strongest
+    candidates = []
+    pauses = [(start, end) for start, end in _merge_runs(quiet_runs) if end < duration_s]
+    pause_ends = [end for _, end in pauses]
+    for start, end in pauses:
+        candidates.append((min(end - start, 5.0), end, "Pause"))
+    for time_s, strength in scenes:
+        near_pause = any(abs(time_s - end) <= 2.0 for end in pause_ends)
+        candidates.append((strength + (3.0 if near_pause else 0.0), time_s,
+                           "Scene change after pause" if near_pause else "Scene change"))
+
+    chosen = []
+    for weight, time_s, reason in sorted(candidates, reverse=True):
+        if time_s < min_gap_s or any(abs(time_s - other) < min_gap_s for other, _ in chosen):
+            continue
+        chosen.append((time_s, reason))
+    return sorted((int(round(time_s * 1000)), reason) for time_s, reason in chosen)
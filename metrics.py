@@ -0,0 +1,259 @@
+import os
+import time
+import bisect
+import threading
+import contextlib
+
+OPENMETRICS_CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+DEFAULT_WRITE_INTERVAL = 15 # Seconds between metrics textfile updates
+
+# Seconds; tool runs range from a header probe to a multi-hour remux over a slow share
+DURATION_BUCKETS = (0.05, 0.25, 1, 5, 15, 60, 300, 900, 3600, 4 * 3600)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + '}'
+
+
+class _Child:
+    """A metric bound to one set of label values (what labels() returns)."""
+
+    def __init__(self, metric, values):
+        self._metric = metric
+        self._values = values
+
+    def __getattr__(self, name):
+        method = getattr(self._metric, name)
+        return lambda *args, **kwargs: method(*args, labels=self._values, **kwargs)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labelnames=(), registry=None):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {} # Label values -> value
+        if not self.labelnames:
+            self._values[()] = self._zero() # Unlabelled metrics are exposed from the start
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def _zero(self):
+        return 0
+
+    def labels(self, *values):
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {values}")
+        return _Child(self, tuple(str(value) for value in values))
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} needs labels {self.labelnames}")
+        return labels
+
+    def value(self, labels=()):
+        """Current value for one set of label values (0 if never set)."""
+        key = tuple(str(value) for value in self._key(labels))
+        with self._lock:
+            return self._values.get(key, self._zero())
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, labels=()):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        return [(f"{self.name}_total", labels, value) for labels, value in values]
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def set(self, value, labels=()):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, labels=()):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, labels=()):
+        self.inc(-amount, labels)
+
+    @contextlib.contextmanager
+    def track(self, labels=()):
+        """Counts the block as in progress while it runs."""
+        self.inc(1, labels)
+        try:
+            yield
+        finally:
+            self.dec(1, labels)
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        return [(self.name, labels, value) for labels, value in values]
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DURATION_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help_text, labelnames, registry)
+
+    def _zero(self):
+        return [0] * (len(self.buckets) + 1), 0.0
+
+    def value(self, labels=()):
+        """(number of observations, their sum) for one set of label values."""
+        counts, total = super().value(labels)
+        return sum(counts), total
+
+    def observe(self, value, labels=()):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key) or self._zero()
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    @contextlib.contextmanager
+    def time(self, labels=()):
+        """Observes the wall-clock duration of the block (also when it raises)."""
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - started, labels)
+
+    def samples(self):
+        with self._lock:
+            values = sorted((labels, (list(counts), total)) for labels, (counts, total) in self._values.items())
+        samples = []
+        for labels, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                samples.append((f"{self.name}_bucket", labels + (_number(bound),), cumulative))
+            samples.append((f"{self.name}_count", labels, cumulative))
+            samples.append((f"{self.name}_sum", labels, total))
+        return samples
+
+
+class Registry:
+    """The set of metrics one process exposes. const_labels are added to every sample (e.g. the
+       worker id, so the files of several worker processes can be collected side by side)."""
+
+    def __init__(self):
+        self._metrics = []
+        self.const_labels = {}
+
+    def register(self, metric):
+        self._metrics.append(metric)
+
+    def render(self, openmetrics=True):
+        """Returns every metric in the OpenMetrics text format, or in the Prometheus 0.0.4 text
+           format (what the node_exporter textfile collector reads) when openmetrics is False."""
+        const_names = tuple(self.const_labels)
+        const_values = tuple(self.const_labels.values())
+        lines = []
+        for metric in self._metrics:
+            family = metric.name if openmetrics or metric.kind != 'counter' else f"{metric.name}_total"
+            lines.append(f"# HELP {family} {_escape(metric.help)}")
+            lines.append(f"# TYPE {family} {metric.kind}")
+            for sample_name, labels, value in metric.samples():
+                names = metric.labelnames + (('le',) if sample_name.endswith('_bucket') else ())
+                lines.append(f"{sample_name}{_labels(const_names + names, const_values + labels)} {_number(value)}")
+        if openmetrics:
+            lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# Jobs by runner (batch, service) and result (succeeded, failed, skipped, cancelled)
+JOBS = Counter('videochapter_jobs', "Chapter jobs finished", ('runner', 'result'))
+BYTES_READ = Counter('videochapter_read_bytes', "Media bytes read by jobs", ('stage',))
+BYTES_WRITTEN = Counter('videochapter_written_bytes', "Media bytes written by jobs", ('stage',))
+STAGE_SECONDS = Histogram('videochapter_stage_duration_seconds', "Duration of each job stage", ('stage',))
+PROBE_CACHE = Counter('videochapter_probe_cache_lookups', "Probe cache lookups", ('kind', 'result'))
+QUEUE_DEPTH = Gauge('videochapter_queue_depth', "Jobs waiting to be picked up", ('queue',))
+ACTIVE_PROCESSES = Gauge('videochapter_active_subprocesses', "External tool processes running")
+STALLS = Counter('videochapter_process_stalls', "Processes killed by the watchdog")
+
+
+def count_bytes(stage, read_path=None, written_path=None):
+    """Adds the sizes of the files a finished stage read and wrote to the byte counters."""
+    for counter, path in ((BYTES_READ, read_path), (BYTES_WRITTEN, written_path)):
+        if path:
+            try:
+                counter.inc(os.path.getsize(path), labels=(stage,))
+            except OSError:
+                pass
+
+
+def write_textfile(path, registry=REGISTRY):
+    """Atomically replaces path with the current metrics (Prometheus format for *.prom files,
+       which the node_exporter textfile collector reads, OpenMetrics otherwise)."""
+    text = registry.render(openmetrics=not path.endswith('.prom'))
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(temp_path, path)
+
+
+class MetricsFile:
+    """Rewrites a metrics textfile every interval seconds from a daemon thread until stop()."""
+
+    def __init__(self, path, interval=DEFAULT_WRITE_INTERVAL, registry=REGISTRY):
+        self.path = path
+        self.interval = interval
+        self.registry = registry
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="MetricsFile", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while True:
+            try:
+                write_textfile(self.path, self.registry)
+            except OSError:
+                pass # Folder gone or not writable right now; try again next time
+            if self._stop.wait(self.interval):
+                return
+
+    def stop(self):
+        """Stops the thread after one last write, so the file ends with the final counts."""
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout=5)
+        try:
+            write_textfile(self.path, self.registry)
+        except OSError:
+            pass
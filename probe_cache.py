@@ -0,0 +1,256 @@
+import os
+import sys
+import json
+import sqlite3
+import threading
+import subprocess
+from array import array
+
+from metrics import ACTIVE_PROCESSES, PROBE_CACHE, STAGE_SECONDS
+from process_watchdog import ProcessStalled, run_watched
+
+
+def default_cache_dir():
+    """Returns the per-user cache folder shared by both tools (override with VIDEO_CHAPTER_TOOL_CACHE)."""
+    override = os.environ.get('VIDEO_CHAPTER_TOOL_CACHE')
+    if override:
+        return override
+    if sys.platform == "win32":
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+        return os.path.join(base, 'VideoChapterTool')
+    if sys.platform == "darwin":
+        return os.path.expanduser('~/Library/Caches/VideoChapterTool')
+    return os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'), 'video_chapter_tool')
+
+
+def file_key(path):
+    """Normalized path used as the cache key for a media file."""
+    return os.path.normcase(os.path.abspath(path))
+
+
+def _parse_rate(rate):
+    # ffprobe reports frame rates as "30000/1001"
+    try:
+        num, _, den = rate.partition('/')
+        value = float(num) / float(den or 1)
+        return value if value > 0 else None
+    except (ValueError, ZeroDivisionError, AttributeError):
+        return None
+
+
+def record_from_ffprobe(data):
+    """Reduces ffprobe's -show_format -show_streams JSON to the fields the tools use."""
+    format_info = data.get('format', {})
+    duration = format_info.get('duration')
+    record = {
+        'duration_ms': int(round(float(duration) * 1000)) if duration not in (None, 'N/A') else None,
+        'frame_rate': None,
+        'format_name': format_info.get('format_name'),
+        'bit_rate': int(format_info['bit_rate']) if str(format_info.get('bit_rate', '')).isdigit() else None,
+        'streams': [],
+        'chapters': [], # [start_ms, end_ms, title] as embedded in the container
+        'probed': True, # False for records that only hold fields merged in by update()
+    }
+    for chapter in data.get('chapters', []):
+        try:
+            start_ms = int(round(float(chapter['start_time']) * 1000))
+            end_ms = int(round(float(chapter['end_time']) * 1000))
+        except (KeyError, TypeError, ValueError):
+            continue
+        record['chapters'].append([start_ms, end_ms, (chapter.get('tags') or {}).get('title', '')])
+    for stream in data.get('streams', []):
+        summary = {key: stream.get(key) for key in (
+            'index', 'codec_type', 'codec_name', 'profile', 'width', 'height', 'pix_fmt',
+            'sample_rate', 'channels', 'channel_layout', 'time_base')}
+        summary['frame_rate'] = _parse_rate(stream.get('avg_frame_rate')) or _parse_rate(stream.get('r_frame_rate'))
+        if stream.get('codec_type') == 'video' and record['frame_rate'] is None:
+            if not (stream.get('disposition') or {}).get('attached_pic'):
+                record['frame_rate'] = summary['frame_rate']
+        record['streams'].append(summary)
+    return record
+
+
+def _run_ffprobe(command, timeout, stage, cancel=None):
+    # Returns (returncode, stdout, stderr). With a cancel Event the run goes through the watchdog,
+    # which kills it as soon as the Event is set
+    if cancel is None:
+        with ACTIVE_PROCESSES.track(), STAGE_SECONDS.time(labels=(stage,)):
+            result = subprocess.run(command, capture_output=True, text=True, timeout=timeout)
+        return result.returncode, result.stdout, result.stderr
+    try:
+        return run_watched(command, timeout=timeout, stall_timeout=timeout, cancel=cancel, stage=stage)
+    except ProcessStalled as e:
+        raise Exception(f"FFprobe was stopped ({e.reason})")
+
+
+def probe_file(path, ffprobe_path='ffprobe', timeout=60, cancel=None):
+    """Runs ffprobe on path (container headers only) and returns its record. Setting the cancel Event stops it."""
+    command = [ffprobe_path, '-v', 'quiet', '-print_format', 'json', '-show_format', '-show_streams', '-show_chapters',
+               path]
+    returncode, stdout, stderr = _run_ffprobe(command, timeout, 'probe', cancel)
+    if returncode != 0:
+        raise Exception(f"FFprobe returned error code {returncode}. Stderr: {stderr}")
+    return record_from_ffprobe(json.loads(stdout))
+
+
+def scan_keyframes(path, ffprobe_path='ffprobe', timeout=600, cancel=None):
+    """Returns the sorted keyframe times (ms) of the first video stream as an array('q').
+       Only packet headers are read (their keyframe flag); no frame is decoded."""
+    command = [ffprobe_path, '-v', 'error', '-select_streams', 'v:0',
+               '-show_entries', 'packet=pts_time,dts_time,flags', '-of', 'csv=p=0', path]
+    returncode, stdout, stderr = _run_ffprobe(command, timeout, 'keyframes', cancel)
+    if returncode != 0:
+        raise Exception(f"FFprobe returned error code {returncode}. Stderr: {stderr}")
+    times = set()
+    for line in stdout.splitlines():
+        pts_time, _, rest = line.partition(',')
+        dts_time, _, flags = rest.partition(',')
+        if not flags.startswith('K'):
+            continue
+        try:
+            seconds = float(pts_time if pts_time not in ('', 'N/A') else dts_time)
+        except ValueError:
+            continue
+        times.add(max(0, int(round(seconds * 1000))))
+    return array('q', sorted(times))
+
+
+class ProbeCache:
+    """Persistent store of ffprobe results shared by both tools.
+
+    Entries are keyed by normalized path and are only valid while the file's
+    size and mtime are unchanged, so an edited or replaced file is re-probed.
+    The store is an SQLite database in the user cache folder; it is safe to
+    use from several threads and from both applications at once. Keyframe
+    indexes live in a second table as packed int64 millisecond arrays.
+    """
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir or default_cache_dir()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.db_path = os.path.join(self.cache_dir, 'probe_cache.sqlite3')
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS probes (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                duration_ms INTEGER,
+                frame_rate REAL,
+                data TEXT NOT NULL
+            )""")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS keyframes (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                times BLOB NOT NULL
+            )""")
+        self._conn.commit()
+
+    def get(self, path, stat=None):
+        """Returns the cached record for path, or None if missing or stale. stat may be (size, mtime_ns)."""
+        size, mtime_ns = stat if stat is not None else self._identity(path)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM probes WHERE path = ? AND size = ? AND mtime_ns = ?",
+                (file_key(path), size, mtime_ns)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_many(self, files):
+        """Bulk lookup. files maps path -> (size, mtime_ns); returns path -> record for fresh entries."""
+        keys = {file_key(path): (path, stat) for path, stat in files.items()}
+        found = {}
+        items = list(keys.items())
+        with self._lock:
+            for i in range(0, len(items), 500): # Stay under SQLite's bound-parameter limit
+                chunk = items[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT path, size, mtime_ns, data FROM probes WHERE path IN ({','.join('?' * len(chunk))})",
+                    [key for key, _ in chunk]).fetchall()
+                for key, size, mtime_ns, data in rows:
+                    path, stat = keys[key]
+                    if (size, mtime_ns) == tuple(stat):
+                        found[path] = json.loads(data)
+        PROBE_CACHE.inc(len(found), labels=('bulk', 'hit'))
+        PROBE_CACHE.inc(len(files) - len(found), labels=('bulk', 'miss'))
+        return found
+
+    def put(self, path, record, stat=None):
+        """Stores a record for path under its current size and mtime."""
+        size, mtime_ns = stat if stat is not None else self._identity(path)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO probes (path, size, mtime_ns, duration_ms, frame_rate, data) VALUES (?, ?, ?, ?, ?, ?)",
+                (file_key(path), size, mtime_ns, record.get('duration_ms'), record.get('frame_rate'), json.dumps(record)))
+            self._conn.commit()
+
+    def update(self, path, **fields):
+        """Merges fields into the cached record for path (creating it if needed)."""
+        stat = self._identity(path)
+        record = self.get(path, stat) or {'duration_ms': None, 'frame_rate': None, 'streams': [], 'probed': False}
+        record.update(fields)
+        self.put(path, record, stat)
+        return record
+
+    def probe(self, path, ffprobe_path='ffprobe', timeout=60, require=(), stat=None, cancel=None):
+        """Returns the record for path, running ffprobe only if the cache has no fresh entry.
+           require names fields the record must have; records cached before a field was
+           added to the probe are probed again."""
+        stat = stat if stat is not None else self._identity(path)
+        cached = self.get(path, stat)
+        if cached is not None and cached.get('probed') and all(field in cached for field in require):
+            PROBE_CACHE.inc(labels=('probe', 'hit'))
+            return cached
+        PROBE_CACHE.inc(labels=('probe', 'miss'))
+        record = probe_file(path, ffprobe_path, timeout, cancel)
+        if cached is not None:
+            # Keep extra fields other code stored for this file (e.g. a duration from MoviePy)
+            record.update({key: value for key, value in cached.items() if key not in record})
+        self.put(path, record, stat)
+        return record
+
+    def duration_ms(self, path, ffprobe_path='ffprobe', timeout=60):
+        """Returns the duration of path in milliseconds (probing if needed), or None if unknown."""
+        return self.probe(path, ffprobe_path, timeout).get('duration_ms')
+
+    def get_keyframes(self, path, stat=None):
+        """Returns the cached keyframe index of path (array('q') of ms), or None if missing or stale."""
+        size, mtime_ns = stat if stat is not None else self._identity(path)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT times FROM keyframes WHERE path = ? AND size = ? AND mtime_ns = ?",
+                (file_key(path), size, mtime_ns)).fetchone()
+        if row is None:
+            return None
+        times = array('q')
+        times.frombytes(row[0])
+        return times
+
+    def put_keyframes(self, path, times, stat=None):
+        size, mtime_ns = stat if stat is not None else self._identity(path)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO keyframes (path, size, mtime_ns, times) VALUES (?, ?, ?, ?)",
+                (file_key(path), size, mtime_ns, array('q', times).tobytes()))
+            self._conn.commit()
+
+    def keyframes(self, path, ffprobe_path='ffprobe', timeout=600, stat=None, cancel=None):
+        """Returns the keyframe index of path, scanning the file's packets only on a cache miss."""
+        stat = stat if stat is not None else self._identity(path)
+        times = self.get_keyframes(path, stat)
+        PROBE_CACHE.inc(labels=('keyframes', 'miss' if times is None else 'hit'))
+        if times is None:
+            times = scan_keyframes(path, ffprobe_path, timeout, cancel)
+            self.put_keyframes(path, times, stat)
+        return times
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _identity(self, path):
+        st = os.stat(path)
+        return st.st_size, st.st_mtime_ns
@@ -0,0 +1,185 @@
+import os
+import time
+import threading
+import subprocess
+
+from metrics import ACTIVE_PROCESSES, STAGE_SECONDS, STALLS
+
+DEFAULT_STALL_TIMEOUT = 120 # Seconds without output growth or progress lines before a process counts as hung
+DEFAULT_RETRY_BUDGET = 3 # Stall retries shared by all jobs of one run
+MIN_JOB_TIMEOUT = 300 # Seconds; small files still get this long
+MIN_THROUGHPUT = 1024 * 1024 # Bytes/s a remux is assumed to reach at worst (slow SMB share)
+POLL_INTERVAL = 0.5
+
+
+class ProcessStalled(Exception):
+    """Raised when the watchdog kills a process that stopped making progress or ran past its timeout."""
+
+    def __init__(self, reason, stderr=""):
+        super().__init__(reason)
+        self.reason = reason
+        self.stderr = stderr
+
+
+def job_timeout(size_bytes):
+    """Wall-clock limit for a stream-copy job over a file of the given size."""
+    return max(MIN_JOB_TIMEOUT, int((size_bytes or 0) / MIN_THROUGHPUT))
+
+
+def _kill(process):
+    process.kill()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        pass # Stuck in an uninterruptible read on a dead share; it is abandoned rather than waited for
+
+
+def ffmpeg_progress(duration_ms, report, start=0.0, end=1.0):
+    """An on_stdout callback for run_watched() that turns the out_time_ms lines of ffmpeg's
+       -progress pipe:1 into report(fraction), scaled into start..end. None without a duration or report."""
+    if not duration_ms or report is None:
+        return None
+    pending = [b'']
+
+    def on_stdout(chunk):
+        lines = (pending[0] + chunk).split(b'\n')
+        pending[0] = lines.pop()
+        for line in lines:
+            key, _, value = line.strip().partition(b'=')
+            if key == b'out_time_ms' and value.isdigit(): # Microseconds, despite the name
+                done = min(1.0, int(value) / 1000 / duration_ms)
+                report(start + (end - start) * done)
+    return on_stdout
+
+
+def run_watched(command, watch_path=None, timeout=None, stall_timeout=DEFAULT_STALL_TIMEOUT, cancel=None,
+                stage=None, on_stdout=None):
+    """Runs command to completion under a watchdog and returns (returncode, stdout, stderr).
+
+    Any bytes on stdout or stderr (ffmpeg's progress lines) and any change
+    in the size of watch_path count as progress. The process is killed and
+    ProcessStalled raised when there was no progress for stall_timeout
+    seconds or it ran longer than timeout. Setting the cancel Event kills it
+    as well. The output file is checked from its own thread, so a stat that
+    hangs on a stale network handle cannot freeze the watchdog itself.
+    Runs that finish are timed under stage in the metrics, if given.
+    on_stdout, if given, is called with every chunk read from stdout.
+    """
+    process = subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    started = time.monotonic()
+    ACTIVE_PROCESSES.inc()
+    try:
+        result = _supervise(process, started, watch_path, timeout, stall_timeout, cancel, on_stdout)
+    except ProcessStalled:
+        STALLS.inc()
+        raise
+    finally:
+        ACTIVE_PROCESSES.dec()
+    if stage:
+        STAGE_SECONDS.observe(time.monotonic() - started, labels=(stage,))
+    return result
+
+
+def _supervise(process, started, watch_path, timeout, stall_timeout, cancel, on_stdout=None):
+    # The watchdog loop of run_watched(); returns (returncode, stdout, stderr) or raises ProcessStalled
+    last_activity = [started]
+    output = {process.stdout: [], process.stderr: []}
+
+    def pump(stream):
+        for chunk in iter(lambda: stream.read1(65536), b''):
+            output[stream].append(chunk)
+            last_activity[0] = time.monotonic()
+            if on_stdout is not None and stream is process.stdout:
+                try:
+                    on_stdout(chunk)
+                except Exception:
+                    pass # A failing progress report must not stop the output from being drained
+
+    def watch_output():
+        last_size = None
+        while process.poll() is None:
+            try:
+                size = os.stat(watch_path).st_size
+            except OSError:
+                size = None
+            if size != last_size:
+                last_size = size
+                last_activity[0] = time.monotonic()
+            time.sleep(POLL_INTERVAL)
+
+    threads = [threading.Thread(target=pump, args=(stream,), daemon=True) for stream in output]
+    if watch_path:
+        threads.append(threading.Thread(target=watch_output, daemon=True))
+    for thread in threads:
+        thread.start()
+
+    def collected(stream):
+        return b''.join(output[stream]).decode('utf-8', errors='replace')
+
+    while True:
+        try:
+            process.wait(timeout=POLL_INTERVAL)
+            break
+        except subprocess.TimeoutExpired:
+            pass
+        now = time.monotonic()
+        if cancel is not None and cancel.is_set():
+            _kill(process)
+            raise ProcessStalled("cancelled", collected(process.stderr))
+        if timeout and now - started > timeout:
+            _kill(process)
+            raise ProcessStalled(f"still running after {int(now - started)}s (limit {int(timeout)}s)",
+                                 collected(process.stderr))
+        if now - last_activity[0] > stall_timeout:
+            _kill(process)
+            raise ProcessStalled(f"no progress for {int(now - last_activity[0])}s", collected(process.stderr))
+    for thread in threads[:2]:
+        thread.join(timeout=5)
+    return process.returncode, collected(process.stdout), collected(process.stderr)
+
+
+class _AnyCancel:
+    """Set when any of the given Events (None ones are ignored) is."""
+
+    def __init__(self, *events):
+        self.events = [event for event in events if event is not None]
+
+    def is_set(self):
+        return any(event.is_set() for event in self.events)
+
+
+class Watchdog:
+    """run_watched() with retries: a stalled process is killed and started again while the shared
+       retry budget lasts. Every kill is kept in `stalls` as (label, reason) for the batch report."""
+
+    def __init__(self, stall_timeout=DEFAULT_STALL_TIMEOUT, retry_budget=DEFAULT_RETRY_BUDGET, cancel=None):
+        self.stall_timeout = stall_timeout
+        self.retries_left = retry_budget
+        self.cancel = cancel
+        self.stalls = []
+        self._lock = threading.Lock()
+
+    def _take_retry(self):
+        with self._lock:
+            if self.retries_left <= 0:
+                return False
+            self.retries_left -= 1
+            return True
+
+    def run(self, command, label, watch_path=None, timeout=None, log=None, stage=None, cancel=None,
+            on_stdout=None):
+        """cancel, if given, stops this run as well as the watchdog-wide cancel (e.g. a job's lost lease)."""
+        log = log or (lambda message: None)
+        cancel = _AnyCancel(self.cancel, cancel)
+        while True:
+            try:
+                return run_watched(command, watch_path, timeout, self.stall_timeout, cancel, stage, on_stdout)
+            except ProcessStalled as e:
+                if cancel.is_set():
+                    raise
+                with self._lock:
+                    self.stalls.append((label, e.reason))
+                if not self._take_retry():
+                    log(f"Watchdog: {label} stalled ({e.reason}); retry budget used up, giving up.")
+                    raise
+                log(f"Watchdog: {label} stalled ({e.reason}); killed and retrying.")
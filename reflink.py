@@ -0,0 +1,100 @@
+import os
+import sys
+import errno
+import threading
+
+try:
+    import fcntl
+except ImportError: # Windows
+    fcntl = None
+
+FICLONE = 0x40049409 # Linux ioctl: share all extents of one file with another (btrfs, XFS, bcachefs)
+
+# Errors that mean "this filesystem (pair) cannot do it", as opposed to a real I/O failure
+_UNSUPPORTED = {errno.EOPNOTSUPP, errno.ENOTSUP, errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.ENOTTY}
+
+_support_lock = threading.Lock()
+_unsupported = {} # st_dev -> set of methods that failed as unsupported there
+
+
+def _device(path):
+    return os.stat(os.path.dirname(os.path.abspath(path))).st_dev
+
+
+def _mark_unsupported(device, method):
+    with _support_lock:
+        _unsupported.setdefault(device, set()).add(method)
+
+
+def _ficlone(source, target):
+    with open(source, 'rb') as src, open(target, 'wb') as dst:
+        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+
+
+def _copy_file_range(source, target):
+    # In-kernel copy: a reflink on CoW filesystems, a server-side copy on NFS 4.2 / SMB3
+    with open(source, 'rb') as src, open(target, 'wb') as dst:
+        remaining = os.fstat(src.fileno()).st_size
+        while remaining > 0:
+            copied = os.copy_file_range(src.fileno(), dst.fileno(), min(remaining, 1 << 30))
+            if copied == 0:
+                raise OSError(errno.EIO, "copy_file_range stopped early")
+            remaining -= copied
+
+
+def _clonefile(source, target):
+    # APFS clone on macOS
+    import ctypes
+    libc = ctypes.CDLL(None, use_errno=True)
+    if libc.clonefile(os.fsencode(source), os.fsencode(target), 0) != 0:
+        error = ctypes.get_errno()
+        raise OSError(error, os.strerror(error))
+
+
+def _methods():
+    methods = []
+    if sys.platform.startswith('linux') and fcntl is not None:
+        methods.append(('ficlone', _ficlone))
+    if sys.platform == 'darwin':
+        methods.append(('clonefile', _clonefile))
+    if hasattr(os, 'copy_file_range'):
+        methods.append(('copy_file_range', _copy_file_range))
+    return methods
+
+
+def clone_file(source, target):
+    """Makes target a copy of source without moving the data through this process, if the
+       filesystem allows it. Returns the method used, or None (with target removed) when
+       no method works here. Methods that turn out to be unsupported are remembered per
+       device, so later calls on the same volume go straight to the fallback."""
+    try:
+        device = _device(target)
+    except OSError:
+        return None
+    with _support_lock:
+        failed = set(_unsupported.get(device, ()))
+    for name, method in _methods():
+        if name in failed:
+            continue
+        try:
+            method(source, target)
+            return name
+        except OSError as e:
+            if os.path.exists(target):
+                os.remove(target)
+            if e.errno in _UNSUPPORTED:
+                _mark_unsupported(device, name)
+                continue
+            raise
+    return None
+
+
+def clone_supported(path):
+    """False once every clone method has failed on path's volume; True while one may still work."""
+    try:
+        device = _device(path)
+    except OSError:
+        return False
+    with _support_lock:
+        failed = _unsupported.get(device, set())
+    return any(name not in failed for name, _ in _methods())
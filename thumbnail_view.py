@@ -0,0 +1,84 @@
+import base64
+import tkinter as tk
+from tkinter import ttk
+
+from chapter_timeline import ms_to_hms
+from thumbnails import THUMBNAIL_WIDTH
+
+
+class ThumbnailStrip(ttk.Frame):
+    """Horizontally scrolling row with one thumbnail per chapter.
+
+    set_chapters() lays out a slot per chapter straight away; images are
+    dropped into their slots by set_image() as the loader delivers them, in
+    whatever order they finish.
+    """
+
+    def __init__(self, parent, height=90):
+        super().__init__(parent)
+        self.slot_width = THUMBNAIL_WIDTH + 8
+        self.image_height = height
+        self.canvas = tk.Canvas(self, height=height + 20, background='white', highlightthickness=0)
+        self.scrollbar = ttk.Scrollbar(self, orient='horizontal', command=self.canvas.xview)
+        self.canvas.configure(xscrollcommand=self.scrollbar.set)
+        self.canvas.pack(fill='x')
+        self.scrollbar.pack(fill='x')
+        self.images = {} # ms -> PhotoImage; Tk only draws images that are still referenced
+        self.slots = {} # ms -> slot index
+        self.source = None # Video the current images belong to
+        self.canvas.bind('<MouseWheel>', lambda event: self.canvas.xview_scroll(-1 if event.delta > 0 else 1, 'units'))
+        self.canvas.bind('<Button-4>', lambda event: self.canvas.xview_scroll(-1, 'units'))
+        self.canvas.bind('<Button-5>', lambda event: self.canvas.xview_scroll(1, 'units'))
+
+    def set_chapters(self, chapters, source=None):
+        """Lays out slots for (start_ms, title) pairs of the video `source`, keeping images already
+           loaded for the same video and times. Returns the start times that still need an image."""
+        chapters = list(chapters)
+        if source != self.source:
+            self.images = {}
+            self.source = source
+        starts = {start_ms for start_ms, _ in chapters}
+        self.images = {ms: image for ms, image in self.images.items() if ms in starts}
+        self.slots = {}
+        self.canvas.delete('all')
+        missing = []
+        for index, (start_ms, title) in enumerate(chapters):
+            if start_ms in self.slots:
+                continue # Same time listed twice
+            self.slots[start_ms] = index
+            x = index * self.slot_width + 4
+            self.canvas.create_rectangle(x, 0, x + THUMBNAIL_WIDTH, self.image_height, outline='light gray',
+                                         tags=f"frame_{start_ms}")
+            label = f"{ms_to_hms(start_ms)} {title}"
+            self.canvas.create_text(x, self.image_height + 2, text=label, anchor='nw', width=THUMBNAIL_WIDTH,
+                                    font=("Arial", 8))
+            if start_ms in self.images:
+                self._draw_image(start_ms)
+            else:
+                missing.append(start_ms)
+        self.canvas.configure(scrollregion=(0, 0, len(chapters) * self.slot_width, self.image_height + 20))
+        return missing
+
+    def set_image(self, start_ms, png_data):
+        """Shows a loaded thumbnail (PNG bytes) in its slot, or marks the slot if there is no frame."""
+        if start_ms not in self.slots:
+            return # Chapter was removed while its thumbnail was loading
+        if png_data is None:
+            x = self.slots[start_ms] * self.slot_width + 4
+            self.canvas.create_text(x + THUMBNAIL_WIDTH // 2, self.image_height // 2, text="No frame", fill='gray50')
+            return
+        try:
+            self.images[start_ms] = tk.PhotoImage(data=base64.b64encode(png_data))
+        except tk.TclError:
+            return
+        self._draw_image(start_ms)
+
+    def clear(self):
+        self.set_chapters([])
+
+    def _draw_image(self, start_ms):
+        image = self.images[start_ms]
+        x = self.slots[start_ms] * self.slot_width + 4
+        # Letterbox into the slot; taller-than-wide frames are cropped at the bottom
+        y = max(0, (self.image_height - image.height()) // 2)
+        self.canvas.create_image(x, y, image=image, anchor='nw')
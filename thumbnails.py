@@ -0,0 +1,132 @@
+import os
+import hashlib
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from chapter_files import atomic_write_bytes
+from probe_cache import default_cache_dir, file_key
+
+THUMBNAIL_WIDTH = 160
+DEFAULT_CACHE_BYTES = 64 * 1024 * 1024
+
+
+def grab_thumbnail(ffmpeg_path, video_path, ms, width=THUMBNAIL_WIDTH, timeout=30):
+    """Returns one downscaled PNG frame at ms, or None if there is no frame there.
+
+    -ss goes before -i so ffmpeg seeks in the container and decodes only the
+    keyframe at or before ms (what a player shows after seeking there),
+    instead of decoding the video from the start.
+    """
+    creationflags = subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
+    command = [ffmpeg_path, '-v', 'error', '-nostdin', '-noaccurate_seek', '-skip_frame', 'nokey',
+               '-ss', f"{ms / 1000:.3f}", '-i', video_path,
+               '-map', '0:v:0', '-an', '-sn', '-frames:v', '1', '-vf', f"scale={width}:-2",
+               '-f', 'image2pipe', '-vcodec', 'png', '-']
+    result = subprocess.run(command, capture_output=True, timeout=timeout, creationflags=creationflags)
+    return result.stdout or None
+
+
+class ThumbnailCache:
+    """Size-bounded on-disk LRU cache of chapter thumbnails.
+
+    Entries are keyed by the video's identity (path, size, mtime) and the
+    timestamp, so thumbnails of an edited video are never reused. Reading an
+    entry refreshes its mtime; once the folder grows past max_bytes the
+    least recently used entries are removed.
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=DEFAULT_CACHE_BYTES):
+        self.cache_dir = os.path.join(cache_dir or default_cache_dir(), 'thumbnails')
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._total_bytes = sum(entry.stat().st_size for entry in os.scandir(self.cache_dir) if entry.is_file())
+
+    def entry_path(self, video_path, stat, ms, width=THUMBNAIL_WIDTH):
+        size, mtime_ns = stat
+        digest = hashlib.sha1(f"{file_key(video_path)}|{size}|{mtime_ns}|{ms}|{width}".encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, f"{digest}.png")
+
+    def get(self, video_path, stat, ms, width=THUMBNAIL_WIDTH):
+        path = self.entry_path(video_path, stat, ms, width)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path) # Mark as recently used
+            return data
+        except OSError:
+            return None
+
+    def put(self, video_path, stat, ms, data, width=THUMBNAIL_WIDTH):
+        path = self.entry_path(video_path, stat, ms, width)
+        atomic_write_bytes(path, data)
+        with self._lock:
+            self._total_bytes += len(data)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """Removes least recently used entries until the cache is at 90% of its limit."""
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime_ns, st.st_size, entry.path))
+        self._total_bytes = sum(size for _, size, _ in entries)
+        entries.sort()
+        for _, size, path in entries:
+            if self._total_bytes <= self.max_bytes * 0.9:
+                break
+            try:
+                os.remove(path)
+                self._total_bytes -= size
+            except OSError:
+                pass
+
+
+class ThumbnailLoader:
+    """Fetches thumbnails for several chapter times in parallel.
+
+    Cached thumbnails are returned straight away; the rest are grabbed by
+    separate ffmpeg processes on a thread pool. Each request returns a
+    threading.Event that cancels its not-yet-started grabs.
+    """
+
+    def __init__(self, cache=None, max_workers=None):
+        self.cache = cache
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or min(8, (os.cpu_count() or 2) * 2),
+                                            thread_name_prefix="Thumbnails")
+
+    def request(self, ffmpeg_path, video_path, times_ms, on_ready, width=THUMBNAIL_WIDTH):
+        """Calls on_ready(ms, png_bytes or None) on a worker thread for every time in times_ms."""
+        cancel = threading.Event()
+        try:
+            st = os.stat(video_path)
+            stat = (st.st_size, st.st_mtime_ns)
+        except OSError:
+            stat = None
+        for ms in times_ms:
+            self._executor.submit(self._load, ffmpeg_path, video_path, stat, ms, width, on_ready, cancel)
+        return cancel
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _load(self, ffmpeg_path, video_path, stat, ms, width, on_ready, cancel):
+        if cancel.is_set():
+            return
+        data = None
+        try:
+            if self.cache is not None and stat is not None:
+                data = self.cache.get(video_path, stat, ms, width)
+            if data is None and not cancel.is_set():
+                data = grab_thumbnail(ffmpeg_path, video_path, ms, width)
+                if data and self.cache is not None and stat is not None:
+                    self.cache.put(video_path, stat, ms, data, width)
+        except Exception:
+            data = None
+        if not cancel.is_set():
+            on_ready(ms, data)
@@ -0,0 +1,32 @@
+import os
+import sys
+import shutil
+
+
+def tool_env_var(name):
+    """Environment variable that overrides the path of a tool, e.g. VIDEO_CHAPTER_TOOL_YT_DLP_PATH."""
+    return 'VIDEO_CHAPTER_TOOL_' + name.upper().replace('-', '_') + '_PATH'
+
+
+def find_tool(name):
+    """Finds an executable the way the GUI does: PyInstaller's bundle folder, then next to the scripts, then PATH.
+
+    A VIDEO_CHAPTER_TOOL_<NAME>_PATH variable wins over all of them, and a
+    VIDEO_CHAPTER_TOOL_BIN folder is searched first, so a whole set of tools
+    (e.g. the fake_tools.py stand-ins) can be swapped in without touching PATH.
+    """
+    override = os.environ.get(tool_env_var(name))
+    if override:
+        return override
+    folders = [os.path.dirname(os.path.abspath(__file__))]
+    if getattr(sys, 'frozen', False) and hasattr(sys, '_MEIPASS'):
+        folders.insert(0, sys._MEIPASS)
+    if os.environ.get('VIDEO_CHAPTER_TOOL_BIN'):
+        folders.insert(0, os.environ['VIDEO_CHAPTER_TOOL_BIN'])
+    candidates = (name + ".exe", name + ".cmd", name) if sys.platform == "win32" else (name,)
+    for folder in folders:
+        for candidate in candidates:
+            path = os.path.join(folder, candidate)
+            if os.path.isfile(path):
+                return path
+    return shutil.which(name)
@@ -0,0 +1,127 @@
+import os
+import struct
+import hashlib
+
+from chapter_files import atomic_write_bytes
+from media_analysis import NUMPY_AVAILABLE, stream_ffmpeg_output
+from probe_cache import default_cache_dir, file_key
+
+if NUMPY_AVAILABLE:
+    import numpy as np
+
+# Peaks are taken from 8 kHz mono PCM, 20 min/max pairs per second of audio
+PEAK_SAMPLE_RATE = 8000
+PEAKS_PER_SECOND = 20
+SAMPLES_PER_PEAK = PEAK_SAMPLE_RATE // PEAKS_PER_SECOND
+PEAKS_PER_READ = 2000 # 100 s of audio per pipe read
+
+# Peaks file: header, then interleaved int8 (min, max) pairs
+PEAKS_MAGIC = b'VCTPEAK1'
+PEAKS_HEADER = struct.Struct('<8sqqII') # magic, file size, mtime_ns, peaks per second, peak count
+
+
+def compute_peaks(ffmpeg_path, video_path, cancel=None, progress=None, duration_ms=None):
+    """Streams the first audio track through a min/max reducer.
+
+    Returns (mins, maxs) as int8 arrays with PEAKS_PER_SECOND entries per
+    second; both are empty if the file has no audio. Only one pipe read is
+    held in memory at a time, so a 3-hour file costs the same as a short one.
+    progress(fraction) is called after each read when duration_ms is known.
+    """
+    command = [ffmpeg_path, '-v', 'error', '-nostdin', '-i', video_path,
+               '-map', '0:a:0', '-vn', '-sn', '-dn', '-ac', '1', '-ar', str(PEAK_SAMPLE_RATE),
+               '-f', 's16le', '-acodec', 'pcm_s16le', '-']
+    mins = []
+    maxs = []
+    carry = np.empty(0, np.int16) # Samples of a peak that straddles two reads
+    samples_read = 0
+    for data in stream_ffmpeg_output(command, SAMPLES_PER_PEAK * 2 * PEAKS_PER_READ, cancel, missing_ok=True):
+        samples = np.frombuffer(data, np.int16, count=len(data) // 2)
+        samples_read += len(samples)
+        if len(carry):
+            samples = np.concatenate((carry, samples))
+        whole = len(samples) - len(samples) % SAMPLES_PER_PEAK
+        if whole:
+            blocks = samples[:whole].reshape(-1, SAMPLES_PER_PEAK)
+            mins.append(blocks.min(axis=1))
+            maxs.append(blocks.max(axis=1))
+        carry = samples[whole:].copy()
+        if progress and duration_ms:
+            progress(min(1.0, samples_read / (duration_ms * PEAK_SAMPLE_RATE / 1000)))
+    if len(carry):
+        mins.append(np.array([carry.min()], np.int16))
+        maxs.append(np.array([carry.max()], np.int16))
+    if not mins:
+        return np.empty(0, np.int8), np.empty(0, np.int8)
+    # Keep the top 8 bits; plenty for an overview and half the size on disk
+    return ((np.concatenate(mins) >> 8).astype(np.int8),
+            (np.concatenate(maxs) >> 8).astype(np.int8))
+
+
+def overview_columns(mins, maxs, columns):
+    """Reduces peaks to at most `columns` (min, max) pairs for drawing."""
+    count = len(mins)
+    columns = min(columns, count)
+    if columns <= 0:
+        return [], []
+    edges = np.linspace(0, count, columns + 1).astype(np.int64)[:-1]
+    return np.minimum.reduceat(mins, edges).tolist(), np.maximum.reduceat(maxs, edges).tolist()
+
+
+class WaveformCache:
+    """On-disk store of waveform peaks, next to the probe cache.
+
+    There is one file per video (named from a hash of its normalized path);
+    the header records the video's size and mtime, so a changed file is
+    recomputed and its old peaks are overwritten rather than piling up.
+    """
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = os.path.join(cache_dir or default_cache_dir(), 'peaks')
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def peaks_path(self, video_path):
+        digest = hashlib.sha1(file_key(video_path).encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, f"{digest}.peaks")
+
+    def get(self, video_path, stat=None):
+        """Returns cached (mins, maxs) for video_path, or None if missing or stale."""
+        size, mtime_ns = stat if stat is not None else _identity(video_path)
+        try:
+            with open(self.peaks_path(video_path), 'rb') as f:
+                header = f.read(PEAKS_HEADER.size)
+                if len(header) != PEAKS_HEADER.size:
+                    return None
+                magic, cached_size, cached_mtime_ns, peaks_per_second, count = PEAKS_HEADER.unpack(header)
+                if (magic, cached_size, cached_mtime_ns, peaks_per_second) != (PEAKS_MAGIC, size, mtime_ns, PEAKS_PER_SECOND):
+                    return None
+                pairs = np.frombuffer(f.read(count * 2), np.int8)
+        except OSError:
+            return None
+        if len(pairs) != count * 2:
+            return None # Truncated file
+        pairs = pairs.reshape(-1, 2)
+        return pairs[:, 0], pairs[:, 1]
+
+    def put(self, video_path, mins, maxs, stat=None):
+        size, mtime_ns = stat if stat is not None else _identity(video_path)
+        header = PEAKS_HEADER.pack(PEAKS_MAGIC, size, mtime_ns, PEAKS_PER_SECOND, len(mins))
+        atomic_write_bytes(self.peaks_path(video_path), header + np.stack((mins, maxs), axis=1).tobytes())
+
+    def load_or_compute(self, video_path, ffmpeg_path, cancel=None, progress=None, duration_ms=None, compute=True):
+        """Returns (mins, maxs, from_cache), computing and storing the peaks on a cache miss.
+           With compute False, a cache miss returns None instead of decoding the file."""
+        stat = _identity(video_path) # Taken before decoding so an edit during the run is not cached as fresh
+        cached = self.get(video_path, stat)
+        if cached is not None:
+            return cached[0], cached[1], True
+        if not compute:
+            return None
+        mins, maxs = compute_peaks(ffmpeg_path, video_path, cancel, progress, duration_ms)
+        self.put(video_path, mins, maxs, stat)
+        return mins, maxs, False
+
+
+def _identity(path):
+    st = os.stat(path)
+    return st.st_size, st.st_mtime_ns
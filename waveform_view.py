@@ -0,0 +1,95 @@
+import tkinter as tk
+
+from chapter_timeline import ms_to_hms
+from waveform import PEAKS_PER_SECOND, overview_columns
+
+
+class WaveformView(tk.Canvas):
+    """Audio overview of one video with a marker at every chapter start.
+
+    The cached peaks are reduced to one min/max pair per pixel column, so a
+    redraw costs the same for a 3-hour file as for a short clip. Clicking
+    calls on_click(ms) with the time under the pointer.
+    """
+
+    def __init__(self, parent, on_click=None, height=80):
+        super().__init__(parent, height=height, background='white', highlightthickness=0)
+        self.on_click = on_click
+        self.mins = None
+        self.maxs = None
+        self.duration_ms = 0
+        self.markers = []
+        self.status = ""
+
+        self.bind('<Configure>', lambda event: self._draw())
+        self.bind('<Button-1>', self._on_button)
+        self.bind('<Motion>', self._on_motion)
+        self.bind('<Leave>', lambda event: self.delete('cursor'))
+
+    def set_status(self, text):
+        """Clears the waveform and shows a message instead (e.g. while it is being computed)."""
+        self.mins = self.maxs = None
+        self.duration_ms = 0
+        self.status = text
+        self._draw()
+
+    def set_peaks(self, mins, maxs):
+        self.mins = mins
+        self.maxs = maxs
+        self.duration_ms = len(mins) * 1000 // PEAKS_PER_SECOND
+        self.status = "" if len(mins) else "No audio track."
+        self._draw()
+
+    def set_markers(self, starts_ms):
+        """Moves the chapter markers to the given start times."""
+        self.markers = list(starts_ms)
+        self._draw_markers()
+
+    def clear(self):
+        self.markers = []
+        self.set_status("")
+
+    def _draw(self):
+        self.delete('all')
+        width = self.winfo_width()
+        height = self.winfo_height()
+        middle = height // 2
+        if self.status or self.mins is None:
+            self.create_text(width // 2, middle, text=self.status, fill='gray40')
+            return
+        self.create_line(0, middle, width, middle, fill='light gray')
+        scale = (height / 2 - 2) / 128
+        mins, maxs = overview_columns(self.mins, self.maxs, width)
+        step = width / len(mins) if mins else 1
+        for column, (low, high) in enumerate(zip(mins, maxs)):
+            x = int(column * step)
+            self.create_line(x, middle - high * scale, x, middle - low * scale + 1, fill='steelblue')
+        self._draw_markers()
+
+    def _draw_markers(self):
+        self.delete('marker')
+        if not self.duration_ms:
+            return
+        width = self.winfo_width()
+        height = self.winfo_height()
+        for start_ms in self.markers:
+            x = start_ms * width / self.duration_ms
+            if 0 <= x <= width:
+                self.create_line(x, 0, x, height, fill='red', tags='marker')
+
+    def _time_at(self, x):
+        width = max(self.winfo_width(), 1)
+        return int(max(0, min(x, width)) * self.duration_ms / width)
+
+    def _on_button(self, event):
+        if self.on_click and self.duration_ms:
+            self.on_click(self._time_at(event.x))
+
+    def _on_motion(self, event):
+        self.delete('cursor')
+        if not self.duration_ms:
+            return
+        self.create_line(event.x, 0, event.x, self.winfo_height(), fill='gray50', dash=(2, 2), tags='cursor')
+        anchor = 'ne' if event.x > self.winfo_width() - 80 else 'nw'
+        self.create_text(event.x + (-4 if anchor == 'ne' else 4), 2, text=ms_to_hms(self._time_at(event.x)),
+                         anchor=anchor, fill='gray20', tags='cursor')
@@ -0,0 +1,172 @@
+import os
+import re
+import queue
+import subprocess
+
+from chapter_media import sanitize_filename
+from metrics import ACTIVE_PROCESSES, STAGE_SECONDS, count_bytes
+from process_watchdog import ProcessStalled, run_watched
+
+# Try to import yt-dlp as a module, so downloads can run in-process instead of through the executable
+try:
+    import yt_dlp
+    from yt_dlp.utils import DownloadCancelled, DownloadError
+    YT_DLP_MODULE_AVAILABLE = True
+except ImportError:
+    YT_DLP_MODULE_AVAILABLE = False
+
+DOWNLOAD_FORMAT = 'bestvideo+bestaudio/best'
+DOWNLOAD_EXTENSIONS = ('mp4', 'mkv', 'webm', 'flv', 'avi')
+PROGRESS_REGEX = re.compile(r'\[download\]\s+(\d+(?:\.\d+)?)%')
+
+
+def in_process_available():
+    """True when downloads run through the yt_dlp module (set VIDEO_CHAPTER_TOOL_YTDLP=subprocess
+       to force the executable)."""
+    return YT_DLP_MODULE_AVAILABLE and os.environ.get('VIDEO_CHAPTER_TOOL_YTDLP') != 'subprocess'
+
+
+def _output_template(output_dir, sanitized_title):
+    # '%' starts a yt-dlp template field, so one in the title itself is doubled
+    return os.path.join(output_dir, f"{sanitized_title.replace('%', '%%')}.%(ext)s")
+
+
+def _find_download(output_dir, sanitized_title):
+    # Find the downloaded file based on the sanitized title and common extensions
+    for ext in DOWNLOAD_EXTENSIONS:
+        potential_path = os.path.join(output_dir, f"{sanitized_title}.{ext}")
+        if os.path.exists(potential_path):
+            count_bytes('download', written_path=potential_path)
+            return os.path.abspath(potential_path)
+    raise Exception("Downloaded video file not found after successful download command (check expected filename).")
+
+
+class _DownloadSession:
+    """One yt_dlp.YoutubeDL kept alive between downloads, so its extractors, cookie jar and
+       HTTP connection pool are set up once. Used by one download at a time."""
+
+    def __init__(self):
+        self.log = None
+        self.progress = None
+        self.cancel = None
+        self.ydl = yt_dlp.YoutubeDL({
+            'format': DOWNLOAD_FORMAT,
+            'merge_output_format': 'mp4',
+            'noplaylist': True,
+            'noprogress': True, # Progress comes through the hook instead of console lines
+            'logger': self,
+            'progress_hooks': [self._progress_hook],
+        })
+
+    # yt-dlp logger interface
+    def debug(self, message):
+        if not message.startswith('[debug] '):
+            self.info(message)
+
+    def info(self, message):
+        if self.log:
+            self.log(f"Download: {message}")
+
+    def warning(self, message):
+        self.info(f"WARNING: {message}")
+
+    def error(self, message):
+        self.info(message)
+
+    def _progress_hook(self, status):
+        if self.cancel is not None and self.cancel.is_set():
+            raise DownloadCancelled()
+        total = status.get('total_bytes') or status.get('total_bytes_estimate')
+        if status.get('status') == 'downloading' and total and self.progress:
+            self.progress(min(1.0, (status.get('downloaded_bytes') or 0) / total))
+
+    def download(self, url, output_dir, log, progress, cancel):
+        """Downloads url into output_dir and returns the sanitized title its file is named after."""
+        self.log, self.progress, self.cancel = log, progress, cancel
+        try:
+            # One extraction gives both the title and the formats, where the executable needs two runs
+            info = self.ydl.extract_info(url, download=False)
+            video_title = info.get('title') or info.get('id') or "video"
+            sanitized_title = sanitize_filename(video_title)
+            output_template = _output_template(output_dir, sanitized_title)
+            log(f"Downloading YouTube video '{video_title}' to '{output_template}' (in-process yt-dlp)...")
+            # An instance option, but safe to swap: a session runs one download at a time
+            self.ydl.params['outtmpl'] = {'default': output_template}
+            with STAGE_SECONDS.time(labels=('download',)):
+                self.ydl.process_ie_result(info, download=True)
+            return sanitized_title
+        except DownloadCancelled:
+            raise Exception("Download cancelled.")
+        except DownloadError as e:
+            if cancel is not None and cancel.is_set():
+                raise Exception("Download cancelled.")
+            raise Exception(f"YouTube download failed: {e}")
+        finally:
+            self.log = self.progress = self.cancel = None
+
+
+_idle_sessions = queue.LifoQueue() # Most recently used first, so its connections are still warm
+
+
+def _download_in_process(url, output_dir, log, progress, cancel):
+    try:
+        session = _idle_sessions.get_nowait()
+    except queue.Empty:
+        session = _DownloadSession() # Concurrent downloads (job service workers) each get their own
+    try:
+        sanitized_title = session.download(url, output_dir, log, progress, cancel)
+    finally:
+        _idle_sessions.put(session)
+    return _find_download(output_dir, sanitized_title)
+
+
+def download_video(yt_dlp_path, url, output_dir='.', log=None, progress=None, cancel=None):
+    """Downloads url with yt-dlp as "<sanitized title>.mp4" (or the format it ends up in) into output_dir.
+
+    log(line) receives yt-dlp's output lines and progress(fraction) the
+    download progress. Setting the cancel Event stops the download. When
+    the yt_dlp module can be imported, the download runs in-process on a
+    reused session; otherwise the yt-dlp executable at yt_dlp_path is run.
+    Returns the path of the downloaded file; raises Exception on failure.
+    """
+    log = log or (lambda message: None)
+    if in_process_available():
+        return _download_in_process(url, output_dir, log, progress, cancel)
+    if not yt_dlp_path:
+        raise Exception("yt-dlp not found: install the yt-dlp executable or the yt_dlp Python module.")
+    # First, get video title to use as filename
+    try:
+        returncode, title_output, title_error = run_watched([yt_dlp_path, '--get-title', url], timeout=120, cancel=cancel,
+                                                            stage='download_title')
+    except ProcessStalled as e:
+        raise Exception(f"Getting the video title did not finish ({e.reason})")
+    if returncode != 0:
+        raise Exception(f"Error getting video title: {title_error.strip()}")
+
+    video_title = title_output.strip()
+    sanitized_title = sanitize_filename(video_title)
+    output_template = _output_template(output_dir, sanitized_title)
+    log(f"Downloading YouTube video '{video_title}' to '{output_template}'...")
+
+    command = [yt_dlp_path, '--newline', '-f', DOWNLOAD_FORMAT, '--merge-output-format', 'mp4',
+               url, '-o', output_template]
+    with ACTIVE_PROCESSES.track(), STAGE_SECONDS.time(labels=('download',)):
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+                                   encoding='utf-8', errors='replace')
+        tail = []
+        for line in iter(process.stdout.readline, ''):
+            line = line.strip()
+            log(f"Download: {line}")
+            tail = (tail + [line])[-20:]
+            match = PROGRESS_REGEX.search(line)
+            if match and progress:
+                progress(float(match.group(1)) / 100)
+            if cancel is not None and cancel.is_set():
+                process.kill()
+                break
+        process.wait()
+    if cancel is not None and cancel.is_set():
+        raise Exception("Download cancelled.")
+    if process.returncode != 0:
+        raise Exception(f"YouTube download failed with exit code {process.returncode}: " + "\n".join(tail))
+    return _find_download(output_dir, sanitized_title)